@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""
+Rerank Benchmark
+
+Compares retrieval without reranking against each reranker for a set of questions about one
+job: estimated context tokens in the reply prompt, search latency and end-to-end reply latency
+(search + reply LLM call). Runs against the live index and LLM, so it needs the same env as run.py.
+
+With --corpus the knowledge base is an in-memory index of a text file's sentences embedded with
+the deterministic backend instead: no Pinecone or Supabase access, so the retrieval numbers can
+be reproduced anywhere. Deterministic (bag-of-words) scores are much lower than the model's, so
+matches are kept from --score-threshold (default 0.2) instead of 0.8. The reply LLM call still
+needs LLM_MODEL and the Cohere key unless --no-llm is given.
+
+Usage (from the agent directory):
+    python -m benchmarks.rerank_benchmark --job-id JOB_ID --questions questions.txt
+    python -m benchmarks.rerank_benchmark --job-id JOB_ID --questions questions.txt --rerankers none lexical --no-llm
+    python -m benchmarks.rerank_benchmark --corpus README.md --questions benchmarks/readme_questions.txt --rerankers none lexical --no-llm
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import statistics
+import time
+from types import SimpleNamespace
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Rerank benchmark")
+    parser.add_argument("--job-id", type=str, default="benchmark",
+                        help="Job whose knowledge base is searched (required without --corpus)")
+    parser.add_argument("--questions", type=str, required=True, help="Text file with one question per line")
+    parser.add_argument("--rerankers", nargs="+", default=["none", "lexical", "pinecone"],
+                        help="Rerankers to compare (none is the current top_k=5 retrieval)")
+    parser.add_argument("--no-llm", action="store_true", help="Only measure retrieval, skip the reply LLM call")
+    parser.add_argument("--corpus", type=str, help="Search an in-memory index of this text file's sentences (offline)")
+    parser.add_argument("--score-threshold", type=float, default=0.2,
+                        help="Min match score of --corpus runs (deterministic embeddings score low)")
+    args = parser.parse_args()
+    if not args.corpus and args.job_id == "benchmark":
+        parser.error("--job-id is required without --corpus")
+    return args
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class InMemoryIndex:
+    """Stand-in for a Pinecone index over a text file's sentences (one chunk per sentence)."""
+
+    def __init__(self, path, embedder):
+        with open(path, encoding="utf-8") as f:
+            text = re.sub(r"\s+", " ", f.read())
+        self.chunks = [sentence.strip() for sentence in re.split(r"[.!?]+", text) if sentence.strip()]
+        self.vectors = embedder.embed(self.chunks, input_type="passage")
+
+    @staticmethod
+    def _cosine(a, b):
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return sum(x * y for x, y in zip(a, b)) / norm if norm else 0.0
+
+    def query(self, namespace, vector, top_k, include_values=False, include_metadata=True):
+        """The top_k chunks by cosine similarity, shaped like a Pinecone query response."""
+        scored = sorted(((self._cosine(vector, chunk_vector), number)
+                         for number, chunk_vector in enumerate(self.vectors)), reverse=True)[:top_k]
+        return SimpleNamespace(matches=[
+            SimpleNamespace(id=str(number), score=score, metadata={"text": self.chunks[number]})
+            for score, number in scored
+        ])
+
+
+def use_corpus(search, vector_search_module, path, score_threshold):
+    """Point the search service at an in-memory index of path, embedded with the deterministic backend."""
+    from src.embeddings import DeterministicEmbeddingBackend
+
+    search.embedder = DeterministicEmbeddingBackend()
+    index = InMemoryIndex(path, search.embedder)
+    search.get_index = lambda index_name: index
+    search.get_namespace_vector_count = lambda namespace, index_name=None: len(index.chunks)
+    live_search = search.search
+
+    def search_with_threshold(index_name, vector, namespace, top_k=5, _score_threshold=0.8, query_text=None):
+        return live_search(index_name, vector, namespace, top_k, score_threshold, query_text)
+
+    search.search = search_with_threshold
+    vector_search_module.db.get_job_details = lambda job_id: {"id": job_id}
+    return index
+
+
+def run_variant(name, job_id, questions, use_llm):
+    """Answer every question with one reranker and collect token and latency numbers."""
+    from src.main import EmailAutomationApp, REPLY_PROMPT
+    from src.rerank import get_reranker
+    import src.vector_search as vector_search_module
+
+    # the search path reads the module level reranker, swap it for this variant
+    vector_search_module.reranker = get_reranker(name)
+    search = vector_search_module.vector_search
+    llm = EmailAutomationApp()._get_llm() if use_llm else None
+
+    tokens, search_ms, reply_ms = [], [], []
+    for question in questions:
+        start = time.perf_counter()
+        results = search.search_with_text(job_id, question)
+        search_done = time.perf_counter()
+        # context is None when nothing matched
+        context = results["context"] or ""
+        tokens.append(search.estimate_tokens(context))
+        search_ms.append(1000 * (search_done - start))
+
+        if llm:
+            prompt = REPLY_PROMPT.invoke({"context": context, "email_context": question, "email_history": ""})
+            llm.invoke(prompt.text)
+            reply_ms.append(1000 * (time.perf_counter() - start))
+
+    report = {
+        "reranker": name,
+        "questions": len(questions),
+        "context_tokens_avg": round(statistics.mean(tokens), 1),
+        "search_ms_p50": round(percentile(search_ms, 0.5), 1),
+        "search_ms_p95": round(percentile(search_ms, 0.95), 1),
+    }
+    if reply_ms:
+        report["reply_ms_p50"] = round(percentile(reply_ms, 0.5), 1)
+        report["reply_ms_p95"] = round(percentile(reply_ms, 0.95), 1)
+    return report
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    if args.corpus:
+        # the services build their clients on import: offline they only need well-formed settings
+        os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.offline")
+        os.environ.setdefault("PINECONE_API_KEY", "offline")
+        os.environ.setdefault("INDEX_NAME", "offline")
+
+    from src import config
+    import src.vector_search as vector_search_module
+
+    if args.corpus:
+        index = use_corpus(vector_search_module.vector_search, vector_search_module, args.corpus, args.score_threshold)
+        print(f"corpus: {len(index.chunks)} sentences of {args.corpus}, deterministic embeddings, "
+              f"score_threshold={args.score_threshold}")
+    else:
+        config.ensure_env_vars()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+
+    print(f"fetch_k={config.RERANK_FETCH_K} keep={config.RERANK_KEEP} token_budget={config.CONTEXT_TOKEN_BUDGET}")
+    for name in args.rerankers:
+        print(json.dumps(run_variant(name, args.job_id, questions, not args.no_llm)))
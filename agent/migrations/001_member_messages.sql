@@ -0,0 +1,20 @@
+-- Append-only per-message storage for member threads (used when MESSAGE_STORE_ENABLED=true).
+-- Each row holds only a message's new text; the conversation is rebuilt from the latest rows.
+create table if not exists public.member_messages (
+    id bigint generated always as identity primary key,
+    member_id uuid not null references public.members (id) on delete cascade,
+    gmail_id text not null,
+    message_id text,
+    direction text not null check (direction in ('inbound', 'outbound')),
+    -- zlib compressed & base64 encoded when compressed is true
+    content text not null,
+    compressed boolean not null default false,
+    created_at timestamptz not null default now(),
+    unique (member_id, gmail_id)
+);
+
+create index if not exists member_messages_member_id_idx
+    on public.member_messages (member_id, id desc);
+
+-- only the agent (service role) reads & writes message history
+alter table public.member_messages enable row level security;
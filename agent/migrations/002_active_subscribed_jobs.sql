@@ -0,0 +1,16 @@
+-- Jobs the batch runner (run.py --all-active) processes: not closed, owned by a subscribed user.
+create or replace function public.active_subscribed_jobs()
+returns table (id uuid, user_id uuid, "Job_email" text)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select j.id, j.user_id, j."Job_email"
+    from public.jobs j
+    join public.subscriptions s on s.user_id = j.user_id
+    where lower(coalesce(j.status, '')) <> 'closed'
+      and lower(s.status) in ('active', 'trialing');
+$$;
+
+revoke all on function public.active_subscribed_jobs() from public, anon, authenticated;
@@ -0,0 +1,64 @@
+-- Row-level leases so several agent runs/replicas never process the same job partition at once
+-- (used when LEASES_ENABLED=true). A lease is free once expires_at has passed.
+create table if not exists public.agent_leases (
+    resource text primary key,
+    owner text not null,
+    expires_at timestamptz not null,
+    heartbeat_at timestamptz not null default now()
+);
+
+alter table public.agent_leases enable row level security;
+
+-- Take the lease when it is free, expired or already ours. Returns true when p_owner holds it.
+create or replace function public.claim_lease(p_resource text, p_owner text, p_ttl_seconds integer)
+returns boolean
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    claimed integer;
+begin
+    insert into public.agent_leases as l (resource, owner, expires_at, heartbeat_at)
+    values (p_resource, p_owner, now() + make_interval(secs => p_ttl_seconds), now())
+    on conflict (resource) do update
+        set owner = excluded.owner,
+            expires_at = excluded.expires_at,
+            heartbeat_at = excluded.heartbeat_at
+        where l.expires_at < now() or l.owner = excluded.owner;
+    get diagnostics claimed = row_count;
+    return claimed = 1;
+end;
+$$;
+
+-- Extend a lease we still hold. Returns false when it expired and someone else took it.
+create or replace function public.renew_lease(p_resource text, p_owner text, p_ttl_seconds integer)
+returns boolean
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    renewed integer;
+begin
+    update public.agent_leases
+        set expires_at = now() + make_interval(secs => p_ttl_seconds),
+            heartbeat_at = now()
+        where resource = p_resource and owner = p_owner;
+    get diagnostics renewed = row_count;
+    return renewed = 1;
+end;
+$$;
+
+create or replace function public.release_lease(p_resource text, p_owner text)
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+    delete from public.agent_leases where resource = p_resource and owner = p_owner;
+$$;
+
+revoke all on function public.claim_lease(text, text, integer) from public, anon, authenticated;
+revoke all on function public.renew_lease(text, text, integer) from public, anon, authenticated;
+revoke all on function public.release_lease(text, text) from public, anon, authenticated;
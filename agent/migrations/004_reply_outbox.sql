@@ -0,0 +1,25 @@
+-- Durable outbox of generated replies (used when OUTBOX_ENABLED=true). A reply is recorded
+-- before it is sent and marked done once the member row points at it, so a run that dies in
+-- between resumes the stored reply instead of generating and sending another one.
+create table if not exists public.reply_outbox (
+    -- <member id>:<inbound Message-Id>, one reply per inbound message
+    idempotency_key text primary key,
+    job_id uuid not null,
+    member_id uuid not null references public.members (id) on delete cascade,
+    inbound_message_id text not null,
+    -- Message-ID header set on the reply, used to find it in the thread after a crash
+    outbound_message_id text not null,
+    reply_params jsonb not null,
+    email_response text not null,
+    status text not null default 'pending' check (status in ('pending', 'sent', 'done', 'superseded')),
+    gmail_id text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists reply_outbox_open_idx
+    on public.reply_outbox (member_id, created_at desc)
+    where status in ('pending', 'sent');
+
+-- only the agent (service role) reads & writes the outbox
+alter table public.reply_outbox enable row level security;
@@ -0,0 +1,13 @@
+-- Member ordering for time-budgeted runs (used when RUN_DEADLINE_SECONDS > 0).
+-- last_activity_at: last message sent to / answered for the member, the "active" tier is read first.
+-- deferred_at: set on the members a run could not reach before its deadline, read before idle ones.
+alter table public.members
+    add column if not exists last_activity_at timestamptz,
+    add column if not exists deferred_at timestamptz;
+
+create index if not exists members_job_activity_idx
+    on public.members (job_id, last_activity_at);
+
+create index if not exists members_job_deferred_idx
+    on public.members (job_id, id)
+    where deferred_at is not null;
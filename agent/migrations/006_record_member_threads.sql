@@ -0,0 +1,25 @@
+-- Bulk update of member thread details after a campaign of initial messages (run.py --campaign).
+-- p_rows: [{"id": ..., "thread_id": ..., "message_id": ..., "subject": ..., "last_activity_at": ...}, ...]
+-- Returns the number of members updated. Needs the last_activity_at column from 005_member_priority.sql.
+create or replace function public.record_member_threads(p_rows jsonb)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    updated integer;
+begin
+    update public.members m
+    set thread_id = r.thread_id,
+        message_id = r.message_id,
+        subject = r.subject,
+        last_activity_at = coalesce(r.last_activity_at, m.last_activity_at)
+    from jsonb_to_recordset(p_rows) as r(id uuid, thread_id text, message_id text, subject text, last_activity_at timestamptz)
+    where m.id = r.id;
+    get diagnostics updated = row_count;
+    return updated;
+end;
+$$;
+
+revoke all on function public.record_member_threads(jsonb) from public, anon, authenticated;
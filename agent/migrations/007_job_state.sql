@@ -0,0 +1,18 @@
+-- A job's status and its owner's subscription status in one call. The agent fingerprints them to
+-- check that a job it remembered as closed/unsubscribed (negative cache) still is.
+-- No row when the job does not exist; subscription_status is null for users without a subscription.
+create or replace function public.job_state(p_job_id uuid)
+returns table (status text, subscription_status text)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select j.status, s.status
+    from public.jobs j
+    left join public.subscriptions s on s.user_id = j.user_id
+    where j.id = p_job_id
+    limit 1;
+$$;
+
+revoke all on function public.job_state(uuid) from public, anon, authenticated;
@@ -0,0 +1,17 @@
+-- Live leases under a prefix (used when LEASES_ENABLED=true). Every run holds a presence lease
+-- "job:<id>:owner:<owner>" while it works on a job, so counting the job's live presence leases
+-- gives the number of agents sharing it and each claims a fair share of its partitions.
+create or replace function public.count_live_leases(p_prefix text)
+returns integer
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select count(*)::integer
+    from public.agent_leases
+    where left(resource, length(p_prefix)) = p_prefix
+      and expires_at >= now();
+$$;
+
+revoke all on function public.count_live_leases(text) from public, anon, authenticated;
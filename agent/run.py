@@ -7,7 +7,11 @@ It can be run directly or scheduled via cron to periodically check for
 and respond to emails.
 
 Usage:
-    python run.py [--job-id JOB_ID]
+    python run.py [--job-id JOB_ID] [--async] [--results PATH] [--include-bodies] [--deadline SECONDS]
+    python run.py (--all-active | --job-ids JOB_ID [JOB_ID ...]) [--workers N] [--async] [--results PATH] [--deadline SECONDS]
+    python run.py --job-id JOB_ID --campaign [--results PATH]
+    python run.py --job-id JOB_ID --precompute-faq
+    python run.py --job-id JOB_ID --ingest PATH [PATH ...] [--prune]
 """
 
 import argparse
@@ -24,6 +28,78 @@ def parse_arguments():
         help="Specify a job ID to process (optional)"
     )
     
+    parser.add_argument(
+        "--job-ids",
+        nargs="+",
+        metavar="JOB_ID",
+        help="Process several jobs in one batch, sharded over worker processes by sender mailbox"
+    )
+    
+    parser.add_argument(
+        "--all-active",
+        action="store_true",
+        help="Process every active job of a subscribed user in one batch"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Worker processes for --job-ids/--all-active (default: BATCH_WORKERS)"
+    )
+    
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Process members concurrently with the asyncio pipeline"
+    )
+    
+    parser.add_argument(
+        "--results",
+        type=str,
+        metavar="PATH",
+        help="Stream per-member results as JSONL to this file as they finish (- for stdout, logs then go to stderr). "
+             "Without it only the final Result is printed"
+    )
+    
+    parser.add_argument(
+        "--include-bodies",
+        action="store_true",
+        help="Keep message bodies in the per-member results"
+    )
+    
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        metavar="SECONDS",
+        help="Time budget of the run, normally the schedule interval (default: RUN_DEADLINE_SECONDS)"
+    )
+    
+    parser.add_argument(
+        "--campaign",
+        action="store_true",
+        help="Send the initial message to every member of the job without a thread (paced bulk send)"
+    )
+    
+    parser.add_argument(
+        "--precompute-faq",
+        action="store_true",
+        help="Build the job's FAQ from its knowledge base instead of processing members"
+    )
+    
+    parser.add_argument(
+        "--ingest",
+        nargs="+",
+        metavar="PATH",
+        help="Load documents (.txt/.md files or directories) into the job's knowledge base instead of processing members"
+    )
+    
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="With --ingest, delete previously ingested chunks that are no longer in the documents (frontend uploads are kept)"
+    )
+    
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -34,9 +110,47 @@ if __name__ == "__main__":
     kwargs = {}
     if args.job_id:
         kwargs["job_id"] = args.job_id
+    if args.use_async:
+        kwargs["use_async"] = True
+    if args.deadline is not None:
+        kwargs["deadline_seconds"] = args.deadline
     
     # Run the application
-    result = main(**kwargs)
+    if args.precompute_faq:
+        from src.faq_store import faq_store
+        result = faq_store.precompute(args.job_id)
+    elif args.all_active or args.job_ids:
+        from src.batch import run_batch
+        result = run_batch(
+            job_ids=args.job_ids,
+            all_active=args.all_active,
+            use_async=args.use_async,
+            results_path=args.results,
+            include_bodies=args.include_bodies,
+            workers=args.workers,
+            deadline_seconds=args.deadline
+        )
+    elif args.campaign:
+        from src.campaign import run_campaign
+        from src.results import ResultSink
+        sink = ResultSink.open(args.results, include_bodies=args.include_bodies) if args.results else None
+        try:
+            result = run_campaign(args.job_id, sink=sink)
+        finally:
+            if sink:
+                sink.close()
+    elif args.ingest:
+        from src.ingest import ingestor
+        result = ingestor.ingest(args.job_id, args.ingest, prune=args.prune)
+    elif args.results:
+        from src.results import ResultSink
+        sink = ResultSink.open(args.results, include_bodies=args.include_bodies)
+        try:
+            result = main(sink=sink, **kwargs)
+        finally:
+            sink.close()
+    else:
+        result = main(**kwargs)
     
     # Always print the result for debugging
     print(f"Result: {result}")
@@ -0,0 +1,160 @@
+import time
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+import src.config as config
+
+
+class AnswerCache:
+    """
+    Per-job semantic cache of generated answers.
+
+    Members of the same job tend to ask the same things (pay, location, deadlines).
+    Answers are stored under the embedding of the extracted question; a new question
+    whose embedding is within ANSWER_CACHE_SIMILARITY of a cached one reuses the
+    answer and skips the second LLM call.
+
+    Each job's entries are tied to a fingerprint of the job's knowledge base
+    (vector_search.knowledge_fingerprint, its chunk ids & texts) and default_message;
+    when the fingerprint changes the job's entries are dropped. Entries also expire after ANSWER_CACHE_TTL seconds
+    and the least recently used are evicted past ANSWER_CACHE_MAX_ENTRIES per job.
+    """
+
+    def __init__(self):
+        """Initialize the answer cache."""
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "evictions": 0}
+
+    @staticmethod
+    def make_fingerprint(job: Dict[str, Any], knowledge: str) -> str:
+        """
+        Fingerprint of what a job's answers depend on.
+
+        Args:
+            job: The job record (default_message is used)
+            knowledge: Fingerprint of the job's knowledge base (vector_search.get_knowledge_fingerprint)
+
+        return:
+            A short hash string
+        """
+        source = f"{knowledge}|{job.get('default_message', '')}"
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+    def needs_fingerprint(self, job_id: str) -> bool:
+        """Whether the job's fingerprint is missing or older than ANSWER_CACHE_FINGERPRINT_TTL."""
+        with self._lock:
+            job_cache = self._jobs.get(job_id)
+            return (not job_cache or
+                    time.time() - job_cache["checked_at"] > config.ANSWER_CACHE_FINGERPRINT_TTL)
+
+    def set_fingerprint(self, job_id: str, fingerprint: str) -> None:
+        """
+        Record the job's current fingerprint, dropping its entries if it changed.
+
+        Args:
+            job_id: Job ID
+            fingerprint: Result of make_fingerprint
+        """
+        with self._lock:
+            job_cache = self._jobs.get(job_id)
+            if job_cache and job_cache["fingerprint"] != fingerprint:
+                self.stats["invalidations"] += 1
+                job_cache = None
+            if not job_cache:
+                job_cache = {"fingerprint": fingerprint, "entries": OrderedDict(), "next_key": 0}
+                self._jobs[job_id] = job_cache
+            job_cache["checked_at"] = time.time()
+
+    def invalidate(self, job_id: str) -> None:
+        """Drop every cached answer of a job."""
+        with self._lock:
+            if self._jobs.pop(job_id, None):
+                self.stats["invalidations"] += 1
+
+    def lookup(self, job_id: str, embedding: List[float]) -> Optional[str]:
+        """
+        Find a cached answer for a question.
+
+        Args:
+            job_id: Job ID
+            embedding: Embedding of the extracted question
+
+        return:
+            The cached answer of the most similar question above the threshold, or None
+        """
+        with self._lock:
+            job_cache = self._jobs.get(job_id)
+            if not job_cache:
+                self.stats["misses"] += 1
+                return None
+
+            now = time.time()
+            entries = job_cache["entries"]
+            best_key, best_score = None, config.ANSWER_CACHE_SIMILARITY
+            for key, entry in list(entries.items()):
+                if now - entry["created_at"] > config.ANSWER_CACHE_TTL:
+                    del entries[key]
+                    continue
+                score = self._cosine(embedding, entry["embedding"])
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                self.stats["misses"] += 1
+                return None
+
+            entries.move_to_end(best_key)
+            self.stats["hits"] += 1
+            return entries[best_key]["answer"]
+
+    def store(self, job_id: str, embedding: List[float], answer: str) -> None:
+        """
+        Cache the answer generated for a question.
+
+        Args:
+            job_id: Job ID (its fingerprint must have been set)
+            embedding: Embedding of the extracted question
+            answer: The generated answer body
+        """
+        with self._lock:
+            job_cache = self._jobs.get(job_id)
+            if not job_cache or not embedding or not answer:
+                return
+
+            entries = job_cache["entries"]
+            entries[job_cache["next_key"]] = {
+                "embedding": list(embedding),
+                "answer": answer,
+                "created_at": time.time()
+            }
+            job_cache["next_key"] += 1
+            self.stats["stores"] += 1
+            while len(entries) > config.ANSWER_CACHE_MAX_ENTRIES:
+                entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Cache counters with the hit rate.
+
+        return:
+            Dict with hits, misses, stores, invalidations, evictions and hit_rate
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+    @staticmethod
+    def _cosine(a: List[float], b: List[float]) -> float:
+        """Cosine similarity of two vectors."""
+        dot = sum(x * y for x, y in zip(a, b))
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return dot / norm if norm else 0.0
+
+# Create a singleton instance
+answer_cache = AnswerCache()
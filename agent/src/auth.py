@@ -1,12 +1,63 @@
 import os
 import time
+import asyncio
 import requests
+import httpx
 from typing import Dict, Any, Optional, Union
-from src.utils import retry_with_backoff
-from src.database import db
+from src.utils import retry_with_backoff, async_retry_with_backoff
+from src.database import db, async_db
+from src.negative_cache import negative_cache, credential_key, fingerprint
 import src.config as config
 
 
+class CredentialRevokedError(Exception):
+    """
+    Raised when a mailbox's refresh token is revoked or expired (invalid_grant). Not retried:
+    only the owner reauthorizing the mailbox fixes it.
+    """
+
+
+def is_invalid_grant(response: Any) -> bool:
+    """Whether a failed token refresh response is Google's invalid_grant ({"error": "invalid_grant", ...})."""
+    try:
+        body = response.json()
+    except ValueError:
+        return response.text.strip() == "invalid_grant"
+    return isinstance(body, dict) and body.get("error") == "invalid_grant"
+
+
+def revoked_message(job_email: str) -> str:
+    """Notification sent to the owner when a mailbox's refresh token stops working."""
+    return f"Your refresh token has expired. Go to settings & then preference tab and then remove and re-authorize the email - {job_email} to get a new refresh token. All jobs that currently use it to send emails will not be able to proceed with sending emails till this is done."
+
+
+def revoke_credential(job_id: str, user_id: str, job_email: str, refresh_token: str) -> CredentialRevokedError:
+    """
+    Record a dead refresh token (negative cache) and queue the owner's notification.
+
+    return:
+        The error to raise
+    """
+    print("invalid refresh token, informing user")
+    negative_cache.put(credential_key(user_id, job_email), "invalid_grant",
+                       config.NEGATIVE_CACHE_CREDENTIAL_TTL, fingerprint(refresh_token))
+    from src.notifications import notifier
+    notifier.add(job_id, revoked_message(job_email), to=job_email)
+    return CredentialRevokedError(f"Refresh token of {job_email} is revoked or expired (invalid_grant)")
+
+
+def check_credential(user_id: str, job_email: str, refresh_token: str) -> None:
+    """
+    Fail fast when this refresh token is already known to be dead.
+
+    Raises:
+        CredentialRevokedError: If the negative cache has the token (a new token clears the entry)
+    """
+    reason = negative_cache.get(credential_key(user_id, job_email), fingerprint(refresh_token))
+    if reason:
+        raise CredentialRevokedError(f"Refresh token of {job_email} is revoked or expired ({reason}, cached)")
+
+
 class AuthService:
     """
     Handles authentication with external services.
@@ -28,6 +79,7 @@ class AuthService:
             
         Raises:
             ValueError: If refresh token is invalid
+            CredentialRevokedError: If Google answers invalid_grant (not retried)
             ConnectionError: If token refresh request fails
         """
         try:
@@ -62,13 +114,9 @@ class AuthService:
 
             # Check for errors or invalid refresh token
             if response.status_code != 200:
-                #check if the error is due to invalid refresh token and send an email to the user to refresh it if so.
-                if response.text == "invalid_grant":
-                    print("invalid refresh token, informing user")
-                    from src.email_service import email_service
-                    email_service.send_user_notification_email(isJob=True,job_id=job_id, message=f"Your refresh token has expired. Go to settings & then preference tab and then remove and re-authorize the email - {email} to get a new refresh token. All jobs that currently use it to send emails will not be able to proceed with sending emails till this is done.")
-                    
-                    raise ValueError(response.text)
+                #check if the error is due to invalid refresh token and inform the user to refresh it if so (not retried)
+                if is_invalid_grant(response):
+                    raise revoke_credential(job_id, actual_user_id, email, refresh_token)
                 else:
                     print(f"Token refresh failed with status {response.status_code}")
                     print(f"Response body: {response.text}")
@@ -105,6 +153,7 @@ class AuthService:
             
         Raises:
             ValueError: If token validation fails
+            CredentialRevokedError: If the refresh token is revoked or expired
         """
         try:
             # Get job details
@@ -127,6 +176,9 @@ class AuthService:
                 # Refresh the token
                 if not token_info['refresh_token']:
                     raise ValueError("Refresh token is missing")
+
+                # a token that already failed is not sent to Google again, until it is replaced
+                check_credential(user_id, job_email, token_info['refresh_token'])
                     
                 # Create a mock response object that matches the expected format
                 mock_user_data = type('obj', (object,), {
@@ -157,4 +209,130 @@ class AuthService:
             raise
 
 # Create a singleton instance
-auth_service = AuthService() 
\ No newline at end of file
+auth_service = AuthService()
+
+
+class AsyncAuthService:
+    """
+    Async counterpart of AuthService for the asyncio pipeline.
+    
+    Token refreshes go through an async HTTP client, and a lock per job makes
+    concurrent member pipelines of the same job wait for one refresh instead of
+    each refreshing the token themselves.
+    """
+
+    def __init__(self):
+        """Initialize the async auth service."""
+        self.http: Optional[httpx.AsyncClient] = None
+        self._refresh_locks: Dict[str, asyncio.Lock] = {}
+
+    def _get_http(self) -> httpx.AsyncClient:
+        """Create the shared async HTTP client on first use (inside the running loop)."""
+        if self.http is None:
+            self.http = httpx.AsyncClient(timeout=30)
+        return self.http
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP client."""
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+
+    @async_retry_with_backoff(exceptions=(httpx.TransportError, ValueError))
+    async def refresh_access_token(self, refresh_token: str, user_id: str, job_email: str, job_id: str) -> Dict[str, Any]:
+        """
+        Async counterpart of AuthService.refresh_access_token.
+        
+        Args:
+            refresh_token: The refresh token
+            user_id: The job owner's user ID
+            job_email: The sender email the token belongs to
+            job_id: The current job ID
+        return:
+            Dict with new access_token and expiration
+            
+        Raises:
+            ValueError: If refresh token is invalid
+            CredentialRevokedError: If Google answers invalid_grant (not retried)
+        """
+        required_vars = ["GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "TOKEN_URL"]
+        for var in required_vars:
+            if not os.environ.get(var):
+                raise ValueError(f"Missing required environment variable: {var}")
+
+        payload = {
+            'client_id': os.environ.get("GOOGLE_CLIENT_ID"),
+            'client_secret': os.environ.get("GOOGLE_CLIENT_SECRET"),
+            'refresh_token': refresh_token,
+            'grant_type': 'refresh_token'
+        }
+        response = await self._get_http().post(os.environ.get("TOKEN_URL"), data=payload)
+
+        if response.status_code != 200:
+            if is_invalid_grant(response):
+                raise revoke_credential(job_id, user_id, job_email, refresh_token)
+            print(f"Token refresh failed with status {response.status_code}")
+            raise ValueError(f"Invalid refresh token: {response.status_code} - {response.text}")
+
+        response_data = response.json()
+        access_token = response_data['access_token']
+        access_expires_in = time.time() + response_data['expires_in']
+
+        await async_db.update_access_token(user_id, job_email, access_token, access_expires_in)
+
+        return {
+            "access_token": access_token,
+            "access_expires_in": access_expires_in
+        }
+
+    async def validate_token(self, job_id: str) -> Dict[str, Any]:
+        """
+        Async counterpart of AuthService.validate_token.
+        
+        Args:
+            job_id: The job ID
+            
+        return:
+            Dict with access_token and other token info
+            
+        Raises:
+            ValueError: If token validation fails
+            CredentialRevokedError: If the refresh token is revoked or expired
+        """
+        job_details = await async_db.get_job_details(job_id)
+        user_id = job_details['user_id']
+        job_email = job_details['Job_email']
+
+        token_info = await async_db.get_user_tokens(user_id, job_email)
+
+        if (not token_info['access_token'] or 
+            not token_info['access_expires_in'] or 
+            token_info['access_expires_in'] < time.time()):
+
+            lock = self._refresh_locks.setdefault(job_id, asyncio.Lock())
+            async with lock:
+                # another pipeline may have refreshed the token while we waited for the lock
+                token_info = await async_db.get_user_tokens(user_id, job_email)
+                if (not token_info['access_token'] or 
+                    not token_info['access_expires_in'] or 
+                    token_info['access_expires_in'] < time.time()):
+
+                    if not token_info['refresh_token']:
+                        raise ValueError("Refresh token is missing")
+                    check_credential(user_id, job_email, token_info['refresh_token'])
+
+                    new_token_info = await self.refresh_access_token(
+                        token_info['refresh_token'], user_id, job_email, job_id
+                    )
+                    token_info['access_token'] = new_token_info['access_token']
+                    token_info['access_expires_in'] = new_token_info['access_expires_in']
+
+        return {
+            "user_id": user_id,
+            "job_email": job_email,
+            "access_token": token_info['access_token'],
+            "access_expires_in": token_info['access_expires_in']
+        }
+
+# Create a singleton instance
+async_auth_service = AsyncAuthService()
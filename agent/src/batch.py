@@ -0,0 +1,306 @@
+import os
+import time
+import shutil
+import sqlite3
+import tempfile
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional
+import src.config as config
+
+
+def group_by_mailbox(jobs: List[Dict[str, Any]]) -> List[List[str]]:
+    """
+    Group job IDs by the mailbox they send from.
+
+    Args:
+        jobs: Dicts with id and Job_email
+
+    return:
+        Lists of job IDs sharing a sender mailbox, biggest group first
+    """
+    groups = defaultdict(list)
+    for job in jobs:
+        groups[(job.get("Job_email") or job["id"]).lower()].append(job["id"])
+    return sorted(groups.values(), key=len, reverse=True)
+
+
+def make_shards(groups: List[List[str]], shard_count: int) -> List[List[str]]:
+    """
+    Spread mailbox groups over shards, keeping each group in one shard (greedy, fewest jobs first).
+
+    Args:
+        groups: Job ID groups from group_by_mailbox
+        shard_count: Number of shards (worker processes)
+
+    return:
+        Non-empty lists of job IDs, one per shard
+    """
+    shards = [[] for _ in range(max(1, shard_count))]
+    for group in groups:
+        min(shards, key=len).extend(group)
+    return [shard for shard in shards if shard]
+
+
+class DeferredJobs:
+    """
+    Jobs a batch deferred at its deadline, in a SQLite file, so the next batch runs them first
+    (shard order is otherwise the same every time and the same tail jobs would always wait).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Open (and create) the deferred jobs file."""
+        self.path = path or config.BATCH_DEFERRED_PATH
+        self._conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+        self._conn.execute(
+            "create table if not exists batch_deferred (job_id text primary key, deferred_at real not null)"
+        )
+
+    def load(self) -> Dict[str, float]:
+        """Deferred job IDs with when they were first deferred."""
+        return dict(self._conn.execute("select job_id, deferred_at from batch_deferred").fetchall())
+
+    def update(self, job_results: Dict[str, Dict[str, Any]]) -> None:
+        """Remember the batch's deferred jobs (keeping when they were first deferred) and forget the ones that ran."""
+        deferred = [job_id for job_id, result in job_results.items() if result.get("deferred")]
+        ran = [job_id for job_id, result in job_results.items() if not result.get("deferred")]
+        self._conn.executemany(
+            "insert into batch_deferred (job_id, deferred_at) values (?, ?) on conflict (job_id) do nothing",
+            [(job_id, time.time()) for job_id in deferred]
+        )
+        self._conn.executemany("delete from batch_deferred where job_id = ?", [(job_id,) for job_id in ran])
+
+    def close(self) -> None:
+        """Close the file."""
+        self._conn.close()
+
+
+def deferred_first(job_ids: List[str], deferred: Dict[str, float]) -> List[str]:
+    """A shard's jobs with the ones deferred by earlier batches first, longest waiting first."""
+    return sorted(job_ids, key=lambda job_id: (job_id not in deferred, deferred.get(job_id, 0.0)))
+
+
+def job_deadline(deadline_at: float, jobs_left: int) -> float:
+    """
+    Seconds the next job of a shard may take: an equal share of the usable time left (after
+    RUN_DEADLINE_MARGIN) over the shard's remaining jobs, plus the margin the job keeps free
+    itself. Time a job does not use goes to the jobs after it.
+    """
+    usable = deadline_at - time.time() - config.RUN_DEADLINE_MARGIN
+    return config.RUN_DEADLINE_MARGIN + usable / max(1, jobs_left)
+
+
+def run_shard(job_ids: List[str], use_async: bool = False, results_path: Optional[str] = None,
+              include_bodies: bool = False, deadline_at: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Run a shard's jobs one after the other in this process.
+
+    Jobs of a mailbox share the process, so its token cache and send-limit state are reused
+    from one job to the next, and so are the warm Pinecone/Supabase clients of the sync
+    pipeline. With use_async each job runs its own event loop and arun closes its async
+    clients when the job ends, so they are rebuilt for every job.
+
+    Args:
+        job_ids: Jobs of the shard
+        use_async: Use the asyncio pipeline for each job
+        results_path: JSONL file per-member results are appended to ("-" for stdout, None to only
+            count them), a shard file of its own when the batch has several shards (see shard_results_paths)
+        include_bodies: Keep message bodies in the per-member results
+        deadline_at: Wall clock time (time.time()) the batch must end by, None for no deadline.
+            Each job gets a fair share of the time left (see job_deadline); jobs with no time left are not started
+
+    return:
+        Dict of job ID to that job's result (summary only, no detailed_results)
+    """
+    # imported here so every worker process builds its own clients
+    from src.main import main
+    from src.results import ResultSink, reserve_stdout
+
+    if not results_path:
+        stream = None
+    elif results_path == "-":
+        stream = reserve_stdout()
+    else:
+        stream = open(results_path, "a", encoding="utf-8")
+    results = {}
+    try:
+        for number, job_id in enumerate(job_ids):
+            # 0 means no deadline to RunBudget, so the batch passes the job's share explicitly
+            deadline_seconds = None
+            if deadline_at is not None:
+                if deadline_at - time.time() <= config.RUN_DEADLINE_MARGIN:
+                    results[job_id] = {"status": "no_action", "deferred": True,
+                                       "message": "Batch deadline reached, the job runs first in the next batch"}
+                    continue
+                deadline_seconds = job_deadline(deadline_at, len(job_ids) - number)
+            start = time.perf_counter()
+            sink = ResultSink(stream, include_bodies=include_bodies)
+            result = main(job_id=job_id, use_async=use_async, sink=sink, deadline_seconds=deadline_seconds)
+            result.pop("detailed_results", None)
+            result["seconds"] = round(time.perf_counter() - start, 2)
+            results[job_id] = result
+    finally:
+        if results_path and results_path != "-":
+            stream.close()
+    return results
+
+
+def shard_results_paths(results_path: str, shard_count: int) -> List[str]:
+    """
+    Create an empty results file per shard, so worker processes never write to the same file.
+
+    Args:
+        results_path: The batch's results file ("-" for stdout)
+        shard_count: Number of shards
+
+    return:
+        One file path per shard, next to results_path (in the temp directory for stdout)
+    """
+    directory = None if results_path == "-" else os.path.dirname(os.path.abspath(results_path))
+    paths = []
+    for number in range(shard_count):
+        handle, path = tempfile.mkstemp(prefix=f"results-shard{number}-", suffix=".jsonl", dir=directory)
+        os.close(handle)
+        paths.append(path)
+    return paths
+
+
+def merge_results(shard_paths: List[str], results_path: str) -> None:
+    """Append the shard files to the batch's results (stdout for "-") one after the other and delete them."""
+    from src.results import reserve_stdout
+
+    target = reserve_stdout() if results_path == "-" else open(results_path, "a", encoding="utf-8")
+    try:
+        for path in shard_paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as shard:
+                shutil.copyfileobj(shard, target)
+            os.remove(path)
+        target.flush()
+    finally:
+        if results_path != "-":
+            target.close()
+
+
+def aggregate(job_results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combine per-job results into one batch result.
+
+    The batch status follows run.py's exit-code contract: "success" when no job failed,
+    "no_action" when there was nothing to run, "error" when any job returned an error.
+
+    return:
+        Dict with status, summary (totals over every job) and jobs (per-job results)
+    """
+    totals = defaultdict(int)
+    for result in job_results.values():
+        totals[result.get("status", "unknown")] += 1
+        for key in ("total_members", "successful_responses", "errors", "no_action_needed"):
+            totals[key] += (result.get("summary") or {}).get(key, 0)
+
+    if not job_results:
+        status = "no_action"
+    elif totals["error"]:
+        status = "error"
+    else:
+        status = "success"
+
+    return {
+        "status": status,
+        "summary": {
+            "jobs": len(job_results),
+            "jobs_failed": totals["error"],
+            "jobs_deleted": totals["Job Agent deleted"],
+            "jobs_deferred": sum(1 for result in job_results.values() if result.get("deferred")),
+            "total_members": totals["total_members"],
+            "successful_responses": totals["successful_responses"],
+            "errors": totals["errors"],
+            "no_action_needed": totals["no_action_needed"]
+        },
+        "jobs": job_results
+    }
+
+
+def run_batch(job_ids: Optional[List[str]] = None, all_active: bool = False, use_async: bool = False,
+              results_path: Optional[str] = None, include_bodies: bool = False,
+              workers: Optional[int] = None, deadline_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Run many jobs in one invocation, sharded over a process pool by sender mailbox.
+
+    Args:
+        job_ids: Jobs to run (closed/unsubscribed ones get the usual schedule cleanup)
+        all_active: Run every active job of a subscribed user instead
+        use_async: Use the asyncio pipeline inside each job
+        results_path: JSONL file per-member results are appended to ("-" for stdout, None for none)
+        include_bodies: Keep message bodies in the per-member results
+        workers: Worker processes (defaults to BATCH_WORKERS)
+        deadline_seconds: Time budget of the whole batch (defaults to RUN_DEADLINE_SECONDS, 0 = none);
+            every shard runs against it, each job with a fair share of the time its shard has left.
+            Jobs deferred at the deadline are kept in BATCH_DEFERRED_PATH and run first next time
+
+    return:
+        Aggregated batch result (see aggregate)
+    """
+    try:
+        config.ensure_env_vars()
+        from src.database import db
+
+        deadline_seconds = config.RUN_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+        deadline_at = time.time() + deadline_seconds if deadline_seconds and deadline_seconds > 0 else None
+
+        if all_active:
+            jobs = db.get_active_jobs()
+        elif job_ids:
+            jobs = db.get_jobs_by_ids(job_ids)
+            # unknown ids still run so the missing job's schedule is cleaned up like a single run
+            found = {job["id"] for job in jobs}
+            jobs += [{"id": job_id} for job_id in job_ids if job_id not in found]
+        else:
+            return {"status": "error", "message": "Pass --all-active or --job-ids"}
+
+        if not jobs:
+            return aggregate({})
+
+        shards = make_shards(group_by_mailbox(jobs), workers or config.BATCH_WORKERS)
+        deferred_jobs = DeferredJobs() if deadline_at is not None else None
+        if deferred_jobs:
+            deferred = deferred_jobs.load()
+            shards = [deferred_first(shard, deferred) for shard in shards]
+        print(f"batch: {len(jobs)} jobs in {len(shards)} shards")
+
+        job_results = {}
+        if len(shards) == 1:
+            job_results.update(run_shard(shards[0], use_async, results_path, include_bodies, deadline_at))
+        else:
+            # every worker writes its own file, merged once the pool is done so records never interleave
+            shard_paths = shard_results_paths(results_path, len(shards)) if results_path else [None] * len(shards)
+            try:
+                # spawn, so no worker inherits the parent's open connections
+                with ProcessPoolExecutor(max_workers=len(shards),
+                                         mp_context=multiprocessing.get_context("spawn")) as pool:
+                    futures = {
+                        pool.submit(run_shard, shard, use_async, shard_path, include_bodies, deadline_at): shard
+                        for shard, shard_path in zip(shards, shard_paths)
+                    }
+                    for future in as_completed(futures):
+                        try:
+                            job_results.update(future.result())
+                        except Exception as e:
+                            # a crashed worker fails its whole shard, the other shards still count
+                            for job_id in futures[future]:
+                                job_results[job_id] = {"status": "error", "message": f"Worker failed: {str(e)}"}
+            finally:
+                if results_path:
+                    merge_results(shard_paths, results_path)
+
+        if deferred_jobs:
+            deferred_jobs.update(job_results)
+            deferred_jobs.close()
+        return aggregate(job_results)
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Batch run failed: {str(e)}"
+        }
@@ -0,0 +1,82 @@
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, Optional
+import src.config as config
+
+
+def utc_timestamp(moment: Optional[datetime] = None) -> str:
+    """A UTC timestamp as PostgREST filters & timestamptz columns take it."""
+    return (moment or datetime.now(timezone.utc)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class RunBudget:
+    """
+    Time budget of one run of a job.
+
+    A tick has a natural deadline, the schedule interval: a run that overruns it collides
+    with the next tick. With a deadline set, members are read in tiers, most likely to have
+    new activity first (database.MEMBER_TIERS: active, then carried over, then idle), and
+    no member is started once the time left would not fit another one (the average member
+    time so far plus RUN_DEADLINE_MARGIN). Members the run did not reach are marked
+    deferred and come before idle members on the next tick.
+    """
+
+    def __init__(self, deadline_seconds: Optional[float] = None, margin_seconds: Optional[float] = None):
+        """
+        Start the budget clock.
+
+        Args:
+            deadline_seconds: Seconds the run may take (defaults to RUN_DEADLINE_SECONDS, 0 = no deadline)
+            margin_seconds: Seconds kept free before the deadline (defaults to RUN_DEADLINE_MARGIN)
+        """
+        self.deadline_seconds = config.RUN_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+        self.margin_seconds = config.RUN_DEADLINE_MARGIN if margin_seconds is None else margin_seconds
+        self.start = time.monotonic()
+        self.started_at = utc_timestamp()
+        # members with a thread touched since then are "active" for the whole run
+        self.active_since = utc_timestamp(datetime.now(timezone.utc) - timedelta(hours=config.ACTIVE_WINDOW_HOURS))
+        self.halted = False
+        self.members = 0
+        self.member_seconds = 0.0
+        self.deferred = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the run has a deadline."""
+        return bool(self.deadline_seconds and self.deadline_seconds > 0)
+
+    def record(self, seconds: float) -> None:
+        """Count one processed member's time."""
+        self.members += 1
+        self.member_seconds += seconds
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline."""
+        return self.deadline_seconds - (time.monotonic() - self.start)
+
+    def exhausted(self) -> bool:
+        """
+        Whether no further member should be started. Halting is sticky: once the budget
+        is exhausted every later member of the run is deferred.
+        """
+        if not self.enabled:
+            return False
+        if not self.halted:
+            average = self.member_seconds / self.members if self.members else 0.0
+            self.halted = self.remaining() < self.margin_seconds + average
+        return self.halted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Budget use of the run.
+
+        return:
+            Dict with deadline_seconds, elapsed_seconds, avg_member_seconds, halted and deferred
+        """
+        return {
+            "deadline_seconds": self.deadline_seconds,
+            "elapsed_seconds": round(time.monotonic() - self.start, 2),
+            "avg_member_seconds": round(self.member_seconds / self.members, 3) if self.members else 0.0,
+            "halted": self.halted,
+            "deferred": self.deferred
+        }
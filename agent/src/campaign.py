@@ -0,0 +1,291 @@
+import time
+import asyncio
+from typing import Dict, Any, List, Optional
+from src.database import async_db, DatabaseService
+from src.auth import async_auth_service, CredentialRevokedError
+from src.email_service import email_service, async_email_service, SendLimitExceededError
+from src.vector_search import async_vector_search
+from src.results import ResultSink
+from src.leases import JobLeases
+from src.budget import utc_timestamp
+from src.notifications import notifier
+import src.config as config
+
+
+class Pacer:
+    """Spaces send starts to at most rate per second, however many workers share it."""
+
+    def __init__(self, rate: float):
+        """Initialize with the rate in sends per second (0 = no pacing)."""
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        """Wait for the next send slot."""
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class Campaign:
+    """
+    Initial outreach for every member of a job that has no thread yet.
+
+    The job is read once and every initial message is rendered from that snapshot. Sends go
+    through CAMPAIGN_CONCURRENCY workers paced to CAMPAIGN_SENDS_PER_SECOND with one token
+    validation per token lifetime (not per message), and only the sent message's Message-ID
+    is fetched back (metadata, no body). At most CAMPAIGN_MAX_SENDS messages go out per run,
+    and the campaign stops at the mailbox's daily send limit instead of failing half the
+    members; members not reached keep no thread and go out with the next campaign (or tick).
+    Thread details are recorded CAMPAIGN_RECORD_BATCH members per database call and after
+    every page of members. A member is only failed when its send failed: once a message is
+    out its thread is recorded, with the Message-ID the campaign sent it with when Gmail's
+    cannot be fetched back.
+    """
+
+    def __init__(self, job_id: str, sink: Optional[ResultSink] = None, sends_per_second: Optional[float] = None,
+                 concurrency: Optional[int] = None, max_sends: Optional[int] = None):
+        """
+        Initialize the campaign.
+
+        Args:
+            job_id: Job ID
+            sink: Where per-member results are streamed (default: counted only)
+            sends_per_second: Send rate of the mailbox (defaults to CAMPAIGN_SENDS_PER_SECOND)
+            concurrency: Sends in flight (defaults to CAMPAIGN_CONCURRENCY)
+            max_sends: Messages sent at most in this run (defaults to CAMPAIGN_MAX_SENDS)
+        """
+        self.job_id = job_id
+        self.sink = sink or ResultSink()
+        self.pacer = Pacer(config.CAMPAIGN_SENDS_PER_SECOND if sends_per_second is None else sends_per_second)
+        self.concurrency = concurrency or config.CAMPAIGN_CONCURRENCY
+        self.max_sends = config.CAMPAIGN_MAX_SENDS if max_sends is None else max_sends
+        self.job: Optional[Dict[str, Any]] = None
+        self.leases: Optional[JobLeases] = None
+        self.stopped: Optional[str] = None  # why sending stopped early
+        self.counts = {"sent": 0, "failed": 0, "not_sent": 0, "recorded": 0}
+        self._reserved = 0
+        self._token_info: Optional[Dict[str, Any]] = None
+        self._token_lock = asyncio.Lock()
+        self._rows: List[Dict[str, Any]] = []
+        self._message_rows: List[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+
+    async def _token(self) -> Dict[str, Any]:
+        """The job's token, validated again only when it is about to expire."""
+        async with self._token_lock:
+            token_info = self._token_info
+            if not token_info or (token_info.get('access_expires_in') or 0) < time.time() + 60:
+                self._token_info = await async_auth_service.validate_token(self.job_id)
+            return self._token_info
+
+    def _reserve(self) -> bool:
+        """Take one of the run's sends, False once the campaign is stopped or the cap is reached."""
+        if self.stopped:
+            return False
+        if self._reserved >= self.max_sends:
+            self.stopped = f"CAMPAIGN_MAX_SENDS ({self.max_sends}) reached"
+            return False
+        self._reserved += 1
+        return True
+
+    async def _send_one(self, member: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Send one member's initial message.
+
+        return:
+            The member's result entry
+        """
+        result = {"member_id": member['id'], "email": member['name_email']['email']}
+        if not self._reserve():
+            self.counts["not_sent"] += 1
+            return {**result, "status": "no_action", "message": f"Not sent: {self.stopped}"}
+
+        await self.pacer.wait()
+        # our own Message-ID, so the thread can be recorded even if fetching Gmail's back fails
+        outbound_message_id = email_service.new_message_id(self.job.get('Job_email'))
+        try:
+            token_info = await self._token()
+            email_data = email_service.build_first_message(self.job, member, outbound_message_id)
+            response = await async_email_service.send_prepared(self.job_id, email_data, token_info)
+        except SendLimitExceededError as e:
+            # the user's notification is queued, the other workers stop sending
+            self.stopped = f"Daily send limit reached: {str(e)}"
+            self.counts["not_sent"] += 1
+            return {**result, "status": "no_action", "message": f"Not sent: {self.stopped}"}
+        except CredentialRevokedError as e:
+            # every later send would fail the same way until the mailbox is reauthorized
+            self.stopped = str(e)
+            self.counts["failed"] += 1
+            return {**result, "status": "error", "message": f"Error sending initial message: {str(e)}"}
+        except Exception as e:
+            self.counts["failed"] += 1
+            return {**result, "status": "error", "message": f"Error sending initial message: {str(e)}"}
+
+        # sent: nothing from here on may fail the member, an unrecorded thread means a second initial message
+        self.counts["sent"] += 1
+        try:
+            message_id = await async_email_service.get_message_id(response.get("id"), token_info)
+        except Exception as e:
+            print(f"Could not fetch the Message-ID of the initial message to member {member['id']}, "
+                  f"recording the one it was sent with: {str(e)}")
+            message_id = None
+        message_id = message_id or outbound_message_id
+        self._rows.append({
+            "id": member['id'],
+            "thread_id": response.get("threadId"),
+            "message_id": message_id,
+            "subject": self.job.get('subject', 'Subject'),
+            "last_activity_at": utc_timestamp()
+        })
+        if config.MESSAGE_STORE_ENABLED:
+            try:
+                self._message_rows.append(DatabaseService._member_message_row(
+                    member['id'], response.get("id"), email_service.render_first_message(self.job, member),
+                    "outbound", message_id
+                ))
+            except Exception as e:
+                print(f"Could not store the initial message to member {member['id']}: {str(e)}")
+        if len(self._rows) >= config.CAMPAIGN_RECORD_BATCH:
+            await self._try_flush()
+        return {**result, "status": "success", "message": "Sent the default initial message"}
+
+    async def _try_flush(self) -> None:
+        """Flush, leaving the rows for the next flush when recording fails."""
+        try:
+            await self._flush()
+        except Exception as e:
+            print(f"Could not record sent initial messages of job {self.job_id}, retried with the next batch: {str(e)}")
+
+    async def _flush(self) -> None:
+        """Record the thread details (and stored messages) of the members sent to so far."""
+        async with self._flush_lock:
+            rows, self._rows = self._rows, []
+            message_rows, self._message_rows = self._message_rows, []
+            if rows:
+                try:
+                    self.counts["recorded"] += await async_db.record_member_threads(rows)
+                except Exception:
+                    # kept for the next flush: an unrecorded member would get a second initial message
+                    self._rows = rows + self._rows
+                    raise
+            if message_rows:
+                try:
+                    await async_db.append_member_messages(message_rows)
+                except Exception as e:
+                    print(f"Could not store sent messages of job {self.job_id}: {str(e)}")
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        """Send to members from the queue until the producer is done."""
+        while True:
+            member = await queue.get()
+            try:
+                if member is None:
+                    return
+                self.sink.write(self.job_id, await self._send_one(member))
+            except Exception as e:
+                # keep the worker alive, the producer waits on the queue
+                print(f"Campaign worker error for job {self.job_id}: {str(e)}")
+            finally:
+                queue.task_done()
+
+    async def arun(self) -> Dict[str, Any]:
+        """
+        Send the initial message to every member of the job without a thread.
+
+        return:
+            Dict with status, message and summary (per-member counts, sent, not_sent, recorded,
+            seconds, sends_per_second and why sending stopped early)
+        """
+        start = time.perf_counter()
+        try:
+            self.job = await async_db.get_job_details(self.job_id)
+            if not self.job or self.job["status"].lower() == "closed":
+                return {"status": "error", "message": f"Job {self.job_id} does not exist or is closed"}
+
+            # a regular run of the job must not send the same initial messages
+            if config.LEASES_ENABLED:
+                self.leases = JobLeases(self.job_id)
+                if not await asyncio.to_thread(self.leases.claim):
+                    return {"status": "no_action", "message": "Job is being processed by another agent run"}
+
+            queue: asyncio.Queue = asyncio.Queue(maxsize=2 * self.concurrency)
+            workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+            try:
+                async for page in async_db.iter_job_member_pages(self.job_id, uncontacted=True):
+                    for member in page:
+                        if self.leases and not self.leases.holds(member['id']):
+                            continue
+                        await queue.put(member)
+                    # record the page's sends before the next page, so a crash loses at most one page
+                    await queue.join()
+                    await self._try_flush()
+                    if self.stopped:
+                        break
+            finally:
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers, return_exceptions=True)
+                await self._flush()
+
+            seconds = time.perf_counter() - start
+            summary = {
+                **self.sink.summary(),
+                **self.counts,
+                "stopped": self.stopped,
+                "seconds": round(seconds, 2),
+                "sends_per_second": round(self.counts["sent"] / seconds, 2) if seconds else 0.0
+            }
+            if not self.sink.total:
+                return {"status": "no_action", "message": "Every member already has a thread", "summary": summary}
+            if not self.counts["sent"] and self.counts["failed"]:
+                return {"status": "error", "message": "No initial message could be sent", "summary": summary}
+            return {
+                "status": "success",
+                "message": f"Sent {self.counts['sent']} initial messages"
+                           + (f", stopped early: {self.stopped}" if self.stopped else ""),
+                "summary": summary
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Campaign failed: {str(e)}",
+                "summary": {**self.counts, "stopped": self.stopped, "unrecorded": [row["id"] for row in self._rows]}
+            }
+        finally:
+            if self.leases:
+                await asyncio.to_thread(self.leases.release)
+            await asyncio.to_thread(notifier.flush)
+            await asyncio.gather(
+                async_email_service.aclose(),
+                async_auth_service.aclose(),
+                async_vector_search.aclose(),
+                return_exceptions=True
+            )
+
+
+def run_campaign(job_id: str, sink: Optional[ResultSink] = None) -> Dict[str, Any]:
+    """
+    Run the initial outreach of a job (run.py --campaign).
+
+    Args:
+        job_id: Job ID
+        sink: Where per-member results are streamed
+
+    return:
+        The campaign result (see Campaign.arun)
+    """
+    try:
+        config.ensure_env_vars()
+        if not job_id:
+            return {"status": "error", "message": "A job ID is required for a campaign"}
+        return asyncio.run(Campaign(job_id, sink=sink).arun())
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Critical error: {str(e)}"
+        }
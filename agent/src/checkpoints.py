@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+from typing import Dict, Any, Optional
+import src.config as config
+
+
+# Tables the LangGraph SQLite savers keep a thread's checkpoints & pending writes in
+CHECKPOINT_TABLES = ("checkpoints", "writes")
+
+
+class GraphCheckpoints:
+    """
+    Persistent LangGraph checkpoints of the reply graph, in a SQLite file.
+
+    Each member's run of the graph is a checkpoint thread keyed by job, member and the
+    inbound Message-Id being answered, so a run that failed after generate (or any other
+    node) is resumed from the last completed node by the next tick instead of repeating the
+    LLM calls and the vector search. A thread is deleted once its reply is confirmed, and a
+    member keeps at most one thread: an unfinished run for an older message is dropped when
+    the member's next message is handled. Needs the optional langgraph-checkpoint-sqlite
+    package (and aiosqlite for the async pipeline).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Initialize with the checkpoint file (nothing is opened yet)."""
+        self.path = path or config.CHECKPOINT_PATH
+        self._saver = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def thread_id(job_id: str, member_id: str, inbound_message_id: str) -> str:
+        """Checkpoint thread of one member's reply to one inbound message."""
+        return f"{job_id}:{member_id}:{inbound_message_id}"
+
+    @staticmethod
+    def run_config(thread_id: str) -> Dict[str, Any]:
+        """Graph invoke config selecting a checkpoint thread."""
+        return {"configurable": {"thread_id": thread_id}}
+
+    def saver(self) -> Any:
+        """
+        The shared sync checkpointer (opened on first use).
+
+        Raises:
+            ValueError: If langgraph-checkpoint-sqlite is not installed
+        """
+        with self._lock:
+            if self._saver is None:
+                try:
+                    from langgraph.checkpoint.sqlite import SqliteSaver
+                except ImportError:
+                    raise ValueError("CHECKPOINT_ENABLED needs the langgraph-checkpoint-sqlite package")
+                saver = SqliteSaver(sqlite3.connect(self.path, check_same_thread=False))
+                saver.setup()
+                self._saver = saver
+            return self._saver
+
+    async def aopen(self) -> Any:
+        """
+        A new async checkpointer for the running event loop (close it with aclose).
+
+        Raises:
+            ValueError: If langgraph-checkpoint-sqlite or aiosqlite is not installed
+        """
+        try:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError:
+            raise ValueError("CHECKPOINT_ENABLED with --async needs the langgraph-checkpoint-sqlite and aiosqlite packages")
+        saver = AsyncSqliteSaver(await aiosqlite.connect(self.path))
+        await saver.setup()
+        return saver
+
+    @staticmethod
+    async def aclose(saver: Any) -> None:
+        """Close an async checkpointer from aopen."""
+        await saver.conn.close()
+
+    @staticmethod
+    def _delete_sql(table: str, keep: Optional[str]) -> str:
+        """Delete statement for a member's threads (prefix match), sparing keep when given."""
+        sql = f"delete from {table} where substr(thread_id, 1, length(?)) = ?"
+        return sql + " and thread_id != ?" if keep else sql
+
+    @staticmethod
+    def _member_prefix(job_id: str, member_id: str) -> str:
+        """Start of every checkpoint thread id of a member."""
+        return f"{job_id}:{member_id}:"
+
+    def clear(self, job_id: str, member_id: str, keep: Optional[str] = None) -> None:
+        """
+        Delete a member's checkpoint threads.
+
+        Args:
+            job_id: Job ID
+            member_id: Member ID
+            keep: Thread to keep (the one being resumed)
+        """
+        prefix = self._member_prefix(job_id, member_id)
+        params = (prefix, prefix, keep) if keep else (prefix, prefix)
+        with self.saver().cursor() as cursor:
+            for table in CHECKPOINT_TABLES:
+                cursor.execute(self._delete_sql(table, keep), params)
+
+    async def aclear(self, saver: Any, job_id: str, member_id: str, keep: Optional[str] = None) -> None:
+        """Async counterpart of clear, on the checkpointer from aopen."""
+        prefix = self._member_prefix(job_id, member_id)
+        params = (prefix, prefix, keep) if keep else (prefix, prefix)
+        async with saver.lock:
+            for table in CHECKPOINT_TABLES:
+                await saver.conn.execute(self._delete_sql(table, keep), params)
+            await saver.conn.commit()
+
+# Create a singleton instance
+graph_checkpoints = GraphCheckpoints()
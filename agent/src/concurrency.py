@@ -0,0 +1,252 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+import httpx
+import requests
+import src.config as config
+
+
+# Errors of a call that never got an answer: the service is too slow or dropping connections
+OVERLOAD_ERRORS = (
+    TimeoutError,
+    ConnectionError,
+    httpx.TimeoutException,
+    httpx.NetworkError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ConnectionError,
+)
+
+
+def is_overload(error: BaseException) -> bool:
+    """
+    Whether a failed call means the service is overloaded: a 429/5xx status (on the error or
+    its response), a timeout or a dropped connection. Any other error (a bad request, a revoked
+    credential, a bug of ours) says nothing about the service's load.
+    """
+    if isinstance(error, OVERLOAD_ERRORS):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if not isinstance(status, int):
+        return False
+    return status == 429 or status >= 500
+
+
+class _Slot:
+    """One call's place under an AdaptiveLimiter (async context manager)."""
+
+    def __init__(self, limiter: "AdaptiveLimiter"):
+        self.limiter = limiter
+        self.start = 0.0
+        self.overloaded = False
+
+    def observe(self, status_code: int) -> None:
+        """Report the HTTP status of a call that returned (429/5xx count as overload)."""
+        self.overloaded = status_code == 429 or status_code >= 500
+
+    async def __aenter__(self) -> "_Slot":
+        await self.limiter.acquire()
+        self.start = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        if exc is not None and not isinstance(exc, asyncio.CancelledError):
+            self.overloaded = self.overloaded or is_overload(exc)
+        self.limiter.release(time.monotonic() - self.start, self.overloaded)
+        return False
+
+
+class _SyncSlot(_Slot):
+    """One call's place under a SyncAdaptiveLimiter (context manager)."""
+
+    def __enter__(self) -> "_SyncSlot":
+        self.limiter.acquire()
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc is not None:
+            self.overloaded = self.overloaded or is_overload(exc)
+        self.limiter.release(time.monotonic() - self.start, self.overloaded)
+        return False
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one downstream service (the LLM, Gmail) of the asyncio pipeline
+    (SyncAdaptiveLimiter is the sync pipeline's).
+
+    Calls wait for a slot while limit calls are in flight. Every healthy call that ran with the
+    limit at least half used adds 1/limit (about +1 per round of calls); a 429/5xx, a timeout or
+    a short-term latency average above CONCURRENCY_LATENCY_TOLERANCE times the long-term one
+    multiplies the limit by CONCURRENCY_BACKOFF, at most once per round trip. So concurrency
+    follows what the account's plan and the time of day allow instead of a fixed worker count.
+    Disabled (ADAPTIVE_CONCURRENCY=false) nothing waits and only the call stats are kept.
+    """
+
+    def __init__(self, name: str, initial: int, min_limit: int, max_limit: int,
+                 backoff: Optional[float] = None, latency_tolerance: Optional[float] = None,
+                 enabled: Optional[bool] = None):
+        """
+        Initialize the limiter.
+
+        Args:
+            name: Service name (for logs & stats)
+            initial: Starting limit
+            min_limit: Lowest limit cuts go down to
+            max_limit: Highest limit increases go up to
+            backoff: Factor the limit is multiplied by on overload (defaults to CONCURRENCY_BACKOFF)
+            latency_tolerance: Short/long latency ratio counted as overload (defaults to CONCURRENCY_LATENCY_TOLERANCE)
+            enabled: Enforce the limit (defaults to ADAPTIVE_CONCURRENCY)
+        """
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.backoff = config.CONCURRENCY_BACKOFF if backoff is None else backoff
+        self.latency_tolerance = config.CONCURRENCY_LATENCY_TOLERANCE if latency_tolerance is None else latency_tolerance
+        self.enabled = config.ADAPTIVE_CONCURRENCY if enabled is None else enabled
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._short: Optional[float] = None  # fast latency average (the last few calls)
+        self._long: Optional[float] = None  # slow latency average (the baseline)
+        self._last_cut = 0.0
+        self.stats = {"calls": 0, "overloads": 0, "slow": 0, "increases": 0, "decreases": 0,
+                      "waits": 0, "peak_in_flight": 0, "lowest_limit": self.limit, "highest_limit": self.limit}
+
+    def slot(self) -> _Slot:
+        """A slot for one call: async with limiter.slot() as slot: ..."""
+        return _Slot(self)
+
+    async def acquire(self) -> None:
+        """Wait until a call may start."""
+        if self.enabled and self.in_flight >= int(self.limit):
+            self.stats["waits"] += 1
+            while self.in_flight >= int(self.limit):
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                try:
+                    await waiter
+                except asyncio.CancelledError:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                    else:
+                        # woken but cancelled: pass the wake-up on
+                        self._wake()
+                    raise
+        self.in_flight += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.in_flight)
+
+    def release(self, latency: float, overloaded: bool) -> None:
+        """Finish a call, adapt the limit to how it went and let waiting calls start."""
+        used = self.in_flight
+        self.in_flight -= 1
+        self.stats["calls"] += 1
+        slow = self._observe_latency(latency)
+        if self.enabled:
+            self._adjust(used, overloaded, slow)
+            self._wake()
+
+    def _observe_latency(self, latency: float) -> bool:
+        """Update the latency averages. True when latency is rising well above the baseline."""
+        if self._short is None:
+            self._short = self._long = latency
+            return False
+        self._short = 0.3 * latency + 0.7 * self._short
+        self._long = 0.05 * latency + 0.95 * self._long
+        return self.stats["calls"] >= 10 and self._short > self._long * self.latency_tolerance
+
+    def _adjust(self, used: int, overloaded: bool, slow: bool) -> None:
+        """Additive increase on healthy calls, multiplicative decrease on overload."""
+        if overloaded or slow:
+            self.stats["overloads" if overloaded else "slow"] += 1
+            now = time.monotonic()
+            # one cut per round trip: the calls in flight saw the same congestion
+            if now - self._last_cut >= (self._short or 0.0):
+                previous = self.limit
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_cut = now
+                if self.limit < previous:
+                    self.stats["decreases"] += 1
+                    print(f"{self.name} concurrency limit cut to {int(self.limit)}")
+                self.stats["lowest_limit"] = min(self.stats["lowest_limit"], self.limit)
+        elif used * 2 >= self.limit and self.limit < self.max_limit:
+            # only grow a limit that is actually being used
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self.stats["increases"] += 1
+            self.stats["highest_limit"] = max(self.stats["highest_limit"], self.limit)
+
+    def _wake(self) -> None:
+        """Wake as many waiting calls as there are free slots."""
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Limiter state & counters.
+
+        return:
+            Dict with enabled, limit, min/max, in_flight, latency averages and the counters
+        """
+        return {
+            "enabled": self.enabled,
+            "limit": int(self.limit),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "latency_ms_recent": round(self._short * 1000, 1) if self._short is not None else None,
+            "latency_ms_baseline": round(self._long * 1000, 1) if self._long is not None else None,
+            **{key: (round(value, 2) if isinstance(value, float) else value) for key, value in self.stats.items()}
+        }
+
+
+class SyncAdaptiveLimiter(AdaptiveLimiter):
+    """
+    Thread-safe counterpart of AdaptiveLimiter for the sync pipeline, whose DAG branches and
+    batch jobs call the same services from several threads: with limiter.slot() as slot: ...
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        """Initialize the limiter (same arguments as AdaptiveLimiter)."""
+        super().__init__(*args, **kwargs)
+        self._condition = threading.Condition()
+
+    def slot(self) -> _SyncSlot:
+        """A slot for one call: with limiter.slot() as slot: ..."""
+        return _SyncSlot(self)
+
+    def acquire(self) -> None:
+        """Block until a call may start."""
+        with self._condition:
+            if self.enabled and self.in_flight >= int(self.limit):
+                self.stats["waits"] += 1
+                self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.in_flight)
+
+    def release(self, latency: float, overloaded: bool) -> None:
+        """Finish a call, adapt the limit to how it went and let waiting calls start."""
+        with self._condition:
+            super().release(latency, overloaded)
+
+    def _wake(self) -> None:
+        """Wake the waiting threads (caller holds the condition), each rechecks the limit."""
+        self._condition.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Limiter state & counters (see AdaptiveLimiter.get_stats)."""
+        with self._condition:
+            return super().get_stats()
+
+# Create singleton instances, one per downstream service and pipeline
+llm_limiter = AdaptiveLimiter("llm", config.LLM_CONCURRENCY_INITIAL, config.LLM_CONCURRENCY_MIN, config.LLM_CONCURRENCY_MAX)
+gmail_limiter = AdaptiveLimiter("gmail", config.GMAIL_CONCURRENCY_INITIAL, config.GMAIL_CONCURRENCY_MIN, config.GMAIL_CONCURRENCY_MAX)
+llm_sync_limiter = SyncAdaptiveLimiter("llm", config.LLM_CONCURRENCY_INITIAL, config.LLM_CONCURRENCY_MIN, config.LLM_CONCURRENCY_MAX)
+gmail_sync_limiter = SyncAdaptiveLimiter("gmail", config.GMAIL_CONCURRENCY_INITIAL, config.GMAIL_CONCURRENCY_MIN, config.GMAIL_CONCURRENCY_MAX)
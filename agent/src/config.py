@@ -11,6 +11,228 @@ MAX_RETRIES = 3
 RETRY_BACKOFF = 2
 
 
+# Prompt size settings
+# Max characters of the quoted conversation thread passed to the LLM as history (most recent first)
+MAX_HISTORY_CHARS = int(os.environ.get("MAX_HISTORY_CHARS", 6000))
+# Max decoded bytes kept from an inbound message body (the rest is dropped before it reaches memory or the prompt)
+MAX_BODY_BYTES = int(os.environ.get("MAX_BODY_BYTES", 64000))
+# Text bodies Gmail stores behind an attachmentId are only fetched when at most this size
+MAX_BODY_FETCH_BYTES = int(os.environ.get("MAX_BODY_FETCH_BYTES", 1000000))
+
+
+# Message storage settings
+# Store each message's new text in member_messages instead of overwriting members.body
+# (run migrations/001_member_messages.sql first)
+MESSAGE_STORE_ENABLED = os.environ.get("MESSAGE_STORE_ENABLED", "false").lower() == "true"
+# Compress stored message text
+MESSAGE_COMPRESSION = os.environ.get("MESSAGE_COMPRESSION", "true").lower() == "true"
+# Messages shorter than this many bytes are stored uncompressed
+MESSAGE_COMPRESS_MIN_BYTES = int(os.environ.get("MESSAGE_COMPRESS_MIN_BYTES", 512))
+# Latest stored messages the conversation history is rebuilt from
+HISTORY_MESSAGES = int(os.environ.get("HISTORY_MESSAGES", 20))
+
+
+# Reply outbox settings
+# Record each reply in reply_outbox before sending it and resume unfinished ones instead of regenerating
+# (run migrations/004_reply_outbox.sql first)
+OUTBOX_ENABLED = os.environ.get("OUTBOX_ENABLED", "false").lower() == "true"
+
+
+# Graph checkpoint settings (see src/checkpoints.py, needs langgraph-checkpoint-sqlite)
+# Checkpoint every graph step so a member whose run failed part way resumes from the last completed node
+CHECKPOINT_ENABLED = os.environ.get("CHECKPOINT_ENABLED", "false").lower() == "true"
+# SQLite file the checkpoints are kept in
+CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH", "agent_checkpoints.db")
+
+
+# Async pipeline settings
+# Max member pipelines in flight at once in EmailAutomationApp.arun()
+MAX_CONCURRENT_MEMBERS = int(os.environ.get("MAX_CONCURRENT_MEMBERS", 100))
+# Members read per query when streaming a job's members (keep under the PostgREST max rows, 1000 by default)
+MEMBER_PAGE_SIZE = int(os.environ.get("MEMBER_PAGE_SIZE", 500))
+# Errors kept (member & message) in a run summary, the rest are only counted
+RESULT_ERROR_SAMPLES = int(os.environ.get("RESULT_ERROR_SAMPLES", 10))
+
+
+
+# Adaptive concurrency settings (see src/concurrency.py, sync & asyncio pipelines)
+# Limit LLM & Gmail calls in flight with an AIMD limit that follows the services' latency & 429/5xx answers
+ADAPTIVE_CONCURRENCY = os.environ.get("ADAPTIVE_CONCURRENCY", "false").lower() == "true"
+# Starting, lowest & highest number of LLM calls in flight
+LLM_CONCURRENCY_INITIAL = int(os.environ.get("LLM_CONCURRENCY_INITIAL", 8))
+LLM_CONCURRENCY_MIN = int(os.environ.get("LLM_CONCURRENCY_MIN", 1))
+LLM_CONCURRENCY_MAX = int(os.environ.get("LLM_CONCURRENCY_MAX", 64))
+# Starting, lowest & highest number of Gmail API calls in flight
+GMAIL_CONCURRENCY_INITIAL = int(os.environ.get("GMAIL_CONCURRENCY_INITIAL", 10))
+GMAIL_CONCURRENCY_MIN = int(os.environ.get("GMAIL_CONCURRENCY_MIN", 1))
+GMAIL_CONCURRENCY_MAX = int(os.environ.get("GMAIL_CONCURRENCY_MAX", 50))
+# Factor a limit is multiplied by on a 429/5xx, a timeout or rising latency
+CONCURRENCY_BACKOFF = float(os.environ.get("CONCURRENCY_BACKOFF", 0.5))
+# Recent latency this many times the baseline counts as overload
+CONCURRENCY_LATENCY_TOLERANCE = float(os.environ.get("CONCURRENCY_LATENCY_TOLERANCE", 2.0))
+
+
+# Hedging settings (see src/hedging.py)
+# Send a second identical LLM request when the first is slower than usual, the first answer wins
+HEDGING_ENABLED = os.environ.get("HEDGING_ENABLED", "false").lower() == "true"
+# Percentile of a call site's recent latencies after which a call is hedged
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", 95))
+# Max share of a call site's calls that may be hedged
+HEDGE_BUDGET = float(os.environ.get("HEDGE_BUDGET", 0.05))
+# Recent latencies kept per call site
+HEDGE_WINDOW = int(os.environ.get("HEDGE_WINDOW", 200))
+# Latencies a call site needs before its calls are hedged
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", 20))
+# Never hedge before this many seconds
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", 0.5))
+# Worker threads for hedged calls of the sync pipeline
+HEDGE_WORKERS = int(os.environ.get("HEDGE_WORKERS", 4))
+
+
+# Notification settings (see src/notifications.py)
+# Seconds within which an identical notification is not sent again to a job's owner (0 = no dedup across runs)
+NOTIFY_DEDUP_WINDOW = int(os.environ.get("NOTIFY_DEDUP_WINDOW", 21600))
+# SQLite file recording when each job's notifications were last sent
+NOTIFY_LOG_PATH = os.environ.get("NOTIFY_LOG_PATH", "agent_notifications.db")
+
+
+# Negative cache settings (see src/negative_cache.py)
+# Remember revoked refresh tokens and closed/unsubscribed jobs so their work fails fast
+NEGATIVE_CACHE_ENABLED = os.environ.get("NEGATIVE_CACHE_ENABLED", "true").lower() == "true"
+# SQLite file the entries are kept in between runs
+NEGATIVE_CACHE_PATH = os.environ.get("NEGATIVE_CACHE_PATH", "agent_negative_cache.db")
+# Seconds a revoked refresh token is remembered (reauthorizing the mailbox clears it right away)
+NEGATIVE_CACHE_CREDENTIAL_TTL = int(os.environ.get("NEGATIVE_CACHE_CREDENTIAL_TTL", 86400))
+# Seconds a closed/unsubscribed job is skipped without reading it again
+NEGATIVE_CACHE_JOB_TTL = int(os.environ.get("NEGATIVE_CACHE_JOB_TTL", 3600))
+
+
+# Run budget settings (see src/budget.py, run migrations/005_member_priority.sql first)
+# Seconds a run may take, normally the schedule interval (0 = no deadline, members read in id order)
+RUN_DEADLINE_SECONDS = float(os.environ.get("RUN_DEADLINE_SECONDS", 0))
+# Seconds kept free before the deadline on top of the average member time
+RUN_DEADLINE_MARGIN = float(os.environ.get("RUN_DEADLINE_MARGIN", 10))
+# Members without a thread yet or touched within this many hours are read first
+ACTIVE_WINDOW_HOURS = int(os.environ.get("ACTIVE_WINDOW_HOURS", 72))
+
+
+# Campaign settings (run.py --campaign, see src/campaign.py and migrations/006_record_member_threads.sql)
+# Initial messages sent per second from the job's mailbox
+CAMPAIGN_SENDS_PER_SECOND = float(os.environ.get("CAMPAIGN_SENDS_PER_SECOND", 2))
+# Sends in flight at once
+CAMPAIGN_CONCURRENCY = int(os.environ.get("CAMPAIGN_CONCURRENCY", 4))
+# Initial messages sent at most per campaign run (keep below the mailbox's daily limit, replies need some too)
+CAMPAIGN_MAX_SENDS = int(os.environ.get("CAMPAIGN_MAX_SENDS", 400))
+# Members whose thread details are recorded per database call
+CAMPAIGN_RECORD_BATCH = int(os.environ.get("CAMPAIGN_RECORD_BATCH", 25))
+
+
+# Lease settings (see src/leases.py, run migrations/003_agent_leases.sql first for the supabase backend)
+# Claim a job's member partitions before processing them, so overlapping runs/replicas never double-reply
+LEASES_ENABLED = os.environ.get("LEASES_ENABLED", "false").lower() == "true"
+# supabase (shared by every replica) | sqlite (single host / tests)
+LEASE_BACKEND = os.environ.get("LEASE_BACKEND", "supabase")
+# SQLite file of the sqlite backend
+LEASE_SQLITE_PATH = os.environ.get("LEASE_SQLITE_PATH", "agent_leases.db")
+# Seconds a lease lasts without a heartbeat (heartbeats run every third of it)
+LEASE_TTL = int(os.environ.get("LEASE_TTL", 300))
+# Member partitions per job, each leased separately (1 = the whole job goes to one agent)
+LEASE_PARTITIONS = int(os.environ.get("LEASE_PARTITIONS", 1))
+
+
+# Batch settings (run.py --all-active / --job-ids)
+# Worker processes jobs are sharded over (jobs of one sender mailbox stay in one process)
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1))
+# SQLite file of the jobs a batch deferred at its deadline (they run first in the next batch)
+BATCH_DEFERRED_PATH = os.environ.get("BATCH_DEFERRED_PATH", "agent_batch_deferred.db")
+
+
+# Retrieval settings
+# Search the knowledge base with the member's raw message while the first LLM call runs
+# (off by default: every reply pays an extra embedding call & query, used or not)
+SPECULATIVE_RETRIEVAL = os.environ.get("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+# Best-match score at which the speculative results are used and the second query is skipped
+SPECULATIVE_CONFIDENCE = float(os.environ.get("SPECULATIVE_CONFIDENCE", 0.88))
+# Max estimated tokens of retrieved context put in the reply prompt
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 600))
+# Word overlap (Jaccard) at which a retrieved chunk counts as a duplicate of a better one
+CONTEXT_DEDUP_SIMILARITY = float(os.environ.get("CONTEXT_DEDUP_SIMILARITY", 0.8))
+
+
+# Rerank settings (see src/rerank.py)
+# none | pinecone (hosted rerank model) | lexical (local BM25) | cross-encoder (local model)
+RERANKER = os.environ.get("RERANKER", "none")
+# Chunks fetched from the index before reranking
+RERANK_FETCH_K = int(os.environ.get("RERANK_FETCH_K", 20))
+# Chunks kept after reranking
+RERANK_KEEP = int(os.environ.get("RERANK_KEEP", 2))
+# Hosted rerank model (RERANKER=pinecone)
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "bge-reranker-v2-m3")
+# Local cross-encoder model directory (RERANKER=cross-encoder)
+RERANK_MODEL_PATH = os.environ.get("RERANK_MODEL_PATH", "")
+
+
+# Answer cache settings (reuse generated answers for repeated questions within a job)
+# Off by default: enabled, replies are written without the member's conversation history so they can be shared
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+# Min cosine similarity between question embeddings for a cached answer to be reused
+ANSWER_CACHE_SIMILARITY = float(os.environ.get("ANSWER_CACHE_SIMILARITY", 0.95))
+# Seconds a cached answer stays valid
+ANSWER_CACHE_TTL = int(os.environ.get("ANSWER_CACHE_TTL", 3600))
+# Cached answers kept per job (least recently used evicted first)
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 256))
+# Seconds before a job's knowledge base / default_message fingerprint is checked again
+ANSWER_CACHE_FINGERPRINT_TTL = int(os.environ.get("ANSWER_CACHE_FINGERPRINT_TTL", 60))
+
+
+# Precomputed FAQ settings (see src/faq_store.py)
+FAQ_ENABLED = os.environ.get("FAQ_ENABLED", "true").lower() == "true"
+# Min similarity between an inbound question and a FAQ question to answer from the FAQ
+FAQ_MATCH_THRESHOLD = float(os.environ.get("FAQ_MATCH_THRESHOLD", 0.9))
+# Knowledge base characters given to the LLM per FAQ generation call
+FAQ_WINDOW_CHARS = int(os.environ.get("FAQ_WINDOW_CHARS", 3000))
+# Questions written per window
+FAQ_QUESTIONS_PER_WINDOW = int(os.environ.get("FAQ_QUESTIONS_PER_WINDOW", 8))
+# Store generated answers as approved (set to false to review them before they are used)
+FAQ_AUTO_APPROVE = os.environ.get("FAQ_AUTO_APPROVE", "true").lower() == "true"
+# Seconds a job's knowledge base fingerprint (FAQ staleness check) is reused before the chunks are read again
+FAQ_FINGERPRINT_TTL = int(os.environ.get("FAQ_FINGERPRINT_TTL", 300))
+# Texts per embedding request
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 96))
+
+
+# Pinecone index settings
+# Connections per cached Pinecone index client
+PINECONE_POOL_SIZE = int(os.environ.get("PINECONE_POOL_SIZE", 8))
+# Seconds index stats (namespace vector counts) are cached before describe_index_stats runs again
+NAMESPACE_STATS_TTL = int(os.environ.get("NAMESPACE_STATS_TTL", 60))
+
+
+
+# Ingestion settings (see src/ingest.py)
+# Max characters per knowledge base chunk
+INGEST_CHUNK_CHARS = int(os.environ.get("INGEST_CHUNK_CHARS", 500))
+# Vectors per upsert request
+INGEST_UPSERT_BATCH = int(os.environ.get("INGEST_UPSERT_BATCH", 100))
+# Upsert requests in flight
+INGEST_UPSERT_WORKERS = int(os.environ.get("INGEST_UPSERT_WORKERS", 4))
+
+
+# Embedding settings (see src/embeddings.py)
+# pinecone (hosted) | onnx (local CPU model) | deterministic (test stand-in, no network)
+EMBED_BACKEND = os.environ.get("EMBED_BACKEND", "pinecone")
+# Hosted model, the index is built with it
+EMBED_MODEL = os.environ.get("EMBED_MODEL", "multilingual-e5-large")
+# Vector size of the index
+EMBED_DIMENSION = int(os.environ.get("EMBED_DIMENSION", 1024))
+# Local ONNX export of EMBED_MODEL (directory with tokenizer.json and model.onnx / model_quantized.onnx)
+EMBED_MODEL_PATH = os.environ.get("EMBED_MODEL_PATH", "")
+# Texts per local model call
+LOCAL_EMBED_BATCH_SIZE = int(os.environ.get("LOCAL_EMBED_BATCH_SIZE", 16))
+# CPU threads for the local model (0 lets onnxruntime decide)
+LOCAL_EMBED_THREADS = int(os.environ.get("LOCAL_EMBED_THREADS", 0))
+
+
 # Required environment variables
 REQUIRED_ENV_VARS = [
     "COHERE_API_KEY", 
@@ -1,10 +1,42 @@
 import os
 import json
-from typing import Dict, Any, Optional, Union, List
-from supabase import create_client, Client
-from src.utils import retry_with_backoff
+import zlib
+import base64
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Union, List, Iterator, AsyncIterator
+from supabase import create_client, Client, acreate_client, AsyncClient
+from src.utils import retry_with_backoff, async_retry_with_backoff
 import src.config as config
 
+
+# Member columns the agent is allowed to write
+MEMBER_UPDATE_FIELDS = [
+    "thread_id", 
+    "message_id", 
+    "overall_message_id", 
+    "subject", 
+    "reference_id",
+    "body",
+    "last_activity_at"
+]
+
+# Append-only per-message table (see migrations/001_member_messages.sql)
+MEMBER_MESSAGES_TABLE = "member_messages"
+
+# Replies recorded before they are sent (see migrations/004_reply_outbox.sql)
+REPLY_OUTBOX_TABLE = "reply_outbox"
+
+# Outbox statuses of a reply that still needs work (not done/superseded)
+OUTBOX_OPEN_STATUSES = ["pending", "sent"]
+
+# Member columns needed to decide whether a member has a new message (no body/response)
+MEMBER_SCAN_FIELDS = "id, name_email, thread_id, message_id"
+
+# Disjoint member tiers a time-budgeted run reads in order (see src/budget.py & migrations/005_member_priority.sql):
+# active (no thread yet or touched within ACTIVE_WINDOW_HOURS), deferred (carried over by an earlier run), idle
+MEMBER_TIERS = ("active", "deferred", "idle")
+
+
 class DatabaseService:
     """
     Handles all interactions with the Supabase database.
@@ -37,6 +69,52 @@ class DatabaseService:
         except Exception as e:
             raise ConnectionError(f"Could not connect to Supabase: {str(e)}")
     
+    @staticmethod
+    def _tokens_for_email(values: List[Dict[str, Any]], email: str) -> Dict[str, Any]:
+        """
+        Pick the tokens of one email out of a profile's sender array.
+        
+        Raises:
+            ValueError: If the email has no refresh token
+        """
+        access_token = next((value.get('access_token') for value in values 
+                            if value.get('email') == email), None)
+        refresh_token = next((value.get('refresh_token') for value in values 
+                            if value.get('email') == email), None)
+        access_expires_in = next((value.get('access_expires_in') for value in values 
+                                if value.get('email') == email), None)
+        
+        if not refresh_token:
+            raise ValueError(f"Missing refresh tokens for email: {email}")
+        
+        return {
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "access_expires_in": access_expires_in
+        }
+
+    @staticmethod
+    def _set_sender_token(sender_array: Optional[List[Dict[str, Any]]], email: str, 
+                          access_token: str, access_expires_in: int) -> List[Dict[str, Any]]:
+        """
+        Set the access token of one email in a profile's sender array.
+        
+        Raises:
+            ValueError: If the email is no longer in the sender array
+        """
+        if sender_array is None:
+            sender_array = []
+        
+        for i, sender_obj in enumerate(sender_array):
+            if sender_obj.get('email') == email:
+                # Update this object
+                sender_array[i]['access_token'] = access_token
+                sender_array[i]['access_expires_in'] = access_expires_in
+                return sender_array
+        
+        print(f"Email {email} not found in sender array.")
+        raise ValueError(f"Email {email} not found in sender array. User must have removed from settings after creating Job. Inform them to add it back or end the Job.")
+
     @retry_with_backoff()#check jobs
     def get_job_details(self, job_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -90,21 +168,7 @@ class DatabaseService:
             values = tokens_query.data[0]['sender']
             
             # Extract tokens for the specific email
-            access_token = next((value.get('access_token') for value in values 
-                                if value.get('email') == email), None)
-            refresh_token = next((value.get('refresh_token') for value in values 
-                                if value.get('email') == email), None)
-            access_expires_in = next((value.get('access_expires_in') for value in values 
-                                    if value.get('email') == email), None)
-            
-            if not refresh_token:
-                raise ValueError(f"Missing refresh tokens for email: {email}")
-            
-            return {
-                "access_token": access_token,
-                "refresh_token": refresh_token,
-                "access_expires_in": access_expires_in
-            }
+            return self._tokens_for_email(values, email)
         except Exception as e:
             raise
     
@@ -139,29 +203,9 @@ class DatabaseService:
             
             # Get the current sender array
             sender_array = query.data[0].get('sender', [])
-            if sender_array is None:
-                sender_array = []
             
             # Step 2: Find and update the object matching the email
-            email_found = False
-            for i, sender_obj in enumerate(sender_array):
-                if sender_obj.get('email') == email:
-                    # Update this object
-                    sender_array[i]['access_token'] = access_token
-                    sender_array[i]['access_expires_in'] = access_expires_in
-                    email_found = True
-                    break
-            
-            if not email_found:
-                print(f"Email {email} not found in sender array. Adding new entry.")
-                sender_array.append({
-                    'email': email,
-                    'access_token': access_token,
-                    'access_expires_in': access_expires_in,
-                    # Include a placeholder refresh_token to prevent errors in get_user_tokens
-                    'refresh_token': 'placeholder_refresh_token'
-                })
-                raise ValueError(f"Email {email} not found in sender array. User must have removed from settings after creating Job. Inform them to add it back or end the Job.")
+            sender_array = self._set_sender_token(sender_array, email, access_token, access_expires_in)
             
             # Step 3: Update the entire sender array
             update_result = (self.client.table('profiles')
@@ -221,6 +265,58 @@ class DatabaseService:
             raise
 
     @retry_with_backoff()
+    def get_job_state(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a job's status and its owner's subscription status in one query
+        (the job_state function, see migrations/007_job_state.sql).
+        
+        Args:
+            job_id: The UUID of the job
+            
+        Returns:
+            Dict with status and subscription_status, or None if the job does not exist
+        """
+        try:
+            response = self.client.rpc('job_state', {"p_job_id": job_id}).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            raise
+
+    @retry_with_backoff()
+    def get_active_jobs(self) -> List[Dict[str, Any]]:
+        """
+        Get every job that is not closed and whose user is subscribed, in one query
+        (the active_subscribed_jobs function, see migrations/002_active_subscribed_jobs.sql).
+        
+        Returns:
+            List of dicts with id, user_id and Job_email
+        """
+        try:
+            response = self.client.rpc('active_subscribed_jobs', {}).execute()
+            return response.data or []
+        except Exception as e:
+            raise
+
+    @retry_with_backoff()
+    def get_jobs_by_ids(self, job_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Get the sender mailbox of specific jobs.
+        
+        Args:
+            job_ids: Job IDs
+            
+        Returns:
+            List of dicts with id, user_id and Job_email (unknown ids are left out)
+        """
+        try:
+            response = (self.client.table('jobs')
+                    .select('id, user_id, Job_email')
+                    .in_('id', job_ids)
+                    .execute())
+            return response.data
+        except Exception as e:
+            raise
+
     def get_job_members(self, job_id: str) -> List[Dict[str, Any]]:
         """
         Get all members for a specific job.
@@ -235,13 +331,160 @@ class DatabaseService:
             ValueError: If query fails
         """
         try:
-            query = (self.client.table('members')
-                    .select('id, name_email, thread_id, message_id, body, response, '
-                           'overall_message_id, subject, reference_id')
-                    .eq('job_id', job_id)
-                    .execute())
+            return [
+                member
+                for page in self.iter_job_member_pages(
+                    job_id,
+                    columns='id, name_email, thread_id, message_id, body, response, '
+                            'overall_message_id, subject, reference_id'
+                )
+                for member in page
+            ]
+        except Exception as e:
+            raise
+
+    @staticmethod
+    def _tier_filter(query: Any, tier: Optional[str], active_since: Optional[str]) -> Any:
+        """
+        Restrict a members query to one of MEMBER_TIERS (None leaves it as is).
+        
+        Args:
+            query: Members query
+            tier: "active", "deferred" or "idle"
+            active_since: Timestamp from which a touched member counts as active (fixed for the run)
+        """
+        if tier is None:
+            return query
+        if tier not in MEMBER_TIERS:
+            raise ValueError(f"Invalid member tier: {tier}")
+        if tier == "active":
+            return query.or_(f"thread_id.is.null,last_activity_at.gte.{active_since}")
+        query = query.not_.is_('thread_id', 'null').or_(f"last_activity_at.is.null,last_activity_at.lt.{active_since}")
+        if tier == "deferred":
+            return query.not_.is_('deferred_at', 'null')
+        return query.is_('deferred_at', 'null')
+
+    @retry_with_backoff()
+    def get_job_members_page(self, job_id: str, after_id: Optional[str] = None,
+                             columns: str = MEMBER_SCAN_FIELDS, page_size: Optional[int] = None,
+                             tier: Optional[str] = None, active_since: Optional[str] = None,
+                             uncontacted: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get one page of a job's members ordered by id (keyset pagination).
+        
+        Args:
+            job_id: The UUID of the job
+            after_id: Last member id of the previous page (None for the first page)
+            columns: Columns to select
+            page_size: Members per page (defaults to MEMBER_PAGE_SIZE)
+            tier: Only members of this tier (see MEMBER_TIERS)
+            active_since: Start of the activity window (with tier)
+            uncontacted: Only members without a thread yet (no initial message sent)
+            
+        Returns:
+            List of member records, empty after the last page
+        """
+        query = (self.client.table('members')
+                .select(columns)
+                .eq('job_id', job_id))
+        query = self._tier_filter(query, tier, active_since)
+        if uncontacted:
+            query = query.is_('thread_id', 'null')
+        if after_id:
+            query = query.gt('id', after_id)
+        return query.order('id').limit(page_size or config.MEMBER_PAGE_SIZE).execute().data
+
+    def iter_job_member_pages(self, job_id: str, columns: str = MEMBER_SCAN_FIELDS,
+                              page_size: Optional[int] = None, tier: Optional[str] = None,
+                              active_since: Optional[str] = None, uncontacted: bool = False) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Stream a job's members page by page. Each page is one query under the PostgREST row
+        limit, so large jobs are read completely and only one page is held at a time.
+        
+        Args:
+            job_id: The UUID of the job
+            columns: Columns to select (default: only what change detection needs)
+            page_size: Members per page (defaults to MEMBER_PAGE_SIZE)
+            tier: Only members of this tier (see MEMBER_TIERS)
+            active_since: Start of the activity window (with tier)
+            uncontacted: Only members without a thread yet
+            
+        Returns:
+            Iterator of member pages
+        """
+        page_size = page_size or config.MEMBER_PAGE_SIZE
+        after_id = None
+        while True:
+            page = self.get_job_members_page(job_id, after_id, columns, page_size, tier, active_since, uncontacted)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            after_id = page[-1]['id']
+
+    # Deferred members
+    # --------------------------------------------------------------
+    # A time-budgeted run marks the members it did not reach with
+    # deferred_at, in one update per tier (everything past the last
+    # member it started), and clears the mark of the carried over
+    # members it did process. Marks set by this run are never cleared
+    # by it (deferred_at >= the run's start).
+    # --------------------------------------------------------------
+    @retry_with_backoff()
+    def defer_members(self, job_id: str, tier: str, active_since: str, after_id: Optional[str] = None,
+                      member_ids: Optional[List[str]] = None) -> int:
+        """
+        Mark members a run did not reach as deferred.
+        
+        Args:
+            job_id: The UUID of the job
+            tier: Tier the run stopped in (see MEMBER_TIERS)
+            active_since: Start of the run's activity window
+            after_id: Only members of the tier after this id (None for the whole tier)
+            member_ids: Mark exactly these members instead (started but skipped)
             
-            return query.data
+        Returns:
+            Number of members marked
+        """
+        try:
+            query = self.client.table('members').update({"deferred_at": datetime.now(timezone.utc).isoformat()}, count="exact")
+            query = query.eq('job_id', job_id)
+            if member_ids is not None:
+                if not member_ids:
+                    return 0
+                query = query.in_('id', member_ids)
+            else:
+                query = self._tier_filter(query, tier, active_since)
+                if after_id:
+                    query = query.gt('id', after_id)
+            response = query.execute()
+            return response.count if response.count is not None else len(response.data)
+        except Exception as e:
+            raise
+
+    @retry_with_backoff()
+    def clear_deferred(self, job_id: str, active_since: str, started_at: str, up_to_id: Optional[str] = None) -> bool:
+        """
+        Clear the deferred mark of carried over members a run processed.
+        
+        Args:
+            job_id: The UUID of the job
+            active_since: Start of the run's activity window
+            started_at: Start of the run (marks set since are kept)
+            up_to_id: Last deferred member the run started (None for all of them)
+            
+        Returns:
+            Boolean indicating success
+        """
+        try:
+            query = self._tier_filter(
+                self.client.table('members').update({"deferred_at": None}).eq('job_id', job_id),
+                "deferred", active_since
+            ).lt('deferred_at', started_at)
+            if up_to_id:
+                query = query.lte('id', up_to_id)
+            query.execute()
+            return True
         except Exception as e:
             raise
 
@@ -290,17 +533,9 @@ class DatabaseService:
         """
         try:
             # Filter valid fields
-            valid_fields = [
-                "thread_id", 
-                "message_id", 
-                "overall_message_id", 
-                "subject", 
-                "reference_id",
-                "body"
-            ]
             update_data = {
                 k: v for k, v in details.items() 
-                if k in valid_fields
+                if k in MEMBER_UPDATE_FIELDS
             }
             
             if not update_data:
@@ -315,5 +550,549 @@ class DatabaseService:
         except Exception as e:
             raise
 
+    @retry_with_backoff()
+    def record_member_threads(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Record the thread details of many members in one call (campaign sends, see
+        migrations/006_record_member_threads.sql).
+        
+        Args:
+            rows: Dicts with id, thread_id, message_id, subject (and optionally last_activity_at)
+            
+        Returns:
+            Number of members updated
+        """
+        try:
+            if not rows:
+                return 0
+            response = self.client.rpc('record_member_threads', {"p_rows": rows}).execute()
+            return response.data or 0
+        except Exception as e:
+            raise
+
+    # Leases
+    # --------------------------------------------------------------
+    # Row-level leases (agent_leases, see migrations/003_agent_leases.sql)
+    # let overlapping runs and replicas split work without two of them
+    # replying to the same message. Claims are atomic in the database;
+    # a lease is free again once it expires without a heartbeat.
+    # src/leases.py has the heartbeat & a SQLite stand-in for tests.
+    # --------------------------------------------------------------
+    @retry_with_backoff()
+    def claim_lease(self, resource: str, owner: str, ttl_seconds: int) -> bool:
+        """
+        Take a lease when it is free, expired or already held by owner.
+        
+        Args:
+            resource: Leased resource (e.g. "job:<id>:part:0")
+            owner: Unique id of this agent process
+            ttl_seconds: Seconds the lease lasts without a heartbeat
+            
+        Returns:
+            True when owner now holds the lease
+        """
+        try:
+            response = self.client.rpc('claim_lease', {
+                "p_resource": resource, "p_owner": owner, "p_ttl_seconds": ttl_seconds
+            }).execute()
+            return bool(response.data)
+        except Exception as e:
+            raise
+
+    @retry_with_backoff()
+    def renew_lease(self, resource: str, owner: str, ttl_seconds: int) -> bool:
+        """
+        Heartbeat: extend a lease owner still holds.
+        
+        Returns:
+            False when the lease expired and was taken by someone else
+        """
+        try:
+            response = self.client.rpc('renew_lease', {
+                "p_resource": resource, "p_owner": owner, "p_ttl_seconds": ttl_seconds
+            }).execute()
+            return bool(response.data)
+        except Exception as e:
+            raise
+
+    @retry_with_backoff()
+    def release_lease(self, resource: str, owner: str) -> None:
+        """Give a lease back early (only when owner holds it)."""
+        try:
+            self.client.rpc('release_lease', {"p_resource": resource, "p_owner": owner}).execute()
+        except Exception as e:
+            raise
+
+    @retry_with_backoff()
+    def count_live_leases(self, prefix: str) -> int:
+        """
+        Number of unexpired leases whose resource starts with prefix
+        (the count_live_leases function, see migrations/008_lease_owners.sql).
+        """
+        try:
+            response = self.client.rpc('count_live_leases', {"p_prefix": prefix}).execute()
+            return int(response.data or 0)
+        except Exception as e:
+            raise
+
+    # Per-message storage
+    # --------------------------------------------------------------
+    # Instead of overwriting members.body with the whole quoted thread
+    # on every inbound message, each message's new text is appended to
+    # member_messages once (keyed by member & Gmail id), compressed
+    # when large. The conversation is rebuilt from the latest rows when
+    # a prompt needs it, so a tick writes O(new message), not O(thread).
+    # --------------------------------------------------------------
+    @staticmethod
+    def _encode_message_content(content: str) -> Dict[str, Any]:
+        """Row fields for a message's content, zlib compressed & base64 encoded past MESSAGE_COMPRESS_MIN_BYTES."""
+        raw = (content or "").encode("utf-8")
+        if config.MESSAGE_COMPRESSION and len(raw) >= config.MESSAGE_COMPRESS_MIN_BYTES:
+            return {"content": base64.b64encode(zlib.compress(raw)).decode("ascii"), "compressed": True}
+        return {"content": content or "", "compressed": False}
+
+    @staticmethod
+    def _decode_message_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        """A member_messages row with its content decompressed."""
+        if row.get("compressed"):
+            row = {**row, "content": zlib.decompress(base64.b64decode(row["content"])).decode("utf-8"), "compressed": False}
+        return row
+
+    @staticmethod
+    def _member_message_row(member_id: str, gmail_id: str, content: str, direction: str,
+                            message_id: Optional[str]) -> Dict[str, Any]:
+        """Build a member_messages row."""
+        if direction not in ("inbound", "outbound"):
+            raise ValueError(f"Invalid message direction: {direction}")
+        return {
+            "member_id": member_id,
+            "gmail_id": gmail_id,
+            "message_id": message_id,
+            "direction": direction,
+            **DatabaseService._encode_message_content(content)
+        }
+
+    @retry_with_backoff()
+    def append_member_message(self, member_id: str, gmail_id: str, content: str,
+                              direction: str = "inbound", message_id: Optional[str] = None) -> bool:
+        """
+        Store one message of a member's thread (a message already stored is left as is).
+        
+        Args:
+            member_id: The UUID of the member
+            gmail_id: Gmail id of the message
+            content: The message's new text only (quoted thread stripped)
+            direction: "inbound" (from the member) or "outbound" (our reply)
+            message_id: RFC Message-ID header of the message
+            
+        Returns:
+            Boolean indicating success
+        """
+        try:
+            row = self._member_message_row(member_id, gmail_id, content, direction, message_id)
+            (self.client.table(MEMBER_MESSAGES_TABLE)
+                .upsert(row, on_conflict="member_id,gmail_id", ignore_duplicates=True)
+                .execute())
+            return True
+        except Exception as e:
+            raise
+
+    @retry_with_backoff()
+    def append_member_messages(self, rows: List[Dict[str, Any]]) -> bool:
+        """
+        Store many messages in one request (rows from _member_message_row, stored ones are left as is).
+        
+        Returns:
+            Boolean indicating success
+        """
+        try:
+            if rows:
+                (self.client.table(MEMBER_MESSAGES_TABLE)
+                    .upsert(rows, on_conflict="member_id,gmail_id", ignore_duplicates=True)
+                    .execute())
+            return True
+        except Exception as e:
+            raise
+
+    @retry_with_backoff()
+    def get_latest_member_message(self, member_id: str, direction: Optional[str] = "inbound") -> Optional[Dict[str, Any]]:
+        """
+        Get a member's most recent stored message.
+        
+        Args:
+            member_id: The UUID of the member
+            direction: "inbound", "outbound" or None for either
+            
+        Returns:
+            The message row (content decompressed) or None
+        """
+        try:
+            query = (self.client.table(MEMBER_MESSAGES_TABLE)
+                    .select('*')
+                    .eq('member_id', member_id))
+            if direction:
+                query = query.eq('direction', direction)
+            response = query.order('id', desc=True).limit(1).execute()
+            return self._decode_message_row(response.data[0]) if response.data else None
+        except Exception as e:
+            raise
+
+    @retry_with_backoff()
+    def get_member_messages(self, member_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get a member's latest stored messages, oldest first.
+        
+        Args:
+            member_id: The UUID of the member
+            limit: Max messages (defaults to HISTORY_MESSAGES)
+            
+        Returns:
+            List of message rows (content decompressed)
+        """
+        try:
+            response = (self.client.table(MEMBER_MESSAGES_TABLE)
+                    .select('*')
+                    .eq('member_id', member_id)
+                    .order('id', desc=True)
+                    .limit(limit or config.HISTORY_MESSAGES)
+                    .execute())
+            return [self._decode_message_row(row) for row in reversed(response.data)]
+        except Exception as e:
+            raise
+
+    # Reply outbox
+    # --------------------------------------------------------------
+    # A reply is recorded (pending) before it is sent, marked sent with
+    # its Gmail id right after, and done once the member row points at
+    # it. The key is the member & the inbound Message-Id it answers, so
+    # a run that dies half way finds the stored reply next time instead
+    # of generating & sending a second one.
+    # --------------------------------------------------------------
+    @staticmethod
+    def outbox_key(member_id: str, inbound_message_id: str) -> str:
+        """Idempotency key of the reply to one inbound message."""
+        return f"{member_id}:{inbound_message_id}"
+
+    @retry_with_backoff()
+    def record_outbox_reply(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record a reply before it is sent (a reply already recorded for the key is kept).
+        
+        Args:
+            item: Row with idempotency_key, job_id, member_id, inbound_message_id,
+                  outbound_message_id, reply_params & email_response
+            
+        Returns:
+            The stored row, the earlier one when the key was already recorded
+        """
+        try:
+            response = (self.client.table(REPLY_OUTBOX_TABLE)
+                    .upsert(item, on_conflict="idempotency_key", ignore_duplicates=True)
+                    .execute())
+            if response.data:
+                return response.data[0]
+            existing = (self.client.table(REPLY_OUTBOX_TABLE)
+                    .select('*')
+                    .eq('idempotency_key', item["idempotency_key"])
+                    .execute())
+            return existing.data[0] if existing.data else item
+        except Exception as e:
+            raise
+
+    @retry_with_backoff()
+    def get_open_outbox_reply(self, member_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a member's most recent reply that was recorded but not finished.
+        
+        Args:
+            member_id: The UUID of the member
+            
+        Returns:
+            The outbox row (status pending or sent) or None
+        """
+        try:
+            response = (self.client.table(REPLY_OUTBOX_TABLE)
+                    .select('*')
+                    .eq('member_id', member_id)
+                    .in_('status', OUTBOX_OPEN_STATUSES)
+                    .order('created_at', desc=True)
+                    .limit(1)
+                    .execute())
+            return response.data[0] if response.data else None
+        except Exception as e:
+            raise
+
+    @retry_with_backoff()
+    def mark_outbox_reply(self, idempotency_key: str, status: str, gmail_id: Optional[str] = None) -> bool:
+        """
+        Move an outbox reply to sent, done or superseded.
+        
+        Args:
+            idempotency_key: Key of the reply
+            status: New status
+            gmail_id: Gmail id of the sent message (once known)
+            
+        Returns:
+            Boolean indicating success
+        """
+        try:
+            update_data = {"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}
+            if gmail_id:
+                update_data["gmail_id"] = gmail_id
+            (self.client.table(REPLY_OUTBOX_TABLE)
+                .update(update_data)
+                .eq('idempotency_key', idempotency_key)
+                .execute())
+            return True
+        except Exception as e:
+            raise
+
+# Create a singleton instance
+db = DatabaseService()
+
+
+class AsyncDatabaseService:
+    """
+    Async counterpart of DatabaseService for the asyncio pipeline.
+    
+    Uses the async Supabase client so many member pipelines can wait on the
+    database at the same time from one event loop. The client is created on
+    first use because it has to be created inside the running loop.
+    """
+
+    def __init__(self):
+        """Initialize the async database service."""
+        self.client: Optional[AsyncClient] = None
+
+    async def connect(self) -> AsyncClient:
+        """
+        Connect to the Supabase database (once per process).
+        
+        Raises:
+            ConnectionError: If unable to connect to Supabase
+        """
+        if self.client:
+            return self.client
+        try:
+            if not os.environ.get("SUPABASE_URL") or not os.environ.get("SUPABASE_SERVICE_ROLE_KEY"):
+                raise ValueError("Missing Supabase credentials in environment variables")
+
+            self.client = await acreate_client(
+                os.environ.get("SUPABASE_URL"),
+                os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+            )
+            return self.client
+        except Exception as e:
+            raise ConnectionError(f"Could not connect to Supabase: {str(e)}")
+
+    @async_retry_with_backoff()
+    async def get_job_details(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Async counterpart of DatabaseService.get_job_details."""
+        client = await self.connect()
+        query = await client.table("jobs").select("*").eq("id", job_id).execute()
+        if not query.data:
+            return None
+        return query.data[0]
+
+    @async_retry_with_backoff()
+    async def get_user_tokens(self, user_id: str, email: str) -> Dict[str, Any]:
+        """Async counterpart of DatabaseService.get_user_tokens."""
+        client = await self.connect()
+        tokens_query = await client.table('profiles').select("sender").eq("id", user_id).execute()
+        if not tokens_query.data:
+            raise ValueError(f"No tokens found for user_id: {user_id}")
+        return DatabaseService._tokens_for_email(tokens_query.data[0]['sender'], email)
+
+    @async_retry_with_backoff()
+    async def update_access_token(self, user_id: str, email: str, access_token: str, 
+                                  access_expires_in: int) -> bool:
+        """Async counterpart of DatabaseService.update_access_token."""
+        client = await self.connect()
+        query = await client.table('profiles').select("sender").eq("id", user_id).execute()
+        if not query.data:
+            raise ValueError(f"No profile found for user_id: {user_id}")
+
+        sender_array = DatabaseService._set_sender_token(
+            query.data[0].get('sender', []), email, access_token, access_expires_in
+        )
+        await client.table('profiles').update({"sender": sender_array}).eq("id", user_id).execute()
+        return True
+
+    @async_retry_with_backoff()
+    async def get_user_id(self, job_id: str) -> Optional[str]:
+        """Async counterpart of DatabaseService.get_user_id."""
+        client = await self.connect()
+        response = await client.table('jobs').select("user_id").eq("id", job_id).execute()
+        if not response.data:
+            return None
+        return response.data[0]['user_id']
+
+    @async_retry_with_backoff()
+    async def is_subscribed(self, user_id: str) -> Optional[bool]:
+        """Async counterpart of DatabaseService.is_subscribed."""
+        client = await self.connect()
+        response = await client.table('subscriptions').select("status").eq("user_id", user_id).execute()
+        if not response.data:
+            return None
+        return response.data[0]['status'].lower() in ('trialing', 'active')
+
+    @async_retry_with_backoff()
+    async def get_job_state(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Async counterpart of DatabaseService.get_job_state."""
+        client = await self.connect()
+        response = await client.rpc('job_state', {"p_job_id": job_id}).execute()
+        return response.data[0] if response.data else None
+
+    async def get_job_members(self, job_id: str) -> List[Dict[str, Any]]:
+        """Async counterpart of DatabaseService.get_job_members."""
+        members = []
+        async for page in self.iter_job_member_pages(
+            job_id,
+            columns='id, name_email, thread_id, message_id, body, response, '
+                    'overall_message_id, subject, reference_id'
+        ):
+            members.extend(page)
+        return members
+
+    @async_retry_with_backoff()
+    async def get_job_members_page(self, job_id: str, after_id: Optional[str] = None,
+                                   columns: str = MEMBER_SCAN_FIELDS, page_size: Optional[int] = None,
+                                   tier: Optional[str] = None, active_since: Optional[str] = None,
+                                   uncontacted: bool = False) -> List[Dict[str, Any]]:
+        """Async counterpart of DatabaseService.get_job_members_page."""
+        client = await self.connect()
+        query = DatabaseService._tier_filter(client.table('members').select(columns).eq('job_id', job_id), tier, active_since)
+        if uncontacted:
+            query = query.is_('thread_id', 'null')
+        if after_id:
+            query = query.gt('id', after_id)
+        result = await query.order('id').limit(page_size or config.MEMBER_PAGE_SIZE).execute()
+        return result.data
+
+    async def iter_job_member_pages(self, job_id: str, columns: str = MEMBER_SCAN_FIELDS,
+                                    page_size: Optional[int] = None, tier: Optional[str] = None,
+                                    active_since: Optional[str] = None,
+                                    uncontacted: bool = False) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Async counterpart of DatabaseService.iter_job_member_pages."""
+        page_size = page_size or config.MEMBER_PAGE_SIZE
+        after_id = None
+        while True:
+            page = await self.get_job_members_page(job_id, after_id, columns, page_size, tier, active_since, uncontacted)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            after_id = page[-1]['id']
+
+    @async_retry_with_backoff()
+    async def get_member_details(self, member_id: str) -> Dict[str, Any]:
+        """Async counterpart of DatabaseService.get_member_details."""
+        client = await self.connect()
+        query = await client.table('members').select('*').eq('id', member_id).execute()
+        if not query.data:
+            raise ValueError(f"No member found with id: {member_id}")
+        return query.data[0]
+
+    @async_retry_with_backoff()
+    async def update_member_details(self, member_id: str, details: Dict[str, Any]) -> bool:
+        """Async counterpart of DatabaseService.update_member_details."""
+        update_data = {k: v for k, v in details.items() if k in MEMBER_UPDATE_FIELDS}
+        if not update_data:
+            raise ValueError("No valid fields to update")
+
+        client = await self.connect()
+        await client.table('members').update(update_data).eq('id', member_id).execute()
+        return True
+
+    @async_retry_with_backoff()
+    async def record_member_threads(self, rows: List[Dict[str, Any]]) -> int:
+        """Async counterpart of DatabaseService.record_member_threads."""
+        if not rows:
+            return 0
+        client = await self.connect()
+        response = await client.rpc('record_member_threads', {"p_rows": rows}).execute()
+        return response.data or 0
+
+    @async_retry_with_backoff()
+    async def append_member_message(self, member_id: str, gmail_id: str, content: str,
+                                    direction: str = "inbound", message_id: Optional[str] = None) -> bool:
+        """Async counterpart of DatabaseService.append_member_message."""
+        row = DatabaseService._member_message_row(member_id, gmail_id, content, direction, message_id)
+        client = await self.connect()
+        await (client.table(MEMBER_MESSAGES_TABLE)
+               .upsert(row, on_conflict="member_id,gmail_id", ignore_duplicates=True)
+               .execute())
+        return True
+
+    @async_retry_with_backoff()
+    async def append_member_messages(self, rows: List[Dict[str, Any]]) -> bool:
+        """Async counterpart of DatabaseService.append_member_messages."""
+        if rows:
+            client = await self.connect()
+            await (client.table(MEMBER_MESSAGES_TABLE)
+                   .upsert(rows, on_conflict="member_id,gmail_id", ignore_duplicates=True)
+                   .execute())
+        return True
+
+    @async_retry_with_backoff()
+    async def get_latest_member_message(self, member_id: str, direction: Optional[str] = "inbound") -> Optional[Dict[str, Any]]:
+        """Async counterpart of DatabaseService.get_latest_member_message."""
+        client = await self.connect()
+        query = client.table(MEMBER_MESSAGES_TABLE).select('*').eq('member_id', member_id)
+        if direction:
+            query = query.eq('direction', direction)
+        response = await query.order('id', desc=True).limit(1).execute()
+        return DatabaseService._decode_message_row(response.data[0]) if response.data else None
+
+    @async_retry_with_backoff()
+    async def get_member_messages(self, member_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Async counterpart of DatabaseService.get_member_messages."""
+        client = await self.connect()
+        response = await (client.table(MEMBER_MESSAGES_TABLE)
+                          .select('*')
+                          .eq('member_id', member_id)
+                          .order('id', desc=True)
+                          .limit(limit or config.HISTORY_MESSAGES)
+                          .execute())
+        return [DatabaseService._decode_message_row(row) for row in reversed(response.data)]
+
+    @async_retry_with_backoff()
+    async def record_outbox_reply(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Async counterpart of DatabaseService.record_outbox_reply."""
+        client = await self.connect()
+        response = await (client.table(REPLY_OUTBOX_TABLE)
+                          .upsert(item, on_conflict="idempotency_key", ignore_duplicates=True)
+                          .execute())
+        if response.data:
+            return response.data[0]
+        existing = await (client.table(REPLY_OUTBOX_TABLE)
+                          .select('*')
+                          .eq('idempotency_key', item["idempotency_key"])
+                          .execute())
+        return existing.data[0] if existing.data else item
+
+    @async_retry_with_backoff()
+    async def get_open_outbox_reply(self, member_id: str) -> Optional[Dict[str, Any]]:
+        """Async counterpart of DatabaseService.get_open_outbox_reply."""
+        client = await self.connect()
+        response = await (client.table(REPLY_OUTBOX_TABLE)
+                          .select('*')
+                          .eq('member_id', member_id)
+                          .in_('status', OUTBOX_OPEN_STATUSES)
+                          .order('created_at', desc=True)
+                          .limit(1)
+                          .execute())
+        return response.data[0] if response.data else None
+
+    @async_retry_with_backoff()
+    async def mark_outbox_reply(self, idempotency_key: str, status: str, gmail_id: Optional[str] = None) -> bool:
+        """Async counterpart of DatabaseService.mark_outbox_reply."""
+        update_data = {"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}
+        if gmail_id:
+            update_data["gmail_id"] = gmail_id
+        client = await self.connect()
+        await client.table(REPLY_OUTBOX_TABLE).update(update_data).eq('idempotency_key', idempotency_key).execute()
+        return True
+
 # Create a singleton instance
-db = DatabaseService() 
\ No newline at end of file
+async_db = AsyncDatabaseService()
@@ -1,17 +1,99 @@
 import base64
 import os
+import re
+import asyncio
 import requests
+import httpx
 from email.message import EmailMessage
-from typing import Dict, Any, Optional, List, Union
-from src.utils import retry_with_backoff
-from src.database import db
-from src.auth import auth_service
+from email.utils import make_msgid
+from html.parser import HTMLParser
+from typing import Dict, Any, Optional, List, Union, Tuple
+from src.utils import retry_with_backoff, async_retry_with_backoff
+from src.database import db, async_db
+from src.auth import auth_service, async_auth_service
 import resend
 import sys
 from src.utils import util
+from src.notifications import notifier
+from src.concurrency import gmail_limiter, gmail_sync_limiter
 import src.config as config
 
 
+class SendLimitExceededError(Exception):
+    """Raised by the async pipeline when Gmail reports the daily send limit (429) for a mailbox."""
+
+
+# Quoted-reply detection
+# --------------------------------------------------------------
+# Mail clients quote the earlier thread below the member's new text
+# in different ways. These markers are checked line by line (never
+# across the whole body) so stripping stays linear on large bodies.
+# --------------------------------------------------------------
+# Endings of the "On <date>, <name> wrote:" header (Gmail, Apple Mail, Thunderbird & localized variants)
+QUOTE_HEADER_ENDINGS = ("wrote:", "a écrit :", "a écrit:", "schrieb:", "escribió:", "scrisse:", "schreef:")
+QUOTE_HEADER_STARTS = ("on ", "le ", "am ", "el ", "il ", "op ")
+# Clients always put a time, a year or an address in that header, "On Monday Sarah wrote:" is the member's own text
+QUOTE_HEADER_DETAIL = re.compile(r"\d{1,2}[:h.]\d{2}|\d{4}|@")
+# Lines that open a quoted or forwarded block on their own
+QUOTE_SEPARATOR = re.compile(
+    r"^\s*(-{2,}\s*(original message|forwarded message)\s*-{2,}|begin forwarded message:|_{20,})\s*$",
+    re.IGNORECASE
+)
+# Outlook style header block ("From: ... Sent: ... To: ... Subject: ...")
+OUTLOOK_HEADER_START = re.compile(r"^\s*\*?from:\*?\s", re.IGNORECASE)
+OUTLOOK_HEADER_FIELD = re.compile(r"^\s*\*?(sent|date|to|cc|subject):\*?\s", re.IGNORECASE)
+# Signature delimiters & mobile client footers that end the new text
+SIGNATURE_LINE = re.compile(
+    r"^\s*(--\s*|sent from my \w+.*|get outlook for \w+.*|sent from (mail|outlook|yahoo mail) for \w+.*)$",
+    re.IGNORECASE
+)
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """Collects the text of an html body for html-only messages."""
+
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "table"}
+    SKIP_TAGS = {"script", "style", "head", "title"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines = [""]
+        self.quote_depth = 0
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        if tag in self.BLOCK_TAGS:
+            self.lines.append("")
+        if tag == "blockquote":
+            self.quote_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+        if tag == "blockquote" and self.quote_depth:
+            self.quote_depth -= 1
+        if tag in self.BLOCK_TAGS:
+            self.lines.append("")
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        text = " ".join(data.split())
+        if not text:
+            return
+        if not self.lines[-1]:
+            self.lines[-1] = "> " * self.quote_depth
+        elif not self.lines[-1].endswith(" "):
+            text = " " + text
+        self.lines[-1] += text
+
+    def get_text(self) -> str:
+        text = "\n".join(line.rstrip() for line in self.lines)
+        return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
 class EmailService:
     """
     Handles email operations using the Gmail API.
@@ -19,7 +101,13 @@ class EmailService:
     This class provides methods for searching, reading, and sending emails.
     """
     
-    
+    def _gmail(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Make a Gmail API request under the adaptive Gmail concurrency limit."""
+        with gmail_sync_limiter.slot() as slot:
+            response = requests.request(method, url, **kwargs)
+            slot.observe(response.status_code)
+        return response
+
     @retry_with_backoff()
     def get_thread(self, job_id: str, thread_id: str) -> Dict[str, Any]:
         """
@@ -48,7 +136,7 @@ class EmailService:
             
             # Make the API request
             url = f"{os.environ.get("GMAIL_URL")}me/threads/{thread_id}"
-            thread_response = requests.get(url, headers=headers)
+            thread_response = self._gmail("GET", url, headers=headers)
             # print("thread_response: ", thread_response)
             
             if thread_response.status_code != 200:
@@ -86,7 +174,7 @@ class EmailService:
             
             # Make the API request
             url = f"{os.environ.get("GMAIL_URL")}me/messages/{gmail_id}"
-            message_response = requests.get(url, headers=headers)
+            message_response = self._gmail("GET", url, headers=headers)
             
             if message_response.status_code != 200:
                 raise ConnectionError(f"Gmail API message fetch failed: {message_response.status_code}")
@@ -95,7 +183,7 @@ class EmailService:
             message = message_response.json()
             
             # Process the message using existing extract_message_data method
-            processed_message = self.extract_message_data(message)
+            processed_message = self.extract_message_data(message, job_id=job_id)
             
             return processed_message
         except Exception as e:
@@ -126,15 +214,16 @@ class EmailService:
         except Exception as e:
             raise
     
-    def extract_message_data(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    def extract_message_data(self, message: Dict[str, Any], job_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Extract relevant data from a message.
         
         Args:
             message: Message dictionary
+            job_id: Job ID, only needed to fetch a text body Gmail stored behind an attachmentId
             
         return:
-            Dict with subject, body, message_id, id, threadId and references
+            Dict with subject, body, message_id, id, threadId, references and truncated
             
         Raises:
             ValueError: If message is malformed
@@ -144,38 +233,427 @@ class EmailService:
             payload = message['payload']
             headers = payload['headers']
             
-            # Extract headers
-            subject = next((header['value'] for header in headers if header['name'] == 'Subject'), "")
-            message_id = next((header['value'] for header in headers if header['name'] == 'Message-Id'), "")
-            references = next((header['value'] for header in headers if header['name'] == 'References'), "")
-            
-            # Get body - handle different message structures
-            if 'parts' in payload:
-                encoded_body = payload['parts'][0]['body']['data']
-            else:
-                encoded_body = payload['body']['data']
+            # Extract headers (header names are case-insensitive, clients send both Message-Id & Message-ID)
+            subject = self._get_header(headers, 'Subject')
+            message_id = self._get_header(headers, 'Message-Id')
+            references = self._get_header(headers, 'References')
             
-            body = base64.urlsafe_b64decode(encoded_body).decode("utf-8")
+            # Get body - walk the MIME tree for the best text part
+            body_data = self.extract_body(payload, message_id=message.get('id'), job_id=job_id)
             
             return {
                 "subject": subject,
-                "body": body,
+                "body": body_data["body"],
                 "message_id": message_id,
                 "references": references,
                 "id": message['id'],
-                "threadId": message['threadId']
+                "threadId": message['threadId'],
+                "truncated": body_data["truncated"]
+            }
+        except Exception as e:
+            raise
+
+    def _get_header(self, headers: List[Dict[str, str]], name: str) -> str:
+        """Return the value of the first header matching name (case-insensitive) or an empty string."""
+        name = name.lower()
+        return next((header['value'] for header in headers if header['name'].lower() == name), "")
+
+    def iter_mime_parts(self, payload: Dict[str, Any]):
+        """
+        Walk a Gmail message payload and yield its leaf parts in document order.
+        
+        The walk is iterative (no recursion limit on deeply nested messages) and only looks at
+        part metadata, so attachment payloads are never decoded. Parts that are real attachments
+        (have a filename or an attachment disposition) are skipped.
+        
+        Args:
+            payload: The "payload" of a Gmail message resource
+            
+        Yields:
+            Leaf part dictionaries (mimeType, headers, body)
+        """
+        stack = [payload]
+        while stack:
+            part = stack.pop()
+            children = part.get('parts')
+            if children:
+                # reversed so the first child is visited first
+                stack.extend(reversed(children))
+                continue
+
+            disposition = self._get_header(part.get('headers', []), 'Content-Disposition').lower()
+            if part.get('filename') or disposition.startswith('attachment'):
+                continue
+
+            yield part
+
+    def extract_body(self, payload: Dict[str, Any], message_id: Optional[str] = None,
+                     job_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Pick the best text body of a message: the first text/plain part, else the first text/html part with tags stripped.
+        
+        Decoding stops at config.MAX_BODY_BYTES so one giant message can't blow up memory or the prompt.
+        
+        Args:
+            payload: The "payload" of a Gmail message resource
+            message_id: Gmail message ID (needed to fetch bodies stored behind an attachmentId)
+            job_id: Job ID for authentication when such a body has to be fetched
+            
+        return:
+            Dict with body (str) and truncated (bool)
+        """
+        part, is_html = self.find_body_part(payload)
+        if part is None:
+            return {"body": "", "truncated": False}
+
+        body = part.get('body', {})
+        encoded_body = body.get('data')
+        if not encoded_body and body.get('attachmentId'):
+            # large text bodies are stored like attachments, only fetch them when small enough to be worth it
+            if not job_id or not message_id or body.get('size', 0) > config.MAX_BODY_FETCH_BYTES:
+                return {"body": "", "truncated": True}
+            encoded_body = self.get_attachment_data(job_id, message_id, body['attachmentId'])
+
+        return self.render_body_part(part, encoded_body, is_html)
+
+    def find_body_part(self, payload: Dict[str, Any]):
+        """
+        Find the part holding the best text body of a message.
+        
+        return:
+            Tuple of (part or None, whether the part is html)
+        """
+        html_part = None
+        for part in self.iter_mime_parts(payload):
+            mime_type = part.get('mimeType', '').lower()
+            if mime_type == 'text/plain':
+                return part, False
+            if mime_type == 'text/html' and html_part is None:
+                html_part = part
+
+        if html_part is not None:
+            return html_part, True
+        # single part messages without a mimeType are treated as plain text
+        if not payload.get('parts') and payload.get('body', {}).get('data'):
+            return payload, False
+        return None, False
+
+    def render_body_part(self, part: Dict[str, Any], encoded_body: Optional[str], is_html: bool) -> Dict[str, Any]:
+        """
+        Decode the data of a body part (up to config.MAX_BODY_BYTES) into text.
+        
+        return:
+            Dict with body (str) and truncated (bool)
+        """
+        if not encoded_body:
+            return {"body": "", "truncated": False}
+
+        charset = self._get_charset(part)
+        text, truncated = self.decode_body_data(encoded_body, config.MAX_BODY_BYTES, charset)
+
+        if is_html:
+            text = self.html_to_text(text)
+
+        return {"body": text, "truncated": truncated}
+
+    def _get_charset(self, part: Dict[str, Any]) -> str:
+        """Read the charset of a part from its Content-Type header, defaulting to utf-8."""
+        content_type = self._get_header(part.get('headers', []), 'Content-Type')
+        match = re.search(r'charset="?([\w-]+)"?', content_type, re.IGNORECASE)
+        return match.group(1) if match else "utf-8"
+
+    def decode_body_data(self, encoded_body: str, max_bytes: int, charset: str = "utf-8"):
+        """
+        Decode base64url body data chunk by chunk, stopping once max_bytes have been decoded.
+        
+        Args:
+            encoded_body: base64url encoded data from the Gmail API
+            max_bytes: Maximum number of decoded bytes to keep
+            charset: Charset of the decoded bytes
+            
+        return:
+            Tuple of (decoded text, whether the body was truncated)
+        """
+        # 4 base64 chars -> 3 bytes, decode in blocks aligned to that
+        chunk_size = 4 * 16384
+        decoded = bytearray()
+        truncated = False
+        for start in range(0, len(encoded_body), chunk_size):
+            chunk = encoded_body[start:start + chunk_size]
+            if start + chunk_size >= len(encoded_body):
+                chunk += "=" * (-len(chunk) % 4)  # Gmail sometimes drops the padding
+            decoded.extend(base64.urlsafe_b64decode(chunk))
+            if len(decoded) >= max_bytes:
+                truncated = len(decoded) > max_bytes or start + chunk_size < len(encoded_body)
+                del decoded[max_bytes:]
+                break
+
+        try:
+            text = decoded.decode(charset, errors="ignore" if truncated else "replace")
+        except LookupError:
+            text = decoded.decode("utf-8", errors="replace")
+        return text, truncated
+
+    def html_to_text(self, html: str) -> str:
+        """
+        Strip an html body down to its text. Block elements become line breaks and
+        blockquote content is prefixed with ">" so quoted-reply stripping still works.
+        """
+        parser = _HTMLTextExtractor()
+        parser.feed(html)
+        parser.close()
+        return parser.get_text()
+
+    @retry_with_backoff()
+    def get_attachment_data(self, job_id: str, gmail_id: str, attachment_id: str) -> str:
+        """
+        Get the base64url data of a message part Gmail stored behind an attachmentId.
+        
+        Args:
+            job_id: Job ID to get authentication info
+            gmail_id: Gmail message ID the part belongs to
+            attachment_id: The attachmentId of the part
+            
+        return:
+            The encoded part data
+            
+        Raises:
+            ConnectionError: If Gmail API request fails
+        """
+        try:
+            token_info = auth_service.validate_token(job_id)
+            headers = {
+                "Authorization": f"Bearer {token_info['access_token']}"
             }
+
+            url = f"{os.environ.get("GMAIL_URL")}me/messages/{gmail_id}/attachments/{attachment_id}"
+            response = self._gmail("GET", url, headers=headers)
+
+            if response.status_code != 200:
+                raise ConnectionError(f"Gmail API attachment fetch failed: {response.status_code}")
+
+            return response.json().get('data', "")
         except Exception as e:
             raise
 
+    def strip_quoted_reply(self, body: str, markers: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        Split an inbound email body into the member's new text and the quoted thread below it.
+        
+        Handles "On ... wrote:" headers (including the two-line form Gmail wraps to), ">" prefixed
+        lines, Outlook "From:/Sent:" blocks & separators, forwarded blocks and signature delimiters.
+        Each line is looked at a bounded number of times, so this runs in linear time on large bodies.
+        
+        Args:
+            body: The decoded email body
+            markers: Extra lines that start the quoted thread (e.g. the "Hi {name}," greeting of our own replies)
+            
+        return:
+            Dict with "reply" (new text, signature removed) and "quoted" (earlier thread with ">" prefixes removed)
+        """
+        if not body:
+            return {"reply": "", "quoted": ""}
+
+        lines = body.replace("\r\n", "\n").split("\n")
+        markers = [marker.strip().lower() for marker in (markers or []) if marker and marker.strip()]
+        quote_start = len(lines)
+
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            lowered = stripped.lower()
+            if not stripped:
+                continue
+
+            if stripped.startswith(">"):
+                quote_start = i
+                break
+
+            if any(lowered.startswith(marker) for marker in markers):
+                quote_start = i
+                break
+
+            if QUOTE_SEPARATOR.match(stripped):
+                quote_start = i
+                break
+
+            # "On ... wrote:" on one line, or wrapped onto the next line by the client
+            if lowered.startswith(QUOTE_HEADER_STARTS) and len(stripped) <= 400:
+                if lowered.endswith(QUOTE_HEADER_ENDINGS) and QUOTE_HEADER_DETAIL.search(stripped):
+                    quote_start = i
+                    break
+                next_line = lines[i + 1].strip() if i + 1 < len(lines) else ""
+                if (next_line.lower().endswith(QUOTE_HEADER_ENDINGS)
+                        and QUOTE_HEADER_DETAIL.search(f"{stripped} {next_line}")):
+                    quote_start = i
+                    break
+
+            # Outlook header block: a "From:" line followed closely by other header fields
+            if OUTLOOK_HEADER_START.match(stripped):
+                following = [next_line for next_line in lines[i + 1:i + 5] if next_line.strip()]
+                if sum(1 for next_line in following if OUTLOOK_HEADER_FIELD.match(next_line)) >= 2:
+                    quote_start = i
+                    break
+
+        # Drop the signature (and anything under it) from the new text
+        reply_lines = lines[:quote_start]
+        for i, line in enumerate(reply_lines):
+            if SIGNATURE_LINE.match(line):
+                reply_lines = reply_lines[:i]
+                break
+
+        quoted_lines = []
+        for line in lines[quote_start:]:
+            stripped = line.lstrip()
+            while stripped.startswith(">"):
+                stripped = stripped[1:].lstrip(" ")
+            quoted_lines.append(stripped)
+
+        return {
+            "reply": "\n".join(reply_lines).strip(),
+            "quoted": "\n".join(quoted_lines).strip()
+        }
+
+    def split_member_message(self, body: str, member: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Split a member's inbound body into their new text & the quoted thread, with the
+        "Hi {name}," greeting of our own replies marking the start of the quoted thread.
+        
+        Args:
+            body: The decoded email body
+            member: The member (name_email is used)
+            
+        return:
+            Dict with "reply" and "quoted"
+        """
+        receiver = f"Hi {member['name_email']['name']},"
+        stripped_body = self.strip_quoted_reply(body, markers=[receiver])
+        return {
+            "reply": stripped_body["reply"] or (body or "").split(receiver)[0],
+            "quoted": stripped_body["quoted"]
+        }
+
+    @staticmethod
+    def render_first_message(job_details: Dict[str, Any], member: Dict[str, Any]) -> str:
+        """Personalize the job's default_message for a member."""
+        message = job_details.get('default_message', '')
+        member_name = member["name_email"]["name"]
+        return message.replace('{{recipient_Name}}', member_name)
+
+    def build_first_message(self, job_details: Dict[str, Any], member: Dict[str, Any],
+                            outbound_message_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build the Gmail send payload of the default first message for a member.
+        
+        Args:
+            job_details: The job record (subject, default_message, Job_email)
+            member: The details of the member
+            outbound_message_id: Our own Message-ID header (see new_message_id), None lets Gmail set one
+            
+        return:
+            Dict with the base64url encoded raw message
+        """
+        subject = job_details.get('subject', 'Subject')
+        body = self.render_first_message(job_details, member)
+
+        To = member["name_email"]["email"]
+        From = job_details.get('Job_email')
+        
+        # Create email message
+        message = EmailMessage()
+        message.set_content(body)
+        message["To"] = To
+        message["From"] = From
+        message["Subject"] = subject
+        if outbound_message_id:
+            message["Message-ID"] = outbound_message_id
+        
+        # Encode message
+        raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
+        return {
+            "raw": raw
+        }
+
+    def build_reply(self, reply_params: Dict[str, Any], token_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the Gmail send payload of a threaded reply.
+        
+        Args:
+            reply_params: Dict with reply parameters (to, body, thread_id, etc.)
+            token_info: Token info from validate_token (for the default From address)
+            
+        return:
+            Dict with the base64url encoded raw message and threadId
+        """
+        message = EmailMessage()
+        message.set_content(reply_params.get('plain_body', '')) #Plain text body
+        message.add_alternative(reply_params.get('html_body', ''), subtype='html') #HTML body
+        message["To"] = reply_params.get('to')  # Should be member's email
+        message["From"] = reply_params.get('from', token_info['job_email'])
+        message["Subject"] = reply_params.get('subject', '')
+        
+        # Add message threading headers
+        if reply_params.get('references'):
+            message["References"] = f"{reply_params['references']} {reply_params['message_id']}"
+        else:
+            message["References"] = reply_params['message_id']
+            
+        message["In-Reply-To"] = reply_params['message_id']
+
+        # our own Message-ID (outbox replies), so the reply can be found in the thread after a crash
+        if reply_params.get('outbound_message_id'):
+            message["Message-ID"] = reply_params['outbound_message_id']
+        
+        # Encode message
+        raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
+        return {
+            "raw": raw, 
+            "threadId": reply_params['thread_id']
+        }
+
+    @staticmethod
+    def new_message_id(sender_email: Optional[str] = None) -> str:
+        """A unique Message-ID header value on the sender's domain."""
+        domain = sender_email.rsplit("@", 1)[-1] if sender_email and "@" in sender_email else None
+        return make_msgid(domain=domain)
+
+    def find_sent_reply(self, thread: Dict[str, Any], outbox: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        """
+        Look for an outbox reply among the thread's messages.
+        
+        Args:
+            thread: Thread dictionary
+            outbox: The reply_outbox row (outbound_message_id & gmail_id once known)
+            
+        return:
+            Dict with the Gmail id & Message-ID of the sent reply, or None when it was never sent
+        """
+        for message in thread.get('messages', []):
+            message_id = self._get_header(message.get('payload', {}).get('headers', []), 'Message-Id')
+            if message_id == outbox.get("outbound_message_id") or (outbox.get("gmail_id") and message['id'] == outbox["gmail_id"]):
+                return {"id": message['id'], "message_id": message_id}
+        return None
+
+    def _outbox_pending(self, thread: Dict[str, Any], message_data: Dict[str, Any],
+                        outbox: Dict[str, Any]) -> Dict[str, Any]:
+        """check_for_new_emails result for a member with an unfinished outbox reply."""
+        return {
+            "status": "outbox_pending",
+            "message": "A reply recorded by an earlier run is not finished",
+            "outbox": outbox,
+            "sent_message": self.find_sent_reply(thread, outbox),
+            "email_data": message_data
+        }
+
     @retry_with_backoff() 
-    def send_first_message(self, job_id: str, member: Dict[str, Any]) -> Dict[str, Any]:
+    def send_first_message(self, job_id: str, member: Dict[str, Any],
+                           job_details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Send a default message to start the email thread.
         
         Args:
             job_id: Job ID
             member: The details of the member
+            job_details: The job record when the caller already has it (skips the job lookup)
             
         return:
             API response dictionary
@@ -197,33 +675,13 @@ class EmailService:
 
 
             #Get email components , and personalize it
-            job_details = db.get_job_details(job_id)
-            
-            subject = job_details.get('subject', 'Subject')
-            message = job_details.get('default_message', '')
-            member_name = member["name_email"]["name"]
-            body = message.replace('{{recipient_Name}}', member_name)
-
-            To = member["name_email"]["email"]
-            From = job_details.get('Job_email')
-            
-            # Create email message
-            message = EmailMessage()
-            message.set_content(body)
-            message["To"] = To
-            message["From"] = From
-            message["Subject"] = subject
-            
-            
-            # Encode message
-            raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
-            email_data = {
-                "raw": raw
-            }
+            if job_details is None:
+                job_details = db.get_job_details(job_id)
+            email_data = self.build_first_message(job_details, member)
             
             # Send the message
             url = f"{os.environ.get("GMAIL_URL")}me/messages/send"
-            response = requests.post(url, headers=headers, json=email_data)
+            response = self._gmail("POST", url, headers=headers, json=email_data)
 
             #check if the send limit has been reached, send user a notification email & exit if so.
             #at this point if successful the message has being sent already
@@ -231,7 +689,8 @@ class EmailService:
             print("check send_limit_response: ", send_limit_response)
 
             if send_limit_response.get("isExceeded"):
-                self.send_user_notification_email(isJob=True, job_id=job_id, message=send_limit_response.get("message"))
+                notifier.add(job_id, send_limit_response.get("message"), to=job_details.get("Job_email"))
+                notifier.flush()
                 sys.exit(0);
 
             # print("send reply response: ", response)
@@ -273,37 +732,18 @@ class EmailService:
             }
             
             # Create email message
-            message = EmailMessage()
-            message.set_content(reply_params.get('plain_body', '')) #Plain text body
-            message.add_alternative(reply_params.get('html_body', ''), subtype='html') #HTML body
-            message["To"] = reply_params.get('to')  # Should be member's email
-            message["From"] = reply_params.get('from', token_info['job_email'])
-            message["Subject"] = reply_params.get('subject', '')
-            
-            # Add message threading headers
-            if reply_params.get('references'):
-                message["References"] = f"{reply_params['references']} {reply_params['message_id']}"
-            else:
-                message["References"] = reply_params['message_id']
-                
-            message["In-Reply-To"] = reply_params['message_id']
-            
-            # Encode message
-            raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
-            email_data = {
-                "raw": raw, 
-                "threadId": reply_params['thread_id']
-            }
+            email_data = self.build_reply(reply_params, token_info)
             
             # Send the message
             url = f"{os.environ.get("GMAIL_URL")}me/messages/send"
-            response = requests.post(url, headers=headers, json=email_data)
+            response = self._gmail("POST", url, headers=headers, json=email_data)
 
             #check if the send limit has been reached, send user a notification email & exit if so
             send_limit_response = util.check_send_limit(response)
             print("check send_limit_response: ", send_limit_response)
             if send_limit_response.get("isExceeded"):
-                self.send_user_notification_email(isJob=True, job_id=job_id, message=send_limit_response.get("message"))
+                notifier.add(job_id, send_limit_response.get("message"))
+                notifier.flush()
                 sys.exit(0);
             
             # print("send reply response: ", response)
@@ -318,7 +758,8 @@ class EmailService:
         except Exception as e:
             raise
     
-    def check_for_new_emails(self, job_id: str, member_id: str, member_email: str) -> Dict[str, Any]:
+    def check_for_new_emails(self, job_id: str, member_id: str, member_email: str,
+                             member: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Check for new emails from a specific member.
         
@@ -326,6 +767,7 @@ class EmailService:
             job_id: Job ID (needed for auth)
             member_id: The ID of the member
             member_email: The email address of the member
+            member: The member's thread_id & message_id when the caller already has them (skips the member lookup)
             
         return:
             Dict with status and message data if found
@@ -335,7 +777,8 @@ class EmailService:
         """
         try:
             # Get member details for context
-            member = db.get_member_details(member_id)
+            if member is None:
+                member = db.get_member_details(member_id)
             
 
             thread_id = member.get("thread_id")
@@ -360,7 +803,7 @@ class EmailService:
 
 
             # Extract the last message's data
-            message_data = self.extract_message_data(last_message)
+            message_data = self.extract_message_data(last_message, job_id=job_id)
 
             # Check if we've already processed this message(or it's from the user/agent. We only want to proceed with processing messages from the members)
             if member.get("message_id") == message_data.get("message_id"):
@@ -368,13 +811,28 @@ class EmailService:
                     "status": "no_new_messages", 
                     "message": "No new messages in the thread since last check"
                 }
+
+            # a reply was recorded but not finished (the run died around the send): resume it first,
+            # the latest message may even be that reply
+            if config.OUTBOX_ENABLED:
+                outbox = db.get_open_outbox_reply(member_id)
+                if outbox:
+                    return self._outbox_pending(thread, message_data, outbox)
             
-            
-            email_details = {
-                "body": message_data["body"]
-            }
-            
-            db.update_member_details(member_id, email_details)
+            if config.MESSAGE_STORE_ENABLED:
+                # only the member's new text is stored, the thread is rebuilt from earlier rows
+                db.append_member_message(
+                    member_id,
+                    message_data["id"],
+                    self.split_member_message(message_data["body"], member)["reply"],
+                    message_id=message_data.get("message_id")
+                )
+            else:
+                email_details = {
+                    "body": message_data["body"]
+                }
+                
+                db.update_member_details(member_id, email_details)
             
             return {
                 "status": "new_message",
@@ -387,15 +845,20 @@ class EmailService:
 
 
     @retry_with_backoff() 
-    def send_user_notification_email(self, message: str, member_id: str="", job_id: str="", isJob: bool=False) -> Dict[str, Any]:
+    def send_user_notification_email(self, message: str, member_id: str="", job_id: str="", isJob: bool=False,
+                                     job_details: Optional[Dict[str, Any]] = None,
+                                     member_details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
-        Send a notification email to the user.
+        Send a notification email to the user right away. The agent's own notifications
+        go through src.notifications.notifier instead, deduplicated & sent once per run.
         
         Args:
             message: The message to send to the user
             member_id: The ID of the member
             job_id: The ID of the job
             isJob: Whether the message is a job message
+            job_details: The job record when the caller already has it (skips the job lookup)
+            member_details: The member record when the caller already has it (skips the member lookup)
         return:
             API response dictionary
             
@@ -403,12 +866,14 @@ class EmailService:
             ConnectionError: If Resend request fails
         """
         try:
-            member_details = db.get_member_details(member_id)
-            job_details = db.get_job_details(job_id)
+            if job_details is None:
+                job_details = db.get_job_details(job_id)
 
             if isJob:
                 email_message = message
             else:
+                if member_details is None:
+                    member_details = db.get_member_details(member_id)
                 email_message = message.format(member_email=member_details["name_email"]["email"], subject_title=member_details["subject"])
 
 
@@ -428,15 +893,262 @@ class EmailService:
             response = resend.Emails.send(params)
             print("send user notification email response")
 
-            if response.status_code != 200:
-                print(f"Error response body: {response.text}")
-                raise ConnectionError(f"Failed to send email: {response.status_code}")
-            
-            
-            return response.json()
+            # Resend returns the created email ({"id": ...}), not an HTTP response
+            if not response or not response.get("id"):
+                raise ConnectionError(f"Failed to send notification email: {response}")
+
+            return response
             
         except Exception as e:
             raise
 
 # Create a singleton instance
-email_service = EmailService()
\ No newline at end of file
+email_service = EmailService()
+
+
+class AsyncEmailService(EmailService):
+    """
+    Async counterpart of EmailService for the asyncio pipeline.
+    
+    Message parsing, quote stripping and message building are inherited; only the
+    I/O methods are overridden as coroutines using one shared async HTTP client.
+    A daily send limit raises SendLimitExceededError instead of exiting the process,
+    so the caller can stop the other in-flight sends of the job cleanly.
+    """
+
+    def __init__(self):
+        """Initialize the async email service."""
+        self.http: Optional[httpx.AsyncClient] = None
+
+    def _get_http(self) -> httpx.AsyncClient:
+        """Create the shared async HTTP client on first use (inside the running loop)."""
+        if self.http is None:
+            self.http = httpx.AsyncClient(timeout=30)
+        return self.http
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP client."""
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+
+    async def _gmail(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Make a Gmail API request under the adaptive Gmail concurrency limit."""
+        async with gmail_limiter.slot() as slot:
+            response = await self._get_http().request(method, url, **kwargs)
+            slot.observe(response.status_code)
+        return response
+
+    async def _auth_headers(self, job_id: str, **extra: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Validate the job's token and return (token_info, request headers)."""
+        token_info = await async_auth_service.validate_token(job_id)
+        headers = {"Authorization": f"Bearer {token_info['access_token']}", **extra}
+        return token_info, headers
+
+    @async_retry_with_backoff()
+    async def get_thread(self, job_id: str, thread_id: str) -> Dict[str, Any]:
+        """Async counterpart of EmailService.get_thread."""
+        _, headers = await self._auth_headers(job_id, Accept="application/json")
+        url = f"{os.environ.get("GMAIL_URL")}me/threads/{thread_id}"
+        thread_response = await self._gmail("GET", url, headers=headers)
+
+        if thread_response.status_code != 200:
+            raise ConnectionError(f"Gmail API thread fetch failed: {thread_response.status_code}")
+
+        return thread_response.json()
+
+    @async_retry_with_backoff()
+    async def get_message(self, job_id: str, gmail_id: str) -> Dict[str, Any]:
+        """Async counterpart of EmailService.get_message."""
+        _, headers = await self._auth_headers(job_id)
+        url = f"{os.environ.get("GMAIL_URL")}me/messages/{gmail_id}"
+        message_response = await self._gmail("GET", url, headers=headers)
+
+        if message_response.status_code != 200:
+            raise ConnectionError(f"Gmail API message fetch failed: {message_response.status_code}")
+
+        return await self.aextract_message_data(message_response.json(), job_id=job_id)
+
+    @async_retry_with_backoff()
+    async def get_attachment_data(self, job_id: str, gmail_id: str, attachment_id: str) -> str:
+        """Async counterpart of EmailService.get_attachment_data."""
+        _, headers = await self._auth_headers(job_id)
+        url = f"{os.environ.get("GMAIL_URL")}me/messages/{gmail_id}/attachments/{attachment_id}"
+        response = await self._gmail("GET", url, headers=headers)
+
+        if response.status_code != 200:
+            raise ConnectionError(f"Gmail API attachment fetch failed: {response.status_code}")
+
+        return response.json().get('data', "")
+
+    async def aextract_message_data(self, message: Dict[str, Any], job_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Async counterpart of EmailService.extract_message_data.
+        
+        Parsing is shared with the sync service; only a text body stored behind an
+        attachmentId is fetched asynchronously. It has its own name so inherited sync code
+        calling extract_message_data on this service still gets a dict, not a coroutine.
+        """
+        message_data = self.extract_message_data(message)
+        if message_data["body"] or not job_id:
+            return message_data
+
+        part, is_html = self.find_body_part(message['payload'])
+        body = (part or {}).get('body', {})
+        if body.get('attachmentId') and body.get('size', 0) <= config.MAX_BODY_FETCH_BYTES:
+            encoded_body = await self.get_attachment_data(job_id, message['id'], body['attachmentId'])
+            message_data.update(self.render_body_part(part, encoded_body, is_html))
+        return message_data
+
+    async def _send(self, job_id: str, headers: Dict[str, Any], email_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a built message, turning a 429 into SendLimitExceededError after queuing a notification for the user."""
+        url = f"{os.environ.get("GMAIL_URL")}me/messages/send"
+        response = await self._gmail("POST", url, headers=headers, json=email_data)
+
+        send_limit_response = util.check_send_limit(response)
+        if send_limit_response.get("isExceeded"):
+            # sent with the run's other notifications when it ends
+            notifier.add(job_id, send_limit_response.get("message"))
+            raise SendLimitExceededError(send_limit_response.get("message"))
+
+        if response.status_code != 200:
+            print(f"Error response body: {response.text}")
+            raise ConnectionError(f"Failed to send email: {response.status_code}")
+
+        return response.json()
+
+    @async_retry_with_backoff()
+    async def send_first_message(self, job_id: str, member: Dict[str, Any],
+                                 job_details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Async counterpart of EmailService.send_first_message."""
+        _, headers = await self._auth_headers(job_id, **{"Content-Type": "application/json"})
+        if job_details is None:
+            job_details = await async_db.get_job_details(job_id)
+        email_data = self.build_first_message(job_details, member)
+        return await self._send(job_id, headers, email_data)
+
+    @async_retry_with_backoff()
+    async def send_prepared(self, job_id: str, email_data: Dict[str, Any], token_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Send a built message with a token the caller already validated (bulk sends skip the
+        per-message token lookup).
+        
+        Args:
+            job_id: Job ID (for the send limit notification)
+            email_data: Payload from build_first_message/build_reply
+            token_info: Token info from validate_token
+            
+        return:
+            API response dictionary
+        """
+        headers = {"Authorization": f"Bearer {token_info['access_token']}", "Content-Type": "application/json"}
+        return await self._send(job_id, headers, email_data)
+
+    @async_retry_with_backoff()
+    async def get_message_id(self, gmail_id: str, token_info: Dict[str, Any]) -> str:
+        """
+        Get only the Message-ID header of a message (metadata fetch, no body).
+        
+        Args:
+            gmail_id: Gmail message ID
+            token_info: Token info from validate_token
+            
+        Raises:
+            ConnectionError: If Gmail API request fails
+        """
+        headers = {"Authorization": f"Bearer {token_info['access_token']}"}
+        url = f"{os.environ.get("GMAIL_URL")}me/messages/{gmail_id}"
+        response = await self._gmail(
+            "GET", url, headers=headers, params={"format": "metadata", "metadataHeaders": "Message-Id"}
+        )
+
+        if response.status_code != 200:
+            raise ConnectionError(f"Gmail API message fetch failed: {response.status_code}")
+
+        return self._get_header(response.json().get('payload', {}).get('headers', []), 'Message-Id')
+
+    @async_retry_with_backoff()
+    async def send_reply(self, job_id: str, member_id: str, reply_params: Dict[str, Any]) -> Dict[str, Any]:
+        """Async counterpart of EmailService.send_reply."""
+        token_info, headers = await self._auth_headers(job_id, **{"Content-Type": "application/json"})
+        email_data = self.build_reply(reply_params, token_info)
+        return await self._send(job_id, headers, email_data)
+
+    async def check_for_new_emails(self, job_id: str, member_id: str, member_email: str,
+                                   member: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Async counterpart of EmailService.check_for_new_emails."""
+        if member is None:
+            member = await async_db.get_member_details(member_id)
+
+        thread_id = member.get("thread_id")
+        if not thread_id:
+            return {
+                "status": "no initial message",
+                "message": "No initial message sent to the member"
+            }
+
+        thread = await self.get_thread(job_id, thread_id)
+        last_message = self.get_last_message(thread)
+        message_data = await self.aextract_message_data(last_message, job_id=job_id)
+
+        if member.get("message_id") == message_data.get("message_id"):
+            return {
+                "status": "no_new_messages", 
+                "message": "No new messages in the thread since last check"
+            }
+
+        if config.OUTBOX_ENABLED:
+            outbox = await async_db.get_open_outbox_reply(member_id)
+            if outbox:
+                return self._outbox_pending(thread, message_data, outbox)
+
+        if config.MESSAGE_STORE_ENABLED:
+            await async_db.append_member_message(
+                member_id,
+                message_data["id"],
+                self.split_member_message(message_data["body"], member)["reply"],
+                message_id=message_data.get("message_id")
+            )
+        else:
+            await async_db.update_member_details(member_id, {"body": message_data["body"]})
+
+        return {
+            "status": "new_message",
+            "message": "Found new message",
+            "email_data": message_data
+        }
+
+    async def send_user_notification_email(self, message: str, member_id: str="", job_id: str="", isJob: bool=False,
+                                           job_details: Optional[Dict[str, Any]] = None,
+                                           member_details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Async counterpart of EmailService.send_user_notification_email.
+        
+        The Resend SDK is blocking, so the send runs in a worker thread.
+        """
+        if job_details is None:
+            job_details = await async_db.get_job_details(job_id)
+        if isJob:
+            email_message = message
+        else:
+            if member_details is None:
+                member_details = await async_db.get_member_details(member_id)
+            email_message = message.format(member_email=member_details["name_email"]["email"], subject_title=member_details["subject"])
+
+        resend.api_key = os.environ.get("RESEND_API_KEY")
+        params: resend.Emails.SendParams = {
+            "from": os.environ.get("COMPANY_EMAIL"),
+            "to": [job_details["Job_email"]],
+            "subject": "Urgent Message from Converse-Aid",
+            "html": "<h2>Dear User, </h2>" + "<p>" + email_message + "</p>",
+        }
+        response = await asyncio.to_thread(resend.Emails.send, params)
+        print("send user notification email response")
+
+        if not response or not response.get("id"):
+            raise ConnectionError(f"Failed to send notification email: {response}")
+
+        return response
+
+# Create a singleton instance
+async_email_service = AsyncEmailService()
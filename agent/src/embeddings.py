@@ -0,0 +1,275 @@
+import os
+import re
+import math
+import time
+import asyncio
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+import src.config as config
+
+
+class EmbeddingBackend(ABC):
+    """
+    Base class for embedding backends used by VectorSearchService.
+
+    Every backend must produce vectors in the same space as the index (multilingual-e5-large,
+    EMBED_DIMENSION dims), otherwise query scores are meaningless. embed() splits the inputs
+    into batches of batch_size and records the latency of every backend call.
+    Subclasses implement _embed_batch() (and _aembed_batch() when they have a native async path).
+    """
+
+    name = "base"
+
+    def __init__(self, batch_size: Optional[int] = None):
+        """Initialize the batch size and latency counters."""
+        self.batch_size = batch_size or config.EMBED_BATCH_SIZE
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "inputs": 0, "seconds": 0.0}
+        self._latencies = deque(maxlen=1000)
+
+    @abstractmethod
+    def _embed_batch(self, texts: List[str], input_type: str) -> List[List[float]]:
+        """
+        Embed one batch of texts.
+
+        Args:
+            texts: At most batch_size texts
+            input_type: "query" for questions, "passage" for knowledge base chunks
+
+        return:
+            One vector per text, in order
+        """
+
+    async def _aembed_batch(self, texts: List[str], input_type: str) -> List[List[float]]:
+        """Async version of _embed_batch, local backends run in a worker thread to keep the event loop free."""
+        return await asyncio.to_thread(self._embed_batch, texts, input_type)
+
+    def embed(self, texts: List[str], input_type: str = "query") -> List[List[float]]:
+        """
+        Embed texts in batches.
+
+        Args:
+            texts: Texts to embed
+            input_type: "query" for questions, "passage" for knowledge base chunks
+
+        return:
+            One vector per text, in order
+        """
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            call_start = time.perf_counter()
+            vectors.extend(self._embed_batch(batch, input_type))
+            self._record(len(batch), time.perf_counter() - call_start)
+        return vectors
+
+    async def aembed(self, texts: List[str], input_type: str = "query") -> List[List[float]]:
+        """Async counterpart of embed."""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            call_start = time.perf_counter()
+            vectors.extend(await self._aembed_batch(batch, input_type))
+            self._record(len(batch), time.perf_counter() - call_start)
+        return vectors
+
+    def _record(self, inputs: int, seconds: float) -> None:
+        """Count one backend call."""
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["inputs"] += inputs
+            self.stats["seconds"] += seconds
+            self._latencies.append(seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Per-call latency of the backend for the run.
+
+        return:
+            Dict with backend, calls, inputs, seconds, avg_ms, p50_ms, p95_ms and last_ms
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            latencies = sorted(self._latencies)
+            last = self._latencies[-1] if self._latencies else 0.0
+        stats["backend"] = self.name
+        stats["avg_ms"] = round(1000 * stats["seconds"] / stats["calls"], 1) if stats["calls"] else 0.0
+        stats["p50_ms"] = round(1000 * latencies[len(latencies) // 2], 1) if latencies else 0.0
+        stats["p95_ms"] = round(1000 * latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 1) if latencies else 0.0
+        stats["last_ms"] = round(1000 * last, 1)
+        stats["seconds"] = round(stats["seconds"], 3)
+        return stats
+
+
+class PineconeEmbeddingBackend(EmbeddingBackend):
+    """Hosted multilingual-e5-large through Pinecone inference (the model the index was built with)."""
+
+    name = "pinecone"
+
+    def __init__(self, client: Any = None, async_connect: Optional[Callable[[], Awaitable[Any]]] = None,
+                 model: Optional[str] = None):
+        """
+        Initialize with the Pinecone clients.
+
+        Args:
+            client: Sync Pinecone client
+            async_connect: Coroutine function returning the PineconeAsyncio client (async service)
+            model: Hosted embedding model name
+        """
+        super().__init__()
+        self.client = client
+        self.async_connect = async_connect
+        self.model = model or config.EMBED_MODEL
+
+    def _embed_batch(self, texts: List[str], input_type: str) -> List[List[float]]:
+        """Embed a batch with the hosted model."""
+        embedding_response = self.client.inference.embed(
+            model=self.model,
+            inputs=texts,
+            parameters={"input_type": input_type}
+        )
+        return [item['values'] for item in embedding_response]
+
+    async def _aembed_batch(self, texts: List[str], input_type: str) -> List[List[float]]:
+        """Embed a batch with the asyncio Pinecone client."""
+        if self.async_connect is None:
+            return await super()._aembed_batch(texts, input_type)
+        client = await self.async_connect()
+        embedding_response = await client.inference.embed(
+            model=self.model,
+            inputs=texts,
+            parameters={"input_type": input_type}
+        )
+        return [item['values'] for item in embedding_response]
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """
+    Local CPU embedding with an ONNX export of multilingual-e5-large (fp32 or int8 quantized).
+
+    EMBED_MODEL_PATH is a directory with tokenizer.json and model.onnx (or model_quantized.onnx).
+    Follows the e5 recipe so vectors match the hosted model: "query: "/"passage: " prefixes,
+    mean pooling over the attention mask and L2 normalization. Needs the optional onnxruntime,
+    tokenizers and numpy packages. The model is loaded once, on first use.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: Optional[str] = None, batch_size: Optional[int] = None):
+        """Initialize with the local model directory."""
+        super().__init__(batch_size or config.LOCAL_EMBED_BATCH_SIZE)
+        self.model_path = model_path or config.EMBED_MODEL_PATH
+        self._session = None
+        self._tokenizer = None
+        self._load_lock = threading.Lock()
+
+    def _load(self) -> None:
+        """Load the tokenizer and the ONNX session."""
+        with self._load_lock:
+            if self._session is not None:
+                return
+            try:
+                import numpy
+                import onnxruntime
+                from tokenizers import Tokenizer
+            except ImportError:
+                raise ValueError("EMBED_BACKEND=onnx needs the onnxruntime, tokenizers and numpy packages")
+
+            if not self.model_path or not os.path.isdir(self.model_path):
+                raise ValueError(f"Embedding model not found at EMBED_MODEL_PATH: {self.model_path}")
+            model_file = next(
+                (os.path.join(self.model_path, name) for name in ("model_quantized.onnx", "model.onnx")
+                 if os.path.exists(os.path.join(self.model_path, name))),
+                None
+            )
+            if not model_file:
+                raise ValueError(f"No model.onnx or model_quantized.onnx in {self.model_path}")
+
+            tokenizer = Tokenizer.from_file(os.path.join(self.model_path, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=512)
+            tokenizer.enable_padding()
+
+            options = onnxruntime.SessionOptions()
+            if config.LOCAL_EMBED_THREADS:
+                options.intra_op_num_threads = config.LOCAL_EMBED_THREADS
+            session = onnxruntime.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+
+            self._tokenizer = tokenizer
+            self._session = session
+
+    def _embed_batch(self, texts: List[str], input_type: str) -> List[List[float]]:
+        """Tokenize, run the model and mean-pool a batch."""
+        if self._session is None:
+            self._load()
+        import numpy as np
+
+        encodings = self._tokenizer.encode_batch([f"{input_type}: {text}" for text in texts])
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if any(model_input.name == "token_type_ids" for model_input in self._session.get_inputs()):
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self._session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(hidden.dtype)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+        if pooled.shape[1] != config.EMBED_DIMENSION:
+            raise ValueError(f"Local model returns {pooled.shape[1]} dims, the index expects {config.EMBED_DIMENSION}")
+        return pooled.tolist()
+
+
+class DeterministicEmbeddingBackend(EmbeddingBackend):
+    """
+    Stand-in model for tests: no network, no model files. Words are hashed into buckets of an
+    EMBED_DIMENSION vector, so equal texts get equal vectors and texts sharing words score close.
+    """
+
+    name = "deterministic"
+
+    def _embed_batch(self, texts: List[str], input_type: str) -> List[List[float]]:
+        """Hash each text into a normalized bag-of-words vector."""
+        return [self._vector(text) for text in texts]
+
+    @staticmethod
+    def _vector(text: str) -> List[float]:
+        """Normalized signed feature-hashing vector of the text's words."""
+        vector = [0.0] * config.EMBED_DIMENSION
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.sha256(word.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "big") % config.EMBED_DIMENSION
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+
+EMBEDDING_BACKENDS = {
+    "pinecone": PineconeEmbeddingBackend,
+    "onnx": OnnxEmbeddingBackend,
+    "deterministic": DeterministicEmbeddingBackend,
+}
+
+
+def get_embedding_backend(name: Optional[str] = None, client: Any = None,
+                          async_connect: Optional[Callable[[], Awaitable[Any]]] = None) -> EmbeddingBackend:
+    """
+    Create the embedding backend named in EMBED_BACKEND.
+
+    Args:
+        name: Backend name (defaults to EMBED_BACKEND)
+        client: Sync Pinecone client (pinecone backend)
+        async_connect: Coroutine function returning the PineconeAsyncio client (pinecone backend)
+
+    Raises:
+        ValueError: If the name is unknown
+    """
+    name = (name or config.EMBED_BACKEND).lower()
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown EMBED_BACKEND {name}, expected one of: {', '.join(EMBEDDING_BACKENDS)}")
+    if name == "pinecone":
+        return PineconeEmbeddingBackend(client=client, async_connect=async_connect)
+    return EMBEDDING_BACKENDS[name]()
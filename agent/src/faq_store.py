@@ -0,0 +1,172 @@
+import os
+import json
+import hashlib
+from typing import Dict, Any, List, Optional
+from langchain_core.prompts import PromptTemplate
+from langchain_cohere import ChatCohere
+from src.vector_search import vector_search, faq_namespace
+import src.config as config
+
+
+FAQ_PROMPT = PromptTemplate.from_template(
+    """Act as the assistant answering emails about a job. Read the "Knowledge" below and write the questions people are most likely to ask about it, each with an answer.
+
+    Instructions:
+    - Write at most {max_questions} questions.
+    - Every answer must be based strictly on "Knowledge". Skip questions "Knowledge" cannot fully answer.
+    - Answers are email reply bodies: 1-3 short plain text sentences, no salutation, no closing, never apologize.
+    - Return only a JSON list like [{{"question": "...", "answer": "..."}}] and nothing else.
+
+    "Knowledge": {knowledge}"""
+)
+
+
+class FAQStore:
+    """
+    Offline precompute of a job's likely questions & answers.
+
+    A job's knowledge base changes rarely, so questions members are likely to ask can be
+    answered once when it is loaded instead of live for every member. precompute() reads the
+    job's namespace chunks, has the LLM write question/answer pairs from them, and stores the
+    embedded questions in the job's FAQ namespace. At reply time VectorSearchService.search_faq
+    answers strong matches from the store without an LLM call; the live path is the fallback.
+    """
+
+    def _get_llm(self) -> ChatCohere:
+        """Create the chat model used to write the FAQ."""
+        return ChatCohere(
+            model=os.environ.get("LLM_MODEL"),
+            temperature=os.environ.get("LLM_TEMPERATURE"),
+            max_retries=3
+        )
+
+    def load_chunks(self, job_id: str, index_name: str) -> Dict[str, str]:
+        """
+        Read the text of every chunk in a job's knowledge base namespace.
+
+        Args:
+            job_id: Job ID (the namespace)
+            index_name: Name of the index
+
+        return:
+            Dict of vector id -> chunk text
+        """
+        return vector_search.get_namespace_chunks(job_id, index_name)
+
+    @staticmethod
+    def ordered_texts(chunks: Dict[str, str]) -> List[str]:
+        """Chunk texts ordered by vector id (upload order)."""
+        ordered_ids = sorted(chunks, key=lambda vector_id: (not vector_id.isdigit(), int(vector_id) if vector_id.isdigit() else vector_id))
+        return [chunks[vector_id] for vector_id in ordered_ids if chunks[vector_id]]
+
+    def group_chunks(self, chunks: List[str]) -> List[str]:
+        """Group consecutive chunks (single sentences from the uploader) into windows of about FAQ_WINDOW_CHARS."""
+        windows, current = [], ""
+        for chunk in chunks:
+            if current and len(current) + len(chunk) > config.FAQ_WINDOW_CHARS:
+                windows.append(current)
+                current = ""
+            current += chunk.strip() + ". "
+        if current:
+            windows.append(current)
+        return windows
+
+    def generate_pairs(self, knowledge: str) -> List[Dict[str, str]]:
+        """
+        Have the LLM write question/answer pairs for one window of the knowledge base.
+
+        return:
+            List of dicts with question and answer (malformed output yields an empty list)
+        """
+        prompt = FAQ_PROMPT.invoke({"knowledge": knowledge, "max_questions": config.FAQ_QUESTIONS_PER_WINDOW})
+        result = self._get_llm().invoke(prompt.text)
+        content = result.content
+        try:
+            pairs = json.loads(content[content.index("["):content.rindex("]") + 1])
+        except ValueError:
+            print(f"FAQ generation returned no JSON list: {content[:200]}")
+            return []
+        return [
+            {"question": pair["question"].strip(), "answer": pair["answer"].strip()}
+            for pair in pairs
+            if isinstance(pair, dict) and pair.get("question") and pair.get("answer")
+        ]
+
+    def precompute(self, job_id: str, index_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Rebuild a job's FAQ namespace from its current knowledge base.
+
+        Args:
+            job_id: Job ID
+            index_name: Name of the index (defaults to one in env)
+
+        return:
+            Dict with status, chunk, window and question counts
+        """
+        try:
+            config.ensure_env_vars()
+            if not job_id:
+                return {"status": "error", "message": "A job ID is required to precompute a FAQ"}
+
+            index_name = index_name or os.environ.get("INDEX_NAME")
+            source_chunks = self.load_chunks(job_id, index_name)
+            chunks = self.ordered_texts(source_chunks)
+            if not chunks:
+                return {"status": "no_action", "message": "The job has no knowledge base to build a FAQ from"}
+
+            # the FAQ is tied to the knowledge base it was built from, search_faq ignores it once that changes
+            source_fingerprint = vector_search.get_knowledge_fingerprint(job_id, index_name, chunks=source_chunks)
+
+            pairs, seen = [], set()
+            windows = self.group_chunks(chunks)
+            for window in windows:
+                for pair in self.generate_pairs(window):
+                    key = pair["question"].lower()
+                    if key not in seen:
+                        seen.add(key)
+                        pairs.append(pair)
+
+            if not pairs:
+                return {"status": "error", "message": "No FAQ could be generated from the knowledge base"}
+
+            embeddings = vector_search.embed_texts([pair["question"] for pair in pairs], input_type="query")
+            vectors = [
+                {
+                    "id": hashlib.sha256(pair["question"].lower().encode("utf-8")).hexdigest()[:32],
+                    "values": embedding,
+                    "metadata": {
+                        "question": pair["question"],
+                        "answer": pair["answer"],
+                        "approved": config.FAQ_AUTO_APPROVE,
+                        "source_fingerprint": source_fingerprint
+                    }
+                }
+                for pair, embedding in zip(pairs, embeddings)
+            ]
+
+            index = vector_search.get_index(index_name)
+            namespace = faq_namespace(job_id)
+            try:
+                index.delete(delete_all=True, namespace=namespace)
+            except Exception as e:
+                # the namespace does not exist on the first precompute
+                print(f"Could not clear FAQ namespace {namespace}: {str(e)}")
+            for start in range(0, len(vectors), 100):
+                index.upsert(vectors=vectors[start:start + 100], namespace=namespace)
+            vector_search.invalidate_namespace_stats(index_name)
+
+            return {
+                "status": "success",
+                "message": f"Stored {len(vectors)} FAQ entries for job {job_id}",
+                "chunks": len(chunks),
+                "windows": len(windows),
+                "questions": len(vectors)
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"FAQ precompute failed: {str(e)}"
+            }
+
+# Create a singleton instance
+faq_store = FAQStore()
@@ -0,0 +1,213 @@
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Callable, Awaitable, Optional
+import src.config as config
+
+
+def percentile(values: Any, pct: float) -> float:
+    """Nearest-rank percentile of a non-empty collection."""
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(pct / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+
+class _Site:
+    """Recent latencies & counters of one call site."""
+
+    def __init__(self, window: int):
+        self.latencies: deque = deque(maxlen=window)
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        # hedges started and not yet counted in hedges
+        self.pending_hedges = 0
+
+    def hedge_allowed(self) -> bool:
+        """Whether one more hedge keeps the site within HEDGE_BUDGET (caller holds the lock)."""
+        # the budget counts this call, so a site can never go over HEDGE_BUDGET of its calls
+        return self.hedges + self.pending_hedges + 1 <= config.HEDGE_BUDGET * (self.calls + 1)
+
+
+class Hedger:
+    """
+    Hedged LLM requests.
+
+    A call that has not returned after the HEDGE_PERCENTILE latency of its call site's recent
+    calls gets a second, identical request, and whichever answers first is used (the other is
+    cancelled, or left to finish in the background on the sync pipeline). Hedges are capped at
+    HEDGE_BUDGET of a site's calls (reserved under the lock right before a hedge starts, so
+    concurrent slow calls cannot overshoot it) and only start once HEDGE_MIN_SAMPLES latencies are known,
+    so a slow provider gets at most that much extra load. Latency percentiles and the hedge
+    rate of every call site are kept whether hedging is on or not.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None):
+        """Initialize with no call sites (enabled defaults to HEDGING_ENABLED)."""
+        self.enabled = config.HEDGING_ENABLED if enabled is None else enabled
+        self._sites: Dict[str, _Site] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _site(self, site: str) -> _Site:
+        """Stats of a call site (created on first use)."""
+        with self._lock:
+            if site not in self._sites:
+                self._sites[site] = _Site(config.HEDGE_WINDOW)
+            return self._sites[site]
+
+    def hedge_delay(self, site: str) -> Optional[float]:
+        """Seconds after which a call of site is hedged, None while hedging is off or not allowed."""
+        if not self.enabled:
+            return None
+        stats = self._site(site)
+        with self._lock:
+            if len(stats.latencies) < config.HEDGE_MIN_SAMPLES:
+                return None
+            if not stats.hedge_allowed():
+                return None
+            return max(config.HEDGE_MIN_DELAY, percentile(stats.latencies, config.HEDGE_PERCENTILE))
+
+    def _reserve_hedge(self, site: str) -> bool:
+        """
+        Claim budget for a hedge about to start, False when concurrent calls have used it up
+        since hedge_delay. Every reservation is given back with _release_hedge.
+        """
+        stats = self._site(site)
+        with self._lock:
+            if not stats.hedge_allowed():
+                return False
+            stats.pending_hedges += 1
+            return True
+
+    def _release_hedge(self, site: str) -> None:
+        """Give back a reservation (the hedge is counted by _record by then, or never started)."""
+        stats = self._site(site)
+        with self._lock:
+            stats.pending_hedges -= 1
+
+    def _record(self, site: str, latency: float, hedged: bool, hedge_won: bool) -> None:
+        """Count one finished call."""
+        stats = self._site(site)
+        with self._lock:
+            stats.latencies.append(latency)
+            stats.calls += 1
+            stats.hedges += int(hedged)
+            stats.hedge_wins += int(hedge_won)
+
+    def call(self, site: str, request: Callable[[], Any]) -> Any:
+        """
+        Run a request, hedged when it is slow.
+
+        Args:
+            site: Call site the latency stats are kept under
+            request: Makes the request (called twice when hedged)
+
+        return:
+            The first successful response
+        """
+        start = time.monotonic()
+        delay = self.hedge_delay(site)
+        if delay is None:
+            response = request()
+            self._record(site, time.monotonic() - start, False, False)
+            return response
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=config.HEDGE_WORKERS)
+        primary = self._pool.submit(request)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            response = primary.result()
+            self._record(site, time.monotonic() - start, False, False)
+            return response
+
+        if not self._reserve_hedge(site):
+            response = primary.result()
+            self._record(site, time.monotonic() - start, False, False)
+            return response
+        try:
+            hedge = self._pool.submit(request)
+            pending, error = {primary, hedge}, None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        self._record(site, time.monotonic() - start, True, future is hedge)
+                        return future.result()
+                    error = future.exception()
+            self._record(site, time.monotonic() - start, True, False)
+            raise error
+        finally:
+            self._release_hedge(site)
+
+    async def acall(self, site: str, request: Callable[[], Awaitable[Any]]) -> Any:
+        """Async counterpart of call, the losing request is cancelled."""
+        start = time.monotonic()
+        delay = self.hedge_delay(site)
+        if delay is None:
+            response = await request()
+            self._record(site, time.monotonic() - start, False, False)
+            return response
+
+        primary = asyncio.ensure_future(request())
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                response = primary.result()
+                self._record(site, time.monotonic() - start, False, False)
+                return response
+
+            if not self._reserve_hedge(site):
+                response = await primary
+                self._record(site, time.monotonic() - start, False, False)
+                return response
+            try:
+                hedge = asyncio.ensure_future(request())
+                tasks.append(hedge)
+                pending, error = {primary, hedge}, None
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            self._record(site, time.monotonic() - start, True, task is hedge)
+                            return task.result()
+                        error = task.exception()
+                self._record(site, time.monotonic() - start, True, False)
+                raise error
+            finally:
+                self._release_hedge(site)
+        finally:
+            # the loser (or both, when the caller is cancelled)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Latency & hedging per call site.
+
+        return:
+            Dict with enabled and, per site, calls, hedges, hedge_rate, hedge_wins, p50_ms and p99_ms
+        """
+        with self._lock:
+            sites = {
+                site: {
+                    "calls": stats.calls,
+                    "hedges": stats.hedges,
+                    "hedge_rate": round(stats.hedges / stats.calls, 3) if stats.calls else 0.0,
+                    "hedge_wins": stats.hedge_wins,
+                    "p50_ms": round(percentile(stats.latencies, 50) * 1000, 1) if stats.latencies else None,
+                    "p99_ms": round(percentile(stats.latencies, 99) * 1000, 1) if stats.latencies else None
+                }
+                for site, stats in self._sites.items()
+            }
+        return {"enabled": self.enabled, "sites": sites}
+
+# Create a singleton instance
+hedger = Hedger()
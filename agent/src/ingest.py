@@ -0,0 +1,267 @@
+import os
+import re
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Iterator, Iterable, Tuple
+from src.vector_search import vector_search
+from src.answer_cache import answer_cache
+from src.database import db
+from src.utils import retry_with_backoff
+import src.config as config
+
+
+SUPPORTED_EXTENSIONS = (".txt", ".md")
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# markdown headings start a section of their own
+HEADING = re.compile(r"^#{1,6}\s")
+
+# a long paragraph is cut after a sentence whose hash is 0 mod this (about every 4th sentence)
+CUT_EVERY = 4
+
+# ids written by chunk_id; anything else in the namespace (the frontend's numeric ids) is never pruned
+CHUNK_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class KnowledgeBaseIngestor:
+    """
+    Bulk loads documents into a job's knowledge base namespace.
+
+    Documents are streamed paragraph by paragraph, so memory stays flat however large the
+    files are. Chunk boundaries depend only on the content around them: a chunk never spans
+    paragraphs (a markdown heading stays with the paragraph under it), and a paragraph longer
+    than INGEST_CHUNK_CHARS is cut after sentences picked by their own hash. An edit therefore
+    only changes the chunks it touches. Chunk ids are a hash of the normalized chunk text,
+    which dedups identical chunks and makes re-ingestion incremental: chunks already in the
+    namespace are skipped, only new chunks are embedded (EMBED_BATCH_SIZE per call) and
+    upserted (INGEST_UPSERT_BATCH per request, INGEST_UPSERT_WORKERS in parallel). With prune,
+    chunks an earlier ingestion wrote that are no longer in the documents are deleted; vectors
+    uploaded from the frontend are always left alone. A changed knowledge base drops the job's
+    cached answers.
+    """
+
+    def iter_documents(self, paths: Iterable[str]) -> Iterator[Tuple[str, Iterator[str]]]:
+        """
+        Find the documents to ingest.
+
+        Args:
+            paths: Files or directories (walked recursively)
+
+        return:
+            (source path, paragraph iterator) per supported document
+        """
+        for path in paths:
+            if os.path.isdir(path):
+                files = sorted(
+                    os.path.join(root, name)
+                    for root, _, names in os.walk(path)
+                    for name in names
+                )
+            else:
+                files = [path]
+
+            for file_path in files:
+                if not file_path.lower().endswith(SUPPORTED_EXTENSIONS):
+                    print(f"Skipping unsupported document: {file_path}")
+                    continue
+                yield file_path, self.iter_paragraphs(file_path)
+
+    @staticmethod
+    def iter_paragraphs(file_path: str) -> Iterator[str]:
+        """
+        Read a text file lazily, one paragraph at a time. Paragraphs are separated by blank
+        lines; a markdown heading starts a new one and is kept with the text under it.
+        """
+        lines = []
+        with open(file_path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                # a paragraph ends at a blank line or a heading, a heading waits for the text under it
+                ends = not line or HEADING.match(line)
+                if ends and lines and not HEADING.match(lines[-1]):
+                    yield " ".join(lines)
+                    lines = []
+                if line:
+                    lines.append(line)
+        if lines:
+            yield " ".join(lines)
+
+    def iter_chunks(self, paragraphs: Iterable[str]) -> Iterator[str]:
+        """
+        Cut a document into chunks of at most INGEST_CHUNK_CHARS along content-defined boundaries.
+
+        Each paragraph is its own chunk. A longer paragraph is split into sentences and cut after
+        every sentence whose hash is 0 mod CUT_EVERY (once the chunk has a quarter of the size),
+        or where the next sentence would not fit. The cuts depend on the sentences alone, so an
+        inserted sentence changes its own chunk and the chunks around it resync right after.
+
+        Args:
+            paragraphs: The document's paragraphs
+
+        return:
+            Chunk texts in document order
+        """
+        for paragraph in paragraphs:
+            if len(paragraph) <= config.INGEST_CHUNK_CHARS:
+                yield paragraph
+                continue
+            current = ""
+            for sentence in SENTENCE_END.split(paragraph):
+                for piece in self._split_long(sentence.strip()):
+                    if current and len(current) + len(piece) + 1 > config.INGEST_CHUNK_CHARS:
+                        yield current
+                        current = ""
+                    current = f"{current} {piece}" if current else piece
+                    if len(current) >= config.INGEST_CHUNK_CHARS // 4 and self._is_cut(piece):
+                        yield current
+                        current = ""
+            if current:
+                yield current
+
+    @staticmethod
+    def _is_cut(sentence: str) -> bool:
+        """Whether a chunk ends after this sentence (decided by its content alone)."""
+        digest = hashlib.sha256(" ".join(sentence.lower().split()).encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "big") % CUT_EVERY == 0
+
+    @staticmethod
+    def _split_long(sentence: str) -> List[str]:
+        """Split a sentence longer than INGEST_CHUNK_CHARS on word boundaries."""
+        if len(sentence) <= config.INGEST_CHUNK_CHARS:
+            return [sentence] if sentence else []
+        pieces, current = [], ""
+        for word in sentence.split():
+            if current and len(current) + len(word) + 1 > config.INGEST_CHUNK_CHARS:
+                pieces.append(current)
+                current = ""
+            current = f"{current} {word}" if current else word
+        if current:
+            pieces.append(current)
+        return pieces
+
+    @staticmethod
+    def chunk_id(text: str) -> str:
+        """Content hash id of a chunk (whitespace and case insensitive)."""
+        normalized = " ".join(text.lower().split())
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+    @retry_with_backoff()
+    def list_ids(self, index: Any, namespace: str) -> set:
+        """Every vector id already stored in the namespace."""
+        existing = set()
+        for ids in index.list(namespace=namespace):
+            existing.update(ids)
+        return existing
+
+    @retry_with_backoff()
+    def upsert_batch(self, index: Any, vectors: List[Dict[str, Any]], namespace: str) -> int:
+        """Upsert one batch of vectors, returning the number written."""
+        index.upsert(vectors=vectors, namespace=namespace)
+        return len(vectors)
+
+    def ingest(self, job_id: str, paths: List[str], index_name: Optional[str] = None,
+               prune: bool = False) -> Dict[str, Any]:
+        """
+        Ingest documents into a job's knowledge base namespace.
+
+        Args:
+            job_id: Job ID (the namespace)
+            paths: Document files or directories
+            index_name: Name of the index (defaults to one in env)
+            prune: Delete ingested chunks that are no longer in the documents (the documents are the whole knowledge base)
+
+        return:
+            Dict with status, chunk counts and throughput in chunks per second
+        """
+        try:
+            config.ensure_env_vars()
+            if not job_id:
+                return {"status": "error", "message": "A job ID is required to ingest documents"}
+            job_details = db.get_job_details(job_id)
+            if not job_details:
+                return {"status": "error", "message": f"Job {job_id} not found"}
+
+            start = time.perf_counter()
+            index_name = index_name or os.environ.get("INDEX_NAME")
+            namespace = job_details["id"]
+            index = vector_search.get_index(index_name)
+            existing = self.list_ids(index, namespace)
+
+            seen, pending, futures = set(), [], []
+            counts = {"documents": 0, "chunks": 0, "duplicates": 0, "unchanged": 0, "upserted": 0, "deleted": 0}
+
+            with ThreadPoolExecutor(max_workers=config.INGEST_UPSERT_WORKERS) as upserts:
+                def flush(batch: List[Tuple[str, str, str]]) -> None:
+                    """Embed a batch of new chunks and queue their upserts."""
+                    embeddings = vector_search.embed_texts([text for _, text, _ in batch], input_type="passage")
+                    vectors = [
+                        {"id": chunk_id, "values": embedding, "metadata": {"text": text, "source": source}}
+                        for (chunk_id, text, source), embedding in zip(batch, embeddings)
+                    ]
+                    for offset in range(0, len(vectors), config.INGEST_UPSERT_BATCH):
+                        futures.append(upserts.submit(
+                            self.upsert_batch, index, vectors[offset:offset + config.INGEST_UPSERT_BATCH], namespace
+                        ))
+                    # keep at most a few batches in flight so memory stays bounded
+                    while len(futures) > 2 * config.INGEST_UPSERT_WORKERS:
+                        counts["upserted"] += futures.pop(0).result()
+
+                for source, paragraphs in self.iter_documents(paths):
+                    counts["documents"] += 1
+                    for text in self.iter_chunks(paragraphs):
+                        counts["chunks"] += 1
+                        chunk_id = self.chunk_id(text)
+                        if chunk_id in seen:
+                            counts["duplicates"] += 1
+                            continue
+                        seen.add(chunk_id)
+                        if chunk_id in existing:
+                            counts["unchanged"] += 1
+                            continue
+                        pending.append((chunk_id, text, source))
+                        if len(pending) >= config.EMBED_BATCH_SIZE:
+                            flush(pending)
+                            pending = []
+
+                if pending:
+                    flush(pending)
+                for future in futures:
+                    counts["upserted"] += future.result()
+
+            if not seen:
+                return {"status": "no_action", "message": "No text found in the documents", **counts}
+
+            stale = sorted(vector_id for vector_id in existing - seen if CHUNK_ID.match(vector_id))
+            if prune:
+                for offset in range(0, len(stale), 1000):
+                    index.delete(ids=stale[offset:offset + 1000], namespace=namespace)
+                counts["deleted"] = len(stale)
+            else:
+                # still retrievable next to the new chunks until an ingest with prune
+                counts["stale"] = len(stale)
+
+            if counts["upserted"] or counts["deleted"]:
+                vector_search.invalidate_namespace_stats(index_name)
+                # answers written from the old chunks; other processes see the new knowledge
+                # fingerprint within ANSWER_CACHE_FINGERPRINT_TTL / FAQ_FINGERPRINT_TTL
+                answer_cache.invalidate(job_id)
+
+            seconds = time.perf_counter() - start
+            return {
+                "status": "success",
+                "message": f"Ingested {len(seen)} chunks for job {job_id} "
+                           f"({counts['upserted']} new, {counts['unchanged']} unchanged, {counts['deleted']} deleted)",
+                **counts,
+                "seconds": round(seconds, 2),
+                "chunks_per_second": round(counts["chunks"] / seconds, 1) if seconds else 0.0
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Ingestion failed: {str(e)}"
+            }
+
+# Create a singleton instance
+ingestor = KnowledgeBaseIngestor()
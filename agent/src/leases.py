@@ -0,0 +1,250 @@
+import os
+import math
+import time
+import uuid
+import socket
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Any, List, Optional
+import src.config as config
+
+
+def partition_of(member_id: str, partitions: int) -> int:
+    """Stable partition of a member (the same on every replica)."""
+    digest = hashlib.sha256(member_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % max(1, partitions)
+
+
+def new_owner_id() -> str:
+    """Unique lease owner id of this agent process."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class SQLiteLeaseStore:
+    """
+    Local stand-in for the Supabase lease functions (claim_lease/renew_lease/release_lease) with
+    the same semantics, for tests and single-host setups. Use a file path to share leases between
+    processes on one host; ":memory:" only works within one process.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Open (and create) the lease database."""
+        self.path = path or config.LEASE_SQLITE_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute(
+            "create table if not exists agent_leases ("
+            "resource text primary key, owner text not null, expires_at real not null, heartbeat_at real not null)"
+        )
+
+    def claim_lease(self, resource: str, owner: str, ttl_seconds: int) -> bool:
+        """Take a lease when it is free, expired or already held by owner."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "insert into agent_leases (resource, owner, expires_at, heartbeat_at) values (?, ?, ?, ?) "
+                "on conflict (resource) do update set owner = excluded.owner, expires_at = excluded.expires_at, "
+                "heartbeat_at = excluded.heartbeat_at "
+                "where agent_leases.expires_at < ? or agent_leases.owner = excluded.owner",
+                (resource, owner, now + ttl_seconds, now, now)
+            )
+            return cursor.rowcount == 1
+
+    def renew_lease(self, resource: str, owner: str, ttl_seconds: int) -> bool:
+        """Extend a lease owner still holds."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "update agent_leases set expires_at = ?, heartbeat_at = ? where resource = ? and owner = ?",
+                (now + ttl_seconds, now, resource, owner)
+            )
+            return cursor.rowcount == 1
+
+    def release_lease(self, resource: str, owner: str) -> None:
+        """Give a lease back early (only when owner holds it)."""
+        with self._lock:
+            self._conn.execute("delete from agent_leases where resource = ? and owner = ?", (resource, owner))
+
+    def count_live_leases(self, prefix: str) -> int:
+        """Number of unexpired leases whose resource starts with prefix."""
+        with self._lock:
+            row = self._conn.execute(
+                "select count(*) from agent_leases where substr(resource, 1, ?) = ? and expires_at >= ?",
+                (len(prefix), prefix, time.time())
+            ).fetchone()
+        return row[0]
+
+
+def get_lease_store():
+    """
+    The configured lease store: the database (Supabase functions) or the SQLite stand-in.
+
+    Raises:
+        ValueError: If LEASE_BACKEND is unknown
+    """
+    if config.LEASE_BACKEND == "sqlite":
+        return SQLiteLeaseStore()
+    if config.LEASE_BACKEND == "supabase":
+        from src.database import db
+        return db
+    raise ValueError(f"Unknown LEASE_BACKEND {config.LEASE_BACKEND}, expected supabase or sqlite")
+
+
+class JobLeases:
+    """
+    The leases one run holds on a job's member partitions.
+
+    A job's members are split into LEASE_PARTITIONS stable partitions ("job:<id>:part:<n>").
+    Every run working on the job also holds a presence lease ("job:<id>:owner:<owner>"), so the
+    live runs can be counted, and claims a fair share of the partitions, ceil(partitions / live
+    runs), starting at a partition picked by its owner id. It only processes members of the
+    partitions it holds, so overlapping runs and extra replicas share a job without two of them
+    handling the same member. A heartbeat thread renews the leases every LEASE_TTL / 3 seconds and
+    rebalances: partitions above the current share are given back for the runs that joined since,
+    and free or expired ones are picked up while the run holds less than its share. A partition
+    whose renewal fails (the lease expired and another agent took it) is dropped, and its members
+    are skipped from then on. A run that got no partition leaves its presence lease to expire, so
+    the runs holding the job give its share back for the next tick.
+    """
+
+    def __init__(self, job_id: str, store: Any = None, owner: Optional[str] = None,
+                 partitions: Optional[int] = None, ttl_seconds: Optional[int] = None):
+        """
+        Initialize the job's leases (nothing is claimed yet).
+
+        Args:
+            job_id: Job ID
+            store: Lease store (defaults to get_lease_store())
+            owner: Lease owner id (defaults to a new one for this process)
+            partitions: Member partitions of the job (defaults to LEASE_PARTITIONS)
+            ttl_seconds: Lease lifetime without a heartbeat (defaults to LEASE_TTL)
+        """
+        self.job_id = job_id
+        self.store = store or get_lease_store()
+        self.owner = owner or new_owner_id()
+        self.partitions = max(1, partitions or config.LEASE_PARTITIONS)
+        self.ttl_seconds = ttl_seconds or config.LEASE_TTL
+        self.held: set = set()
+        # the first claim got nothing: the run only waits for its share (see release)
+        self.waiting = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def resource(self, partition: int) -> str:
+        """Lease name of one of the job's partitions."""
+        return f"job:{self.job_id}:part:{partition}"
+
+    def presence(self) -> str:
+        """Lease name of this run's presence on the job."""
+        return f"job:{self.job_id}:owner:{self.owner}"
+
+    def fair_share(self) -> int:
+        """Partitions this run should hold: ceil(partitions / runs working on the job)."""
+        runs = self.store.count_live_leases(f"job:{self.job_id}:owner:")
+        return math.ceil(self.partitions / max(1, runs))
+
+    def _claim_up_to(self, share: int) -> None:
+        """Claim free or expired partitions while fewer than share are held."""
+        start = partition_of(self.owner, self.partitions)
+        for offset in range(self.partitions):
+            if len(self.held) >= share:
+                return
+            partition = (start + offset) % self.partitions
+            if partition in self.held:
+                continue
+            if self.store.claim_lease(self.resource(partition), self.owner, self.ttl_seconds):
+                with self._lock:
+                    self.held.add(partition)
+
+    def _give_back_above(self, share: int) -> None:
+        """Release the partitions held beyond share (their members are skipped from then on)."""
+        extra = sorted(self.held)[share:]
+        for partition in extra:
+            with self._lock:
+                self.held.discard(partition)
+            try:
+                self.store.release_lease(self.resource(partition), self.owner)
+            except Exception as e:
+                # it expires after the TTL without renewals
+                print(f"Could not release lease {self.resource(partition)}: {str(e)}")
+        if extra:
+            print(f"Gave back {len(extra)} partitions of job {self.job_id} to other runs")
+
+    def claim(self) -> List[int]:
+        """
+        Announce this run on the job, claim its fair share of the partitions and start the heartbeat.
+
+        return:
+            The partitions now held (empty when other agents hold them all)
+        """
+        self.store.claim_lease(self.presence(), self.owner, self.ttl_seconds)
+        self._claim_up_to(self.fair_share())
+        self.waiting = not self.held
+        if self.held and not self._heartbeat:
+            self._heartbeat = threading.Thread(target=self._renew_loop, daemon=True)
+            self._heartbeat.start()
+        return sorted(self.held)
+
+    def holds(self, member_id: str) -> bool:
+        """Whether this run (still) owns the member's partition."""
+        with self._lock:
+            return partition_of(member_id, self.partitions) in self.held
+
+    def _renew_loop(self) -> None:
+        """Heartbeat: renew held leases and rebalance the partitions until released."""
+        while not self._stop.wait(max(1, self.ttl_seconds / 3)):
+            try:
+                self.store.renew_lease(self.presence(), self.owner, self.ttl_seconds)
+            except Exception as e:
+                print(f"Lease heartbeat failed for {self.presence()}: {str(e)}")
+            for partition in list(self.held):
+                try:
+                    renewed = self.store.renew_lease(self.resource(partition), self.owner, self.ttl_seconds)
+                except Exception as e:
+                    # keep the lease until it is known to be lost, the next heartbeat retries
+                    print(f"Lease heartbeat failed for {self.resource(partition)}: {str(e)}")
+                    continue
+                if not renewed:
+                    print(f"Lost lease {self.resource(partition)}, its members are skipped")
+                    with self._lock:
+                        self.held.discard(partition)
+            if self._stop.is_set():
+                return
+            self.rebalance()
+
+    def rebalance(self) -> None:
+        """Hold the current fair share: give back partitions above it, claim free ones below it."""
+        try:
+            share = self.fair_share()
+            if len(self.held) > share:
+                self._give_back_above(share)
+            else:
+                self._claim_up_to(share)
+        except Exception as e:
+            # the next heartbeat retries
+            print(f"Lease rebalance failed for job {self.job_id}: {str(e)}")
+
+    def release(self) -> None:
+        """
+        Stop the heartbeat and give every held lease back. The presence lease of a run that held
+        no partition is kept until it expires, so the holders give back its share in the meantime.
+        """
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join(timeout=5)
+        resources = [self.resource(partition) for partition in self.held]
+        if not self.waiting:
+            resources.append(self.presence())
+        for resource in resources:
+            try:
+                self.store.release_lease(resource, self.owner)
+            except Exception as e:
+                print(f"Could not release lease {resource}: {str(e)}")
+        with self._lock:
+            self.held.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Partitions held by this run."""
+        return {"owner": self.owner, "partitions": self.partitions, "held": sorted(self.held)}
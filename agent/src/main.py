@@ -1,18 +1,30 @@
 import os
 import time
 import asyncio
-from typing import Dict, Any, Optional, List, Annotated
+import operator
+from typing import Dict, Any, Optional, List, Tuple, Annotated
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain_cohere import ChatCohere
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
 from typing_extensions import TypedDict
 
-from src.database import db
-from src.auth import auth_service
-from src.email_service import email_service
-from src.vector_search import vector_search
+from src.database import db, async_db, MEMBER_TIERS
+from src.auth import auth_service, async_auth_service
+from src.email_service import email_service, async_email_service, SendLimitExceededError
+from src.vector_search import vector_search, async_vector_search, VectorSearchService
+from src.answer_cache import answer_cache, AnswerCache
+from src.rerank import reranker
+from src.results import ResultSink
+from src.leases import JobLeases
+from src.checkpoints import graph_checkpoints
+from src.budget import RunBudget, utc_timestamp
+from src.notifications import notifier
+from src.negative_cache import negative_cache, job_key, job_state_fingerprint
+from src.concurrency import llm_limiter, gmail_limiter, llm_sync_limiter, gmail_sync_limiter
+from src.hedging import hedger
 import src.config as config
 from src.utils import util
 from dotenv import load_dotenv
@@ -23,8 +35,57 @@ load_dotenv()
 
 class State(TypedDict):
     """State object used in the graph."""
+    member_id: str
+    # Message-Id of the inbound message being answered (the reply's outbox key)
+    inbound_message_id: Optional[str]
+    member: Dict[str, Any]
+    job: Dict[str, Any]
+    last_message: str
+    email_history: str
+    email_context: str
+    speculative_results: Optional[Dict[str, Any]]
+    question_embedding: Optional[List[float]]
+    cached_answer: Optional[str]
+    faq_answer: Optional[str]
+    search_results: Optional[Dict[str, Any]]
+    notification: Optional[str]
     email_response: str
-    messages: List[Dict[str, Any]]
+    # parallel branches append to messages in the same step, so updates are concatenated
+    messages: Annotated[List[Dict[str, Any]], operator.add]
+
+
+# Prompts shared by the sync and async pipelines
+EMAIL_CONTEXT_PROMPT = PromptTemplate.from_template(
+    """Act as a helpful assistant.
+
+    Instructions:
+    - The "conversation-thread" is the memory of the discussion. Understand the discussion in "conversation-thread" and then extract the context of "last_message" as it relates to the discussion.
+    - if the extracted context is only a greeting or gratitude, create a sentence with the extracted context and return a friendly greeting or gratitude that always starts with "Thank you"and ask how you can help as needed.
+    - else if the extracted context is not a greeting or gratitude, return a sentence that is made with the extracted context.
+    - Note that the sentence will be used in a semantic search
+    "conversation-thread": {email_history}\n
+    "last_message": {last_message}
+       """
+)
+
+REPLY_PROMPT = PromptTemplate.from_template(
+    """Act as a professional and friendly email assistant. I need you to create an email response body to an email using only the information provided in "Context" to create coherent sentences. Do not use any external tools or information to answer questions.
+
+    Instructions:
+    - Use the "Conversation_History" only to match the tone and flow of the conversation, not for factual content.
+    - Using "Email_context", write a clear, concise reply (1-3 short paragraphs separated by new lines) strictly based in "Context".
+    - Never apologize in your response.
+    - Never include salutation in your response.
+    - Never include a closing in your response.
+    - Always return the response in plain text format & text size 14.
+                
+        
+    "Context": {context}\n
+    "Email_context": {email_context}\n
+    "Conversation_History": {email_history}"""
+)
+
+OFF_TOPIC_RESPONSE = "Your question is not related to this conversation. Please refrain from asking questions that are not related to this conversation."
 
 
 
@@ -36,19 +97,31 @@ class EmailAutomationApp:
     This class orchestrates all components and implements the email workflow.
     """
     
-    def __init__(self, job_id: Optional[str] = None):
+    def __init__(self, job_id: Optional[str] = None, sink: Optional[ResultSink] = None,
+                 deadline_seconds: Optional[float] = None):
         """
         Initialize the email automation application.
         
         Args:
             job_id: The job ID to process (compulsory)
+            sink: Where per-member results are streamed (default: kept in memory and returned)
+            deadline_seconds: Time budget of a run (defaults to RUN_DEADLINE_SECONDS, 0 = none)
         """
         # Set up the job ID
         self.job_id = job_id
+        self.sink = sink
+        self.deadline_seconds = deadline_seconds
+        self.budget = RunBudget(deadline_seconds)  # restarted by every run
+        self._scan_tier = None  # tier & last member started, where a halted run stopped
+        self._scan_after = None
+        self._skipped_ids: List[str] = []  # scheduled by arun() but not started before the deadline
+        self.leases: Optional[JobLeases] = None  # partitions of the job this run holds (LEASES_ENABLED)
         self.member_id = None  # Will be set during processing of each member
         
 
         self.graph = None  # graph will be set up for each member in run()
+        self.checkpointer = None  # persistent graph checkpoints (CHECKPOINT_ENABLED)
+        self._send_limit_reached = False  # set by arun() when Gmail reports the daily send limit
     
     #normal function, not as a tool. tool = too much hassle
     def start_message(self) -> str:
@@ -76,8 +149,10 @@ class EmailAutomationApp:
                 db.update_member_details(self.member_id, {
                     "message_id": message_data.get("message_id"),
                     "thread_id": message_data.get("threadId"),
-                    "subject": message_data.get("subject")
+                    "subject": message_data.get("subject"),
+                    **self._activity_stamp()
                 })
+                self._store_outbound(self.member_id, response.get("id"), message_data.get("body", ""), message_data.get("message_id"))
 
                 return "Initial Message sent successfully"
             else:
@@ -86,168 +161,428 @@ class EmailAutomationApp:
         except Exception as e:
             raise ValueError(f"Error sending initial message: {str(e)}")
 
-    def create_message(self, state: State) -> Dict[str, Any]:
+    async def astart_message(self, member_id: str) -> str:
+        """
+        Async counterpart of start_message for one member.
+            
+        return:
+            A string saying the initial message has been sent on success or failed to send on failure.
+        """
+        member = await async_db.get_member_details(member_id)
+        response = await async_email_service.send_first_message(self.job_id, member)
+        if not response:
+            return "Initial Message failed"
+
+        message_data = await async_email_service.get_message(self.job_id, response.get("id"))
+        await async_db.update_member_details(member_id, {
+            "message_id": message_data.get("message_id"),
+            "thread_id": message_data.get("threadId"),
+            "subject": message_data.get("subject"),
+            **self._activity_stamp()
+        })
+        await self._astore_outbound(member_id, response.get("id"), message_data.get("body", ""), message_data.get("message_id"))
+        return "Initial Message sent successfully"
+
+    def _get_llm(self) -> ChatCohere:
+        """Create the chat model used for both LLM calls."""
+        return ChatCohere(
+            model=os.environ.get("LLM_MODEL"), 
+            temperature=os.environ.get("LLM_TEMPERATURE"), 
+            # max_tokens=os.environ.get("LLM_MAX_TOKENS"), 
+            max_retries=3
+        )
+
+    def _invoke_llm(self, site: str, prompt: Any) -> Any:
         """
-        Tool function: Create a response message based on email content.
+        Make one LLM call, hedged when it is slower than usual (HEDGING_ENABLED), each request
+        under the adaptive LLM concurrency limit.
+
+        Args:
+            site: Call site the latency stats are kept under (extract_context, generate)
+            prompt: Prompt value or text
+        """
+        def request() -> Any:
+            with llm_sync_limiter.slot():
+                return self._get_llm().invoke(prompt)
+        return hedger.call(site, request)
+
+    async def _ainvoke_llm(self, site: str, prompt: Any) -> Any:
+        """Async counterpart of _invoke_llm, each request under the adaptive LLM concurrency limit."""
+        async def request() -> Any:
+            async with llm_limiter.slot():
+                return await self._get_llm().ainvoke(prompt)
+        return await hedger.acall(site, request)
+
+    def _prepare_email_text(self, member: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Split the member's stored body into the new message & the (capped) conversation history.
+        
+        return:
+            Dict with email_body, last_message and email_history
+        """
+        email_body = member.get("body", "")
+        # separate the member's new text from the quoted thread so only what is needed is sent to the llm & the vector search
+        stripped_body = email_service.split_member_message(email_body, member)
+        return {
+            "email_body": email_body,
+            "last_message": stripped_body["reply"],
+            "email_history": stripped_body["quoted"][:config.MAX_HISTORY_CHARS]
+        }
+
+    def _prepare_from_messages(self, member: Dict[str, Any], messages: List[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+        """
+        Rebuild the new message & the (capped) conversation history from the member's stored messages.
         
         return:
-            The updated state with the new message
+            Dict with email_body, last_message and email_history, or None when no inbound message
+            is stored yet (members.body is used instead)
         """
+        latest = next((i for i in range(len(messages) - 1, -1, -1) if messages[i]["direction"] == "inbound"), None)
+        if latest is None:
+            return None
+        # most recent first, like the quoted thread of an email
+        history = "\n\n".join(
+            f"{member['name_email']['name'] if message['direction'] == 'inbound' else 'You'}: {message['content']}"
+            for message in reversed(messages[:latest])
+        )
+        last_message = messages[latest]["content"]
+        return {
+            "email_body": last_message,
+            "last_message": last_message,
+            "email_history": history[:config.MAX_HISTORY_CHARS]
+        }
+
+    def _store_outbound(self, member_id: str, gmail_id: Optional[str], content: str, message_id: Optional[str]) -> None:
+        """Record a message we sent in the member's stored thread (a failure only costs history, not the send)."""
+        if not config.MESSAGE_STORE_ENABLED or not gmail_id:
+            return
         try:
-            llm = ChatCohere(
-                model=os.environ.get("LLM_MODEL"), 
-                temperature=os.environ.get("LLM_TEMPERATURE"), 
-                # max_tokens=os.environ.get("LLM_MAX_TOKENS"), 
-                max_retries=3
-            )
+            db.append_member_message(member_id, gmail_id, content, direction="outbound", message_id=message_id)
+        except Exception as e:
+            print(f"Could not store sent message for member {member_id}: {str(e)}")
 
-            # Get member details
-            member = db.get_member_details(self.member_id)
-            #get job details
-            job = db.get_job_details(self.job_id)
-            
-            # Search for relevant information using the last email's body
-            email_body = member.get("body", "")
-            # print("email_body: ", email_body)
-            receiver = f"Hi {member['name_email']['name']},"
-            last_message = email_body.split(receiver)[0]
-            print("email_body: ", email_body)
-            print("last_message: ", last_message)
-
-            email_context_prompt = PromptTemplate.from_template(
-                """Act as a helpful assistant.
-
-                Instructions:
-                - The "conversation-thread" is the memory of the discussion. Understand the discussion in "conversation-thread" and then extract the context of "last_message" as it relates to the discussion.
-                - if the extracted context is only a greeting or gratitude, create a sentence with the extracted context and return a friendly greeting or gratitude that always starts with "Thank you"and ask how you can help as needed.
-                - else if the extracted context is not a greeting or gratitude, return a sentence that is made with the extracted context.
-                - Note that the sentence will be used in a semantic search
-                "conversation-thread": {email_history}\n
-                "last_message": {last_message}
-                   """
-            )
-            email_context = llm.invoke(email_context_prompt.invoke({"email_history": email_body, "last_message": last_message}))
+    async def _astore_outbound(self, member_id: str, gmail_id: Optional[str], content: str, message_id: Optional[str]) -> None:
+        """Async counterpart of _store_outbound."""
+        if not config.MESSAGE_STORE_ENABLED or not gmail_id:
+            return
+        try:
+            await async_db.append_member_message(member_id, gmail_id, content, direction="outbound", message_id=message_id)
+        except Exception as e:
+            print(f"Could not store sent message for member {member_id}: {str(e)}")
 
-            #if email_context is a salutation return response
-            if email_context.content.startswith("Thank you"):
-                response = email_context.content
-            else:
-                print("email_context: ", email_context)
-                search_results = vector_search.search_with_text(self.job_id, email_context.content)
- 
-                # print("did the vector search", search_results)
-                # Create a prompt with the context
-                if search_results["has_relevant_matches"]:
-                    context = search_results["context"]
-                else:
-                    response = "Your question is not related to this conversation. Please refrain from asking questions that are not related to this conversation."
-                    #send a notification email to the user informing the user that an member has asked a question not in KnowledgeBase
-                    
-                    message = f"member - {member['name_email']['name']} asked a question that is either not related to the job - {job['title']} or not in the KnowledgeBase. We continued the conversation but you can check your email with {member['name_email']['email']} and subject - {member['subject']} to see the question. It is the message before the member is informed not to ask questions that are not related to the job in question."
-                    email_service.send_user_notification_email(message, self.member_id, self.job_id)
-                    return{
-                    "email_response": response,
-                    "messages": state.get("messages", []) +[{
-                    "role": "assistant"
-                }]
-                    }
-                
+    def _off_topic_notification(self, member: Dict[str, Any], job: Dict[str, Any]) -> str:
+        """Message sent to the user when a member asks something that is not in the KnowledgeBase."""
+        return f"member - {member['name_email']['name']} asked a question that is either not related to the job - {job['title']} or not in the KnowledgeBase. We continued the conversation but you can check your email with {member['name_email']['email']} and subject - {member['subject']} to see the question. It is the message before the member is informed not to ask questions that are not related to the job in question."
 
-                # Generate response using template
-                
-                prompt = PromptTemplate.from_template(
-                    """Act as a professional and friendly email assistant. I need you to create an email response body to an email using only the information provided in "Context" to create coherent sentences. Do not use any external tools or information to answer questions.
-
-                    Instructions:
-                    - Use the "Conversation_History" only to match the tone and flow of the conversation, not for factual content.
-                    - Using "Email_context", write a clear, concise reply (1-3 short paragraphs separated by new lines) strictly based in "Context".
-                    - Never apologize in your response.
-                    - Never include salutation in your response.
-                    - Never include a closing in your response.
-                    - Always return the response in plain text format & text size 14.
-                                
-                        
-                    "Context": {context}\n
-                    "Email_context": {email_context}\n
-                    "Conversation_History": {email_history}"""
+    # Graph nodes
+    # --------------------------------------------------------------
+    # The reply is built by a DAG of small nodes instead of one long
+    # function so independent steps overlap:
+    #   START -> load_member -> extract_context -+-> retrieve -> generate -> reply_thread -> END
+    #                        \-> speculate ------+                      \-> notify (queued) -> END
+    #   START -> load_job -----------------------+
+    # Nodes run in steps: load_member & load_job together, then
+    # extract_context (the first llm call) & speculate together, so
+    # only the speculative search overlaps the llm call; the job fetch
+    # overlaps the member fetch.
+    # Every node has a sync & async implementation; each node only
+    # returns the state keys it produces.
+    # --------------------------------------------------------------
+    def load_member(self, state: State) -> Dict[str, Any]:
+        """Graph node: fetch the member and their new message & history (stored messages, else the body)."""
+        member = db.get_member_details(state["member_id"])
+        if config.MESSAGE_STORE_ENABLED:
+            prepared = self._prepare_from_messages(member, db.get_member_messages(state["member_id"]))
+            if prepared:
+                return {"member": member, **prepared}
+        return {"member": member, **self._prepare_email_text(member)}
 
-                )
-                #context is the result of the similarity search against the knowledge base
-                full_prompt = prompt.invoke({"context": context, "email_context": email_context, "email_history": email_body})
-                
-                print("full_prompt: ", full_prompt)
+    async def aload_member(self, state: State) -> Dict[str, Any]:
+        """Async counterpart of load_member."""
+        member = await async_db.get_member_details(state["member_id"])
+        if config.MESSAGE_STORE_ENABLED:
+            prepared = self._prepare_from_messages(member, await async_db.get_member_messages(state["member_id"]))
+            if prepared:
+                return {"member": member, **prepared}
+        return {"member": member, **self._prepare_email_text(member)}
 
-                result = llm.invoke(full_prompt.text)
-                response = result.content
-            
+    def load_job(self, state: State) -> Dict[str, Any]:
+        """Graph node: fetch the job details (runs in the same step as load_member)."""
+        return {"job": db.get_job_details(self.job_id)}
 
-            # Update email response in state
-            state["email_response"] = response
-            print("got here in create_message, finished create message")
-            return{
-                "email_response": response,
-                "messages": state.get("messages", []) +[{
-                "role": "assistant"
-            }]
-                }
-            
+    async def aload_job(self, state: State) -> Dict[str, Any]:
+        """Async counterpart of load_job."""
+        return {"job": await async_db.get_job_details(self.job_id)}
+
+    def extract_context(self, state: State) -> Dict[str, Any]:
+        """Graph node: first LLM call, turn the member's last message into a search sentence (or a greeting reply)."""
+        print("last_message: ", state["last_message"])
+        email_context = self._invoke_llm("extract_context", EMAIL_CONTEXT_PROMPT.invoke({"email_history": state["email_history"], "last_message": state["last_message"]}))
+        print("email_context: ", email_context.content)
+        return {"email_context": email_context.content}
+
+    async def aextract_context(self, state: State) -> Dict[str, Any]:
+        """Async counterpart of extract_context."""
+        email_context = await self._ainvoke_llm("extract_context", EMAIL_CONTEXT_PROMPT.invoke({"email_history": state["email_history"], "last_message": state["last_message"]}))
+        return {"email_context": email_context.content}
+
+    def _is_salutation(self, state: State) -> bool:
+        """A greeting or gratitude is answered by the first LLM call directly, no search or second call needed."""
+        return state["email_context"].startswith("Thank you")
+
+    def speculate(self, state: State) -> Dict[str, Any]:
+        """Graph node: search with the member's raw message while extract_context is still running."""
+        return {"speculative_results": vector_search.speculative_search(self.job_id, state["last_message"])}
+
+    async def aspeculate(self, state: State) -> Dict[str, Any]:
+        """Async counterpart of speculate."""
+        return {"speculative_results": await async_vector_search.speculative_search(self.job_id, state["last_message"])}
+
+    def _refresh_cache_fingerprint(self, job: Dict[str, Any]) -> bool:
+        """
+        Make sure the answer cache knows the job's current knowledge base & default_message fingerprint.
+        
+        return:
+            False when the fingerprint could not be checked (the cache is skipped for this reply)
+        """
+        try:
+            if answer_cache.needs_fingerprint(self.job_id):
+                knowledge = vector_search.get_knowledge_fingerprint(job.get('id', ""))
+                answer_cache.set_fingerprint(self.job_id, AnswerCache.make_fingerprint(job, knowledge))
+            return True
         except Exception as e:
-            raise
-    
+            print(f"Answer cache fingerprint check failed: {str(e)}")
+            return False
+
+    async def _arefresh_cache_fingerprint(self, job: Dict[str, Any]) -> bool:
+        """Async counterpart of _refresh_cache_fingerprint."""
+        try:
+            if answer_cache.needs_fingerprint(self.job_id):
+                knowledge = await async_vector_search.get_knowledge_fingerprint(job.get('id', ""))
+                answer_cache.set_fingerprint(self.job_id, AnswerCache.make_fingerprint(job, knowledge))
+            return True
+        except Exception as e:
+            print(f"Answer cache fingerprint check failed: {str(e)}")
+            return False
+
+    def _lookup_faq(self, embedding: List[float]) -> Optional[str]:
+        """Answer from the job's precomputed FAQ when the question matches one strongly (None on any failure)."""
+        try:
+            faq = vector_search.search_faq(self.job_id, embedding)
+        except Exception as e:
+            print(f"FAQ lookup failed: {str(e)}")
+            return None
+        return faq["answer"] if faq else None
+
+    async def _alookup_faq(self, embedding: List[float]) -> Optional[str]:
+        """Async counterpart of _lookup_faq."""
+        try:
+            faq = await async_vector_search.search_faq(self.job_id, embedding)
+        except Exception as e:
+            print(f"FAQ lookup failed: {str(e)}")
+            return None
+        return faq["answer"] if faq else None
+
+    def retrieve(self, state: State) -> Dict[str, Any]:
+        """
+        Graph node: search the job's knowledge base with the extracted context (or reuse a confident
+        speculative search). A question already answered for this job reuses the cached answer, and a
+        question matching the job's precomputed FAQ uses the FAQ answer, instead.
+        """
+        speculative_results = state.get("speculative_results")
+        if self._is_salutation(state):
+            vector_search.discard_speculation(speculative_results)
+            return {"search_results": None}
+
+        embedding = None
+        if config.ANSWER_CACHE_ENABLED or config.FAQ_ENABLED:
+            embedding = vector_search.embed_text(state["email_context"])
+
+        if config.ANSWER_CACHE_ENABLED and self._refresh_cache_fingerprint(state["job"]):
+            cached_answer = answer_cache.lookup(self.job_id, embedding)
+            if cached_answer:
+                vector_search.discard_speculation(speculative_results)
+                return {"search_results": None, "cached_answer": cached_answer}
+
+        if config.FAQ_ENABLED:
+            faq_answer = self._lookup_faq(embedding)
+            if faq_answer:
+                vector_search.discard_speculation(speculative_results)
+                return {"search_results": None, "faq_answer": faq_answer}
+
+        search_results = vector_search.resolve_speculation(self.job_id, speculative_results, state["email_context"], embedding=embedding)
+        return {"search_results": search_results, "question_embedding": embedding}
+
+    async def aretrieve(self, state: State) -> Dict[str, Any]:
+        """Async counterpart of retrieve."""
+        speculative_results = state.get("speculative_results")
+        if self._is_salutation(state):
+            async_vector_search.discard_speculation(speculative_results)
+            return {"search_results": None}
+
+        embedding = None
+        if config.ANSWER_CACHE_ENABLED or config.FAQ_ENABLED:
+            embedding = await async_vector_search.embed_text(state["email_context"])
+
+        if config.ANSWER_CACHE_ENABLED and await self._arefresh_cache_fingerprint(state["job"]):
+            cached_answer = answer_cache.lookup(self.job_id, embedding)
+            if cached_answer:
+                async_vector_search.discard_speculation(speculative_results)
+                return {"search_results": None, "cached_answer": cached_answer}
+
+        if config.FAQ_ENABLED:
+            faq_answer = await self._alookup_faq(embedding)
+            if faq_answer:
+                async_vector_search.discard_speculation(speculative_results)
+                return {"search_results": None, "faq_answer": faq_answer}
+
+        search_results = await async_vector_search.resolve_speculation(self.job_id, speculative_results, state["email_context"], embedding=embedding)
+        return {"search_results": search_results, "question_embedding": embedding}
+
+    def _generate_without_llm(self, state: State) -> Optional[Dict[str, Any]]:
+        """
+        The responses of generate that need no LLM call: the greeting reply, a cached or FAQ answer, or the
+        off-topic response plus a notification for the user when nothing relevant was found.
+        """
+        if self._is_salutation(state):
+            return {"email_response": state["email_context"], "messages": [{"role": "assistant"}]}
+        if state.get("cached_answer") or state.get("faq_answer"):
+            return {"email_response": state.get("cached_answer") or state["faq_answer"], "messages": [{"role": "assistant"}]}
+        if not state["search_results"]["has_relevant_matches"]:
+            return {
+                "email_response": OFF_TOPIC_RESPONSE,
+                "notification": self._off_topic_notification(state["member"], state["job"]),
+                "messages": [{"role": "assistant"}]
+            }
+        return None
+
+    def _reply_prompt(self, state: State) -> Tuple[Any, bool]:
+        """
+        The reply prompt of generate, and whether its answer may be cached for other members.
+
+        A cached answer is sent to other members of the job, so with ANSWER_CACHE_ENABLED the
+        prompt leaves out the member's conversation history (it is only used for tone) and the
+        answer depends on the knowledge base context & the question alone.
+        """
+        cacheable = config.ANSWER_CACHE_ENABLED
+        full_prompt = REPLY_PROMPT.invoke({
+            "context": state["search_results"]["context"],
+            "email_context": state["email_context"],
+            "email_history": "" if cacheable else state["email_history"]
+        })
+        return full_prompt, cacheable
+
+    def generate(self, state: State) -> Dict[str, Any]:
+        """Graph node: second LLM call, write the reply body from the retrieved context."""
+        update = self._generate_without_llm(state)
+        if update:
+            return update
+
+        #context is the result of the similarity search against the knowledge base
+        print("context packing: ", state["search_results"].get("packing"))
+        full_prompt, cacheable = self._reply_prompt(state)
+        print("full_prompt: ", full_prompt)
+        result = self._invoke_llm("generate", full_prompt.text)
+        print("got here in generate, finished create message")
+        if cacheable:
+            answer_cache.store(self.job_id, state.get("question_embedding"), result.content)
+        return {"email_response": result.content, "messages": [{"role": "assistant"}]}
+
+    async def agenerate(self, state: State) -> Dict[str, Any]:
+        """Async counterpart of generate."""
+        update = self._generate_without_llm(state)
+        if update:
+            return update
+
+        full_prompt, cacheable = self._reply_prompt(state)
+        result = await self._ainvoke_llm("generate", full_prompt.text)
+        if cacheable:
+            answer_cache.store(self.job_id, state.get("question_embedding"), result.content)
+        return {"email_response": result.content, "messages": [{"role": "assistant"}]}
+
+    def _after_generate(self, state: State) -> List[str]:
+        """Fan out to the notification path alongside the reply when there is something to notify."""
+        if state.get("notification"):
+            return ["reply_thread", "notify"]
+        return ["reply_thread"]
+
+    def notify(self, state: State) -> Dict[str, Any]:
+        """
+        Graph node: queue the user notification, sent with the run's other notifications
+        as one digest when the run ends (see src/notifications.py), so it never delays the reply.
+        """
+        notifier.add(self.job_id, state["notification"], to=state["job"].get("Job_email"))
+        return {"messages": [{"content": "User notification queued", "role": "assistant"}]}
+
+    async def anotify(self, state: State) -> Dict[str, Any]:
+        """Async counterpart of notify."""
+        return self.notify(state)
+
+    def flush_notifications(self) -> None:
+        """Send the run's queued user notifications, logging (not raising) failures."""
+        try:
+            notifier.flush()
+        except Exception as e:
+            print(f"User notifications failed: {str(e)}")
+
+    def _build_reply_params(self, member: Dict[str, Any], email_response: str) -> Dict[str, Any]:
+        """Wrap the generated response in the reply template & threading details of the member."""
+        plain_message = f"""Hi {member['name_email']['name'] or member['name_email']['email']}, \n\n 
+        {email_response} \n\n 
+        This message was sent with Converse-Aid. Reply to this message to continue conversation.</h6>""" #here i will figure out how to add footers.
+        
+        html_message = f"""
+        Hi {member['name_email']['name'] or member['name_email']['email']},\n
+        <p>{email_response}</p>\n
+        <p style='text-align: center; font-size: 11px;'>This message was sent with <a href='www.google.com'>Converse-Aid</a>. Reply to this message to continue conversation.</p>""" #here i will figure out how to add footers.
+
+        return {
+            "to": member["name_email"]["email"],
+            "plain_body": plain_message,
+            "html_body": html_message,
+            "thread_id": member["thread_id"],
+            "subject": f"Re: {member['subject']}" if not member['subject'].startswith("Re:") else member['subject'],
+            "message_id": member["message_id"],
+            "references": member["reference_id"]
+        }
+
     def reply_thread(self, state: State) -> Dict[str, Any]:
         """
-        Tool function: Reply to an email thread.
+        Graph node: Reply to an email thread (the join of the graph).
             
         return:
             The updated state informing the llm that the reply has been sent on success or failed to send on failure.
         """
         try:
-            # Get member details
-            member = db.get_member_details(self.member_id)
+            # member details were loaded at the start of this run of the graph
+            member = state["member"]
+            member_id = state["member_id"]
 
-            #get email response kept in state gotten from create_message & create new message
-            plain_message = f"""Hi {member['name_email']['name'] or member['name_email']['email']}, \n\n 
-            {state['email_response']} \n\n 
-            This message was sent with Converse-Aid. Reply to this message to continue conversation.</h6>""" #here i will figure out how to add footers.
-            
-            html_message = f"""
-            Hi {member['name_email']['name'] or member['name_email']['email']},\n
-            <p>{state['email_response']}</p>\n
-            <p style='text-align: center; font-size: 11px;'>This message was sent with <a href='www.google.com'>Converse-Aid</a>. Reply to this message to continue conversation.</p>""" #here i will figure out how to add footers.
-
-            # Prepare reply parameters
-            reply_params = {
-                "to": member["name_email"]["email"],
-                "plain_body": plain_message,
-                "html_body": html_message,
-                "thread_id": member["thread_id"],
-                "subject": f"Re: {member['subject']}" if not member['subject'].startswith("Re:") else member['subject'],
-                "message_id": member["message_id"],
-                "references": member["reference_id"]
-            }
+            # Prepare reply parameters from the email response kept in state (gotten from generate)
+            reply_params = self._build_reply_params(member, state['email_response'])
+
+            # Record the reply before sending it, so a crash after the send can't cause a second one
+            outbox = self._record_outbox(state, reply_params)
+            if outbox:
+                reply_params = outbox["reply_params"]
             
             # Send the reply
-            response = email_service.send_reply(self.job_id, self.member_id, reply_params)
+            response = email_service.send_reply(self.job_id, member_id, reply_params)
             print("response from send_reply: ", response)
             
             if response: 
-                #update member details with the new message_id, thread_id and overall_message_id of the just sent email
-                message_data = email_service.get_message(self.job_id, response.get("id"))
-                # print("message_data from recently sent message: ", message_data)
-
-                db.update_member_details(self.member_id, {
-                    "message_id": message_data.get("message_id")
-                })
+                #update member details with the new message_id of the just sent email
+                self._finish_reply(member_id, response.get("id"), state['email_response'], outbox)
 
                 return {
-                    "messages": state.get("messages", []) + [{
+                    "messages": [{
                         "content": "Message reply sent successfully",
                         "role": "assistant"
                     }]
                 }
             else:
                 return {
-                    "messages": state.get("messages", []) + [{
+                    "messages": [{
                         "content": "Message reply failed",
                         "role": "assistant"
                     }]}
@@ -255,43 +590,219 @@ class EmailAutomationApp:
         except Exception as e:
             raise
         
-    def setup_graph(self) -> None:
-        """Set up the LangGraph for message processing."""
-        try:
-            # Initialize LLM
-            llm = ChatCohere(
-                model=os.environ.get("LLM_MODEL"), 
-                temperature=os.environ.get("LLM_TEMPERATURE"), 
-                # max_tokens=os.environ.get("LLM_MAX_TOKENS"), 
-                max_retries=3
-            )
+    async def areply_thread(self, state: State) -> Dict[str, Any]:
+        """
+        Async counterpart of reply_thread.
             
+        return:
+            The updated state informing the llm that the reply has been sent on success or failed to send on failure.
+        """
+        member_id = state["member_id"]
+        reply_params = self._build_reply_params(state["member"], state['email_response'])
 
-            # Build graph
-            graph_builder = StateGraph(State)
+        outbox = await self._arecord_outbox(state, reply_params)
+        if outbox:
+            reply_params = outbox["reply_params"]
+
+        response = await async_email_service.send_reply(self.job_id, member_id, reply_params)
+        if not response:
+            return {
+                "messages": [{
+                    "content": "Message reply failed",
+                    "role": "assistant"
+                }]}
+
+        await self._afinish_reply(member_id, response.get("id"), state['email_response'], outbox)
+        return {
+            "messages": [{
+                "content": "Message reply sent successfully",
+                "role": "assistant"
+            }]
+        }
+        
+    # Reply outbox
+    # --------------------------------------------------------------
+    # With OUTBOX_ENABLED a reply is recorded in reply_outbox (keyed by
+    # member & inbound Message-Id, with our own Message-ID header)
+    # before it is sent, and done once the member row points at it.
+    # check_for_new_emails reports an unfinished reply and the member
+    # is resumed from the stored reply instead of running the graph.
+    # --------------------------------------------------------------
+    def _outbox_item(self, state: State, reply_params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Outbox row of a reply about to be sent, or None when the outbox is off."""
+        inbound_message_id = state.get("inbound_message_id")
+        if not config.OUTBOX_ENABLED or not inbound_message_id:
+            return None
+        reply_params = {
+            **reply_params,
+            "outbound_message_id": email_service.new_message_id((state.get("job") or {}).get("Job_email"))
+        }
+        return {
+            "idempotency_key": db.outbox_key(state["member_id"], inbound_message_id),
+            "job_id": self.job_id,
+            "member_id": state["member_id"],
+            "inbound_message_id": inbound_message_id,
+            "outbound_message_id": reply_params["outbound_message_id"],
+            "reply_params": reply_params,
+            "email_response": state["email_response"]
+        }
+
+    def _record_outbox(self, state: State, reply_params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Record the reply before it is sent.
+        
+        return:
+            The stored outbox row (an earlier one for the same inbound message wins, so a resend
+            reuses its Message-ID), or None when the outbox is off
+        """
+        item = self._outbox_item(state, reply_params)
+        return db.record_outbox_reply(item) if item else None
+
+    async def _arecord_outbox(self, state: State, reply_params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Async counterpart of _record_outbox."""
+        item = self._outbox_item(state, reply_params)
+        return await async_db.record_outbox_reply(item) if item else None
+
+    def _finish_reply(self, member_id: str, gmail_id: str, email_response: str,
+                      outbox: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Point the member at a sent reply and close its outbox row.
+        
+        return:
+            The Message-ID of the sent reply (the member's new message_id)
+        """
+        if outbox:
+            db.mark_outbox_reply(outbox["idempotency_key"], "sent", gmail_id)
+        message_data = email_service.get_message(self.job_id, gmail_id)
+        db.update_member_details(member_id, {
+            "message_id": message_data.get("message_id"),
+            **self._activity_stamp()
+        })
+        self._store_outbound(member_id, gmail_id, email_response, message_data.get("message_id"))
+        if outbox:
+            db.mark_outbox_reply(outbox["idempotency_key"], "done")
+        return message_data.get("message_id")
+
+    async def _afinish_reply(self, member_id: str, gmail_id: str, email_response: str,
+                             outbox: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Async counterpart of _finish_reply."""
+        if outbox:
+            await async_db.mark_outbox_reply(outbox["idempotency_key"], "sent", gmail_id)
+        message_data = await async_email_service.get_message(self.job_id, gmail_id)
+        await async_db.update_member_details(member_id, {
+            "message_id": message_data.get("message_id"),
+            **self._activity_stamp()
+        })
+        await self._astore_outbound(member_id, gmail_id, email_response, message_data.get("message_id"))
+        if outbox:
+            await async_db.mark_outbox_reply(outbox["idempotency_key"], "done")
+        return message_data.get("message_id")
 
+    def resume_outbox(self, member: Dict[str, Any], email_result: Dict[str, Any]) -> Optional[str]:
+        """
+        Finish a reply an earlier run recorded but did not finish, without running the graph.
+        
+        Args:
+            member: The member row (its message_id is updated when the reply is finished)
+            email_result: check_for_new_emails result with status "outbox_pending"
+            
+        return:
+            What was done, or None when the member has a newer message to handle as usual
+        """
+        outbox = email_result["outbox"]
+        sent = email_result["sent_message"]
+        latest = email_result["email_data"]
+
+        if sent:
+            # sent, but the run died before the member row was updated
+            member["message_id"] = self._finish_reply(member['id'], sent["id"], outbox["email_response"], outbox)
+            return "Finished a reply sent by an earlier run" if sent["id"] == latest["id"] else None
+
+        if outbox["inbound_message_id"] == latest.get("message_id"):
+            # never sent: send the stored reply, no new llm calls
+            response = email_service.send_reply(self.job_id, member['id'], outbox["reply_params"])
+            if not response:
+                raise ConnectionError("Sending the reply recorded by an earlier run failed")
+            member["message_id"] = self._finish_reply(member['id'], response.get("id"), outbox["email_response"], outbox)
+            return "Sent the reply recorded by an earlier run"
+
+        # never sent and the member wrote again, the new reply answers both
+        db.mark_outbox_reply(outbox["idempotency_key"], "superseded")
+        return None
+
+    async def aresume_outbox(self, member: Dict[str, Any], email_result: Dict[str, Any]) -> Optional[str]:
+        """Async counterpart of resume_outbox."""
+        outbox = email_result["outbox"]
+        sent = email_result["sent_message"]
+        latest = email_result["email_data"]
 
-            graph_builder.add_node("create_message", self.create_message)
-            graph_builder.add_node("reply_thread", self.reply_thread)
+        if sent:
+            member["message_id"] = await self._afinish_reply(member['id'], sent["id"], outbox["email_response"], outbox)
+            return "Finished a reply sent by an earlier run" if sent["id"] == latest["id"] else None
 
+        if outbox["inbound_message_id"] == latest.get("message_id"):
+            response = await async_email_service.send_reply(self.job_id, member['id'], outbox["reply_params"])
+            if not response:
+                raise ConnectionError("Sending the reply recorded by an earlier run failed")
+            member["message_id"] = await self._afinish_reply(member['id'], response.get("id"), outbox["email_response"], outbox)
+            return "Sent the reply recorded by an earlier run"
 
-            # graph_builder.add_edge(START, "chatbot")
-            graph_builder.add_edge(START, "create_message")
-            graph_builder.add_edge("create_message", "reply_thread")
+        await async_db.mark_outbox_reply(outbox["idempotency_key"], "superseded")
+        return None
+
+    def setup_graph(self, checkpointer: Any = None) -> None:
+        """
+        Set up the LangGraph for message processing.
+        
+        Args:
+            checkpointer: Saver the graph checkpoints every step to, so a failed run can be resumed
+        """
+        try:
+            # Build graph
+            graph_builder = StateGraph(State)
+
+            # each node has a sync & async implementation so the same graph serves invoke() & ainvoke()
+            nodes = {
+                "load_member": (self.load_member, self.aload_member),
+                "load_job": (self.load_job, self.aload_job),
+                "extract_context": (self.extract_context, self.aextract_context),
+                "speculate": (self.speculate, self.aspeculate),
+                "retrieve": (self.retrieve, self.aretrieve),
+                "generate": (self.generate, self.agenerate),
+                "notify": (self.notify, self.anotify),
+                "reply_thread": (self.reply_thread, self.areply_thread),
+            }
+            for name, (func, afunc) in nodes.items():
+                graph_builder.add_node(name, RunnableLambda(func, afunc=afunc))
+
+            # member & job are fetched in parallel (same step), the job is only needed by retrieve
+            graph_builder.add_edge(START, "load_member")
+            graph_builder.add_edge(START, "load_job")
+            graph_builder.add_edge("load_member", "extract_context")
+            # the speculative search on the raw message overlaps the first llm call
+            graph_builder.add_edge("load_member", "speculate")
+            # join: retrieval waits for the extracted context, the job & the speculative search
+            graph_builder.add_edge(["extract_context", "load_job", "speculate"], "retrieve")
+            graph_builder.add_edge("retrieve", "generate")
+            # the notification is a side branch next to the reply, never in front of it
+            graph_builder.add_conditional_edges("generate", self._after_generate, ["reply_thread", "notify"])
             graph_builder.add_edge("reply_thread", END)
+            graph_builder.add_edge("notify", END)
 
             # Compile the graph
-            self.graph = graph_builder.compile()
+            self.checkpointer = checkpointer
+            self.graph = graph_builder.compile(checkpointer=checkpointer)
             
         except Exception as e:
             raise
 
-    def stream_graph_updates(self, user_input: str) -> None:
+    def stream_graph_updates(self, user_input: str, inbound_message_id: Optional[str] = None) -> None:
         """
         Process a user input through the graph.
         
         Args:
             user_input: Input message to process
+            inbound_message_id: Message-Id of the member's message being answered
         """
         try:
             if not self.graph:
@@ -299,14 +810,32 @@ class EmailAutomationApp:
                  
             # Initialize state with the user message
             initial_state = {
+                "member_id": self.member_id,
+                "inbound_message_id": inbound_message_id,
                 "email_body_prompt": "",
                 "messages": [{"role": "user", "content": user_input}]
             }
             
 
+            # resume a run for the same message that failed part way from its last completed node
+            run_config = None
+            if self.checkpointer and inbound_message_id:
+                thread_id = graph_checkpoints.thread_id(self.job_id, self.member_id, inbound_message_id)
+                run_config = graph_checkpoints.run_config(thread_id)
+                resume = bool(self.graph.get_state(run_config).next)
+                graph_checkpoints.clear(self.job_id, self.member_id, keep=thread_id if resume else None)
+                if resume:
+                    print("resuming graph from checkpoint: ", thread_id)
+                    initial_state = None
+
             event = self.graph.invoke(
                 initial_state,
+                run_config
             )
+
+            # the reply went out, its checkpoints are no longer needed
+            if run_config:
+                graph_checkpoints.clear(self.job_id, self.member_id)
             if "messages" in event and event["messages"]:
                 for message in event["messages"]:
                     if hasattr(message, "pretty_print"):
@@ -317,24 +846,119 @@ class EmailAutomationApp:
         except Exception as e:
             raise
     
+    def process_member(self, member: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Check one member's thread and reply or send the initial message.
+        
+        Args:
+            member: Member row with id, name_email, thread_id & message_id (the body is loaded
+                    by the graph only when there is a new message)
+            
+        return:
+            The member's result entry
+        """
+        try:
+            # Set current member for tools to use
+            self.member_id = member['id']
+            
+            # Reset graph for each member
+            self.setup_graph(graph_checkpoints.saver() if config.CHECKPOINT_ENABLED else None)
+            
+
+            # Check for new emails from this member
+            email_result = email_service.check_for_new_emails(
+                job_id=self.job_id,
+                member_id=member['id'],
+                member_email=member['name_email']['email'],
+                member=member
+            )
+
+            # Finish a reply an earlier run recorded but did not finish
+            if email_result["status"] == "outbox_pending":
+                resumed = self.resume_outbox(member, email_result)
+                if resumed:
+                    return {
+                        "member_id": member['id'],
+                        "email": member['name_email']['email'],
+                        "status": "success",
+                        "message": resumed
+                    }
+                # the member wrote again since, handle the new message as usual
+                email_result = email_service.check_for_new_emails(
+                    job_id=self.job_id,
+                    member_id=member['id'],
+                    member_email=member['name_email']['email'],
+                    member=member
+                )
+
+            # Check if the member has not received an initial message from the user/agent
+            if email_result["status"] == "no initial message":
+                print("no initial message, sending initial message")
+
+                # Directly call the start_message function to send the default initial message
+                start_message_result = self.start_message()
+                # print("start_message_result: ", start_message_result)
+
+                return {
+                    "member_id": member['id'],
+                    "email": member['name_email']['email'],
+                    "status": "success",
+                    "message": "Sent the default initial message"
+                        }
+            
+            elif email_result["status"] == "new_message":
+                # Generate a response and Send the reply
+                user_input = "User: Please perform these steps in order: 1. Create one message 2. Send one reply 3. END"
+                self.stream_graph_updates(user_input, (email_result.get("email_data") or {}).get("message_id"))
+
+                return {
+                    "member_id": member['id'],
+                    "email": member['name_email']['email'],
+                    "status": "success",
+                    "message": "Found new email and sent response",
+                    "email_data": email_result.get("email_data")
+                        }
+            else:
+                return {
+                    "member_id": member['id'],
+                    "email": member['name_email']['email'],
+                    "status": "no_action",
+                    "message": email_result.get("message", "No new message, so no action taken")
+                }
+                
+        except Exception as e:
+            # Continue with next member even if one fails
+            return {
+                "member_id": member['id'],
+                "email": member['name_email']['email'],
+                "status": "error",
+                "message": f"Error processing member: {str(e)}"
+            }
+
     def run(self) -> Dict[str, Any]:
         """
         Run the email automation workflow for all members of a job.
         
         This method:
         1. Validates auth tokens
-        2. Gets all members for the job
+        2. Streams the job's members page by page
         3. Processes each member's email thread
         
         return:
             Dict with status and results information
         """
+        self.budget = RunBudget(self.deadline_seconds)
         try:
             # The first step will be to check if the job_id exists in the db, if it does not, return a message saying the job does not exist & delete the schedule
+            # a job found closed/unsubscribed by a recent run is not read again until the entry expires
+            cached = self._cached_dead_job()
+            if cached:
+                return cached
             job = db.get_job_details(self.job_id)
             #I am not combining the similar logic of util.delete_scheduler below because if job is not found, user will still try to check first & that will result in error
 
             if not job or job["status"].lower() == "closed":
+                self._remember_dead_job("closed" if job else "missing")
                 util.delete_schedule(self.job_id)
                 return {
                     "status": "Job Agent deleted",
@@ -345,6 +969,7 @@ class EmailAutomationApp:
             is_subscribed = db.is_subscribed(user_id)
 
             if not is_subscribed:
+                self._remember_dead_job("unsubscribed")
                 util.delete_schedule(self.job_id)
                 return {
                     "status": "Job Agent deleted",
@@ -353,104 +978,410 @@ class EmailAutomationApp:
             # Validate authentication tokens
             auth_service.validate_token(self.job_id)
             
-            # Get all members for this job
-            members = db.get_job_members(self.job_id)
+            # Make sure no other run/replica handles the same members
+            if not self._claim_leases():
+                return self._leased_elsewhere()
+            
+            # Stream the job's members page by page, only the columns change detection needs,
+            # and each member's outcome to the sink as soon as it is known
+            sink = self.sink or ResultSink(keep_results=True)
+            for page in self._member_pages():
+                print("members page", len(page))
+                for member in page:
+                    if self._leased_to_other(member):
+                        continue
+                    # stop cleanly before the deadline, the rest is carried over to the next run
+                    if self.budget.exhausted():
+                        break
+                    self._scan_after = member['id']
+                    start = time.perf_counter()
+                    sink.write(self.job_id, self.process_member(member))
+                    self.budget.record(time.perf_counter() - start)
+                if self.budget.halted:
+                    break
+            self._settle_deferred()
             
-            if not members:
+            if not sink.total and not self.budget.deferred:
                 return {
                     "status": "no_action",
                     "message": "No members found for this job"
                 }
-            print("members count", len(members))
-            results = []
-            for member in members:
-                try:
-                    # Set current member for tools to use
-                    self.member_id = member['id']
-                    
-                    # Reset graph for each member
-                    self.setup_graph()
-                    
+            
+            return self._run_result(sink, vector_search)
+            
+        except Exception as e: 
+            return {
+                "status": "error",
+                "message": f"Error: {str(e)}"
+            }
+        finally:
+            self._release_leases()
+            # one digest per job, also for runs that stopped on an error (e.g. an expired token)
+            self.flush_notifications()
+
+    def _cached_dead_job(self) -> Optional[Dict[str, Any]]:
+        """The run's result when the negative cache knows the job is closed/unsubscribed, else None."""
+        key = job_key(self.job_id)
+        if not negative_cache.contains(key):
+            return None
+        try:
+            state = db.get_job_state(self.job_id)
+        except Exception as e:
+            print(f"Could not read the state of job {self.job_id}, reading the job instead: {str(e)}")
+            return None
+        return self._dead_job_result(negative_cache.get(key, job_state_fingerprint(state)))
 
-                    # Check for new emails from this member
-                    email_result = email_service.check_for_new_emails(
+    async def _acached_dead_job(self) -> Optional[Dict[str, Any]]:
+        """Async counterpart of _cached_dead_job."""
+        key = job_key(self.job_id)
+        if not negative_cache.contains(key):
+            return None
+        try:
+            state = await async_db.get_job_state(self.job_id)
+        except Exception as e:
+            print(f"Could not read the state of job {self.job_id}, reading the job instead: {str(e)}")
+            return None
+        return self._dead_job_result(negative_cache.get(key, job_state_fingerprint(state)))
+
+    def _dead_job_result(self, reason: Optional[str]) -> Optional[Dict[str, Any]]:
+        """The run's result for a job the negative cache still holds as dead (reason), else None."""
+        if not reason:
+            return None
+        return {
+            "status": "Job Agent deleted",
+            "message": f"Job was found {reason} within the last {config.NEGATIVE_CACHE_JOB_TTL} seconds and its Job Agent schedule deleted then, skipped without reading it again."
+        }
+
+    def _remember_dead_job(self, reason: str) -> None:
+        """
+        Put a closed/missing/unsubscribed job in the negative cache, with the fingerprint of its
+        state (status + subscription), so a job reopened or resubscribed since is read again.
+        """
+        try:
+            state = db.get_job_state(self.job_id)
+        except Exception as e:
+            print(f"Could not read the state of job {self.job_id}, not caching it: {str(e)}")
+            return
+        negative_cache.put(job_key(self.job_id), reason, config.NEGATIVE_CACHE_JOB_TTL, job_state_fingerprint(state))
+
+    async def _aremember_dead_job(self, reason: str) -> None:
+        """Async counterpart of _remember_dead_job."""
+        try:
+            state = await async_db.get_job_state(self.job_id)
+        except Exception as e:
+            print(f"Could not read the state of job {self.job_id}, not caching it: {str(e)}")
+            return
+        negative_cache.put(job_key(self.job_id), reason, config.NEGATIVE_CACHE_JOB_TTL, job_state_fingerprint(state))
+
+    # Leases
+    # --------------------------------------------------------------
+    # With LEASES_ENABLED a run first claims the job's member partitions
+    # (src/leases.py) and only handles members of partitions it holds,
+    # so an overrunning run and the next scheduled one, or several
+    # replicas, never reply to the same message twice.
+    # --------------------------------------------------------------
+    def _claim_leases(self) -> bool:
+        """Claim the run's share of the job's partitions. False when leasing is on and none could be claimed."""
+        if not config.LEASES_ENABLED:
+            return True
+        self.leases = JobLeases(self.job_id)
+        return bool(self.leases.claim())
+
+    def _leased_to_other(self, member: Dict[str, Any]) -> bool:
+        """Whether the member belongs to a partition this run does not (or no longer) hold."""
+        return bool(self.leases) and not self.leases.holds(member['id'])
+
+    def _leased_elsewhere(self) -> Dict[str, Any]:
+        """Result of a run that found every partition of the job held by other agents."""
+        return {
+            "status": "no_action",
+            "message": "Job is being processed by another agent run"
+        }
+
+    def _release_leases(self) -> None:
+        """Give the run's leases back."""
+        if self.leases:
+            self.leases.release()
+            self.leases = None
+
+    # Run budget
+    # --------------------------------------------------------------
+    # With a deadline (RUN_DEADLINE_SECONDS / --deadline, see
+    # src/budget.py) members are read tier by tier, most likely to have
+    # new activity first, no member is started once the next one would
+    # not fit, and the members not reached are marked deferred so they
+    # come before idle members on the next tick.
+    # --------------------------------------------------------------
+    def _activity_stamp(self) -> Dict[str, Any]:
+        """Member update marking activity (what the active tier is read by), when the run has a budget."""
+        return {"last_activity_at": utc_timestamp()} if self.budget.enabled else {}
+
+    def _member_tiers(self) -> tuple:
+        """Tiers to read the members in (one untiered pass without a budget)."""
+        return MEMBER_TIERS if self.budget.enabled else (None,)
+
+    def _member_pages(self):
+        """The job's member pages, tier after tier, tracking the tier being read."""
+        for tier in self._member_tiers():
+            self._scan_tier, self._scan_after = tier, None
+            yield from db.iter_job_member_pages(self.job_id, tier=tier, active_since=self.budget.active_since)
+
+    async def _amember_pages(self):
+        """Async counterpart of _member_pages."""
+        for tier in self._member_tiers():
+            self._scan_tier, self._scan_after = tier, None
+            async for page in async_db.iter_job_member_pages(self.job_id, tier=tier, active_since=self.budget.active_since):
+                yield page
+
+    def _settle_deferred(self) -> None:
+        """
+        After the member loop: mark the members a halted run did not reach as deferred and clear
+        the mark of the carried over members it processed. A failure only costs the ordering of
+        the next run, so it is logged, not raised.
+        """
+        if not self.budget.enabled:
+            return
+        try:
+            job_id, active_since = self.job_id, self.budget.active_since
+            stopped = MEMBER_TIERS.index(self._scan_tier) if self.budget.halted else len(MEMBER_TIERS)
+            deferred = db.defer_members(job_id, None, active_since, member_ids=self._skipped_ids)
+            if self.budget.halted:
+                # the rest of the tier it stopped in & every later tier
+                deferred += db.defer_members(job_id, self._scan_tier, active_since, after_id=self._scan_after)
+                for tier in MEMBER_TIERS[stopped + 1:]:
+                    deferred += db.defer_members(job_id, tier, active_since)
+            self.budget.deferred = deferred
+
+            deferred_tier = MEMBER_TIERS.index("deferred")
+            if stopped > deferred_tier:
+                db.clear_deferred(job_id, active_since, self.budget.started_at)
+            elif stopped == deferred_tier and self._scan_after:
+                db.clear_deferred(job_id, active_since, self.budget.started_at, up_to_id=self._scan_after)
+            if deferred:
+                print(f"Deadline reached, {deferred} members deferred to the next run")
+        except Exception as e:
+            print(f"Could not record deferred members of job {self.job_id}: {str(e)}")
+        finally:
+            self._skipped_ids = []
+
+    def _run_result(self, sink: ResultSink, search: VectorSearchService) -> Dict[str, Any]:
+        """
+        Final result of a run: the sink's incremental counts plus the run's retrieval stats.
+        detailed_results is only included when the sink kept the results in memory.
+        """
+        if search is async_vector_search:
+            limiters = {"llm": llm_limiter, "gmail": gmail_limiter}
+        else:
+            limiters = {"llm": llm_sync_limiter, "gmail": gmail_sync_limiter}
+        result = {
+            "status": "completed",
+            "summary": {
+                **sink.summary(),
+                "deferred": self.budget.deferred,
+                "budget": self.budget.get_stats() if self.budget.enabled else None,
+                "speculative_retrieval": search.get_speculation_stats(),
+                "answer_cache": answer_cache.get_stats(),
+                "context_packing": search.get_packing_stats(),
+                "embedding": search.get_embedding_stats(),
+                "namespace_stats": search.get_index_cache_stats(),
+                "rerank": reranker.get_stats() if reranker else None,
+                "leases": self.leases.get_stats() if self.leases else None,
+                "concurrency": {name: limiter.get_stats() for name, limiter in limiters.items()},
+                "llm_latency": hedger.get_stats()
+            }
+        }
+        if sink.keep_results:
+            result["detailed_results"] = sink.results
+        return result
+
+    async def ainvoke_graph(self, member_id: str, inbound_message_id: Optional[str]) -> None:
+        """Async counterpart of stream_graph_updates for one member (the member travels in the state)."""
+        state = {
+            "member_id": member_id,
+            "inbound_message_id": inbound_message_id,
+            "messages": [{"role": "user", "content": "User: Please perform these steps in order: 1. Create one message 2. Send one reply 3. END"}]
+        }
+        if not (self.checkpointer and inbound_message_id):
+            await self.graph.ainvoke(state)
+            return
+
+        thread_id = graph_checkpoints.thread_id(self.job_id, member_id, inbound_message_id)
+        run_config = graph_checkpoints.run_config(thread_id)
+        resume = bool((await self.graph.aget_state(run_config)).next)
+        await graph_checkpoints.aclear(self.checkpointer, self.job_id, member_id, keep=thread_id if resume else None)
+        if resume:
+            print("resuming graph from checkpoint: ", thread_id)
+        await self.graph.ainvoke(None if resume else state, run_config)
+        await graph_checkpoints.aclear(self.checkpointer, self.job_id, member_id)
+
+    def _write_done(self, sink: ResultSink, done: set) -> None:
+        """Write the results of finished member tasks (members skipped at the deadline have none)."""
+        for task in done:
+            if task.result() is not None:
+                sink.write(self.job_id, task.result())
+
+    async def aprocess_member(self, member: Dict[str, Any], semaphore: asyncio.Semaphore) -> Optional[Dict[str, Any]]:
+        """
+        Run one member through the async pipeline. At most MAX_CONCURRENT_MEMBERS of these
+        hold the semaphore at a time; the rest wait without blocking the event loop.
+        
+        return:
+            The member's result entry, or None when the run's deadline came first (the member is deferred)
+        """
+        result = {
+            "member_id": member['id'],
+            "email": member['name_email']['email']
+        }
+        async with semaphore:
+            if self._send_limit_reached:
+                return {**result, "status": "no_action", "message": "Daily send limit reached, member skipped"}
+            if self._leased_to_other(member):
+                return {**result, "status": "no_action", "message": "Lease lost, member left to the agent holding it"}
+            if self.budget.exhausted():
+                self._skipped_ids.append(member['id'])
+                return None
+            start = time.perf_counter()
+            try:
+                email_result = await async_email_service.check_for_new_emails(
+                    job_id=self.job_id,
+                    member_id=member['id'],
+                    member_email=member['name_email']['email'],
+                    member=member
+                )
+
+                if email_result["status"] == "outbox_pending":
+                    resumed = await self.aresume_outbox(member, email_result)
+                    if resumed:
+                        return {**result, "status": "success", "message": resumed}
+                    email_result = await async_email_service.check_for_new_emails(
                         job_id=self.job_id,
                         member_id=member['id'],
-                        member_email=member['name_email']['email']
+                        member_email=member['name_email']['email'],
+                        member=member
                     )
 
-                    # Check if the member has not received an initial message from the user/agent
-                    if email_result["status"] == "no initial message":
-                        print("no initial message, sending initial message")
+                if email_result["status"] == "no initial message":
+                    await self.astart_message(member['id'])
+                    return {**result, "status": "success", "message": "Sent the default initial message"}
 
-                        # Directly call the start_message function to send the default initial message
-                        start_message_result = self.start_message()
-                        # print("start_message_result: ", start_message_result)
+                if email_result["status"] == "new_message":
+                    await self.ainvoke_graph(member['id'], (email_result.get("email_data") or {}).get("message_id"))
+                    return {**result, "status": "success", "message": "Found new email and sent response",
+                            "email_data": email_result.get("email_data")}
+
+                return {**result, "status": "no_action",
+                        "message": email_result.get("message", "No new message, so no action taken")}
+
+            except SendLimitExceededError as e:
+                # the user has been notified once, stop the other members of this job from sending
+                self._send_limit_reached = True
+                return {**result, "status": "error", "message": f"Error processing member: {str(e)}"}
+            except Exception as e:
+                return {**result, "status": "error", "message": f"Error processing member: {str(e)}"}
+            finally:
+                self.budget.record(time.perf_counter() - start)
+
+    async def arun(self) -> Dict[str, Any]:
+        """
+        Async variant of run(): same checks and result format, but members are processed
+        concurrently on one event loop (up to config.MAX_CONCURRENT_MEMBERS in flight).
+        
+        return:
+            Dict with status and results information
+        """
+        self.budget = RunBudget(self.deadline_seconds)
+        try:
+            cached = await self._acached_dead_job()
+            if cached:
+                return cached
+            job = await async_db.get_job_details(self.job_id)
+            if not job or job["status"].lower() == "closed":
+                await self._aremember_dead_job("closed" if job else "missing")
+                await asyncio.to_thread(util.delete_schedule, self.job_id)
+                return {
+                    "status": "Job Agent deleted",
+                    "message": "Job does not exist in database or is closed or user is not subscribed. So, Job Agent schedule has also been deleted."
+                }
+
+            user_id = await async_db.get_user_id(self.job_id)
+            if not await async_db.is_subscribed(user_id):
+                await self._aremember_dead_job("unsubscribed")
+                await asyncio.to_thread(util.delete_schedule, self.job_id)
+                return {
+                    "status": "Job Agent deleted",
+                    "message": "user is not subscribed. So, Job Agent schedule has also been deleted."
+                }
+
+            await async_auth_service.validate_token(self.job_id)
+
+            if not await asyncio.to_thread(self._claim_leases):
+                return self._leased_elsewhere()
+
+            # one graph for every member, the member travels in the state
+            self.setup_graph(await graph_checkpoints.aopen() if config.CHECKPOINT_ENABLED else None)
+            self._send_limit_reached = False
+            semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_MEMBERS)
+
+            # members are streamed page by page; reading stays at most a couple of pages
+            # ahead of the pipelines so large jobs never sit in memory at once
+            sink = self.sink or ResultSink(keep_results=True)
+            pending = set()
+            async for page in self._amember_pages():
+                print("members page", len(page))
+                # no more members are scheduled once the deadline is near
+                if self.budget.exhausted():
+                    break
+                for member in page:
+                    if self._leased_to_other(member):
+                        continue
+                    self._scan_after = member['id']
+                    pending.add(asyncio.create_task(self.aprocess_member(member, semaphore)))
+                while len(pending) > 2 * max(config.MAX_CONCURRENT_MEMBERS, config.MEMBER_PAGE_SIZE):
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    self._write_done(sink, done)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                self._write_done(sink, done)
+            await asyncio.to_thread(self._settle_deferred)
+
+            if not sink.total and not self.budget.deferred:
+                return {
+                    "status": "no_action",
+                    "message": "No members found for this job"
+                }
+            return self._run_result(sink, async_vector_search)
 
-                        results.append({
-                            "member_id": member['id'],
-                            "email": member['name_email']['email'],
-                            "status": "success",
-                            "message": "Sent the default initial message"
-                                })
-                    
-                    elif email_result["status"] == "new_message":
-                        # Generate a response and Send the reply
-                        user_input = "User: Please perform these steps in order: 1. Create one message 2. Send one reply 3. END"
-                        self.stream_graph_updates(user_input)
-
-                        results.append({
-                            "member_id": member['id'],
-                            "email": member['name_email']['email'],
-                            "status": "success",
-                            "message": "Found new email and sent response",
-                            "email_data": email_result.get("email_data")
-                                })
-                    else:
-                        results.append({
-                            "member_id": member['id'],
-                            "email": member['name_email']['email'],
-                            "status": "no_action",
-                            "message": email_result.get("message", "No new message, so no action taken")
-                        })
-                        
-                except Exception as e:
-                    results.append({
-                        "member_id": member['id'],
-                        "email": member['name_email']['email'],
-                        "status": "error",
-                        "message": f"Error processing member: {str(e)}"
-                    })
-                    continue  # Continue with next member even if one fails
-            
-            # Summarize results
-            success_count = sum(1 for r in results if r["status"] == "success")
-            error_count = sum(1 for r in results if r["status"] == "error")
-            no_action_count = sum(1 for r in results if r["status"] == "no_action")
-            
-            return {
-                "status": "completed",
-                "summary": {
-                    "total_members": len(members),
-                    "successful_responses": success_count,
-                    "errors": error_count,
-                    "no_action_needed": no_action_count
-                },
-                "detailed_results": results
-            }
-            
         except Exception as e: 
             return {
                 "status": "error",
                 "message": f"Error: {str(e)}"
             }
+        finally:
+            await asyncio.to_thread(self._release_leases)
+            await asyncio.to_thread(self.flush_notifications)
+            if self.checkpointer:
+                await graph_checkpoints.aclose(self.checkpointer)
+                self.checkpointer = None
+            await asyncio.gather(
+                async_email_service.aclose(),
+                async_auth_service.aclose(),
+                async_vector_search.aclose(),
+                return_exceptions=True
+            )
 
-def main(job_id: Optional[str] = None):
+def main(job_id: Optional[str] = None, use_async: bool = False, sink: Optional[ResultSink] = None,
+         deadline_seconds: Optional[float] = None):
     """
     Main entry point for the application.
     
     This function sets up the environment and runs the email automation workflow.
 
+    Args:
+        job_id: The job ID to process
+        use_async: Run the asyncio pipeline (members processed concurrently) instead of the sequential one
+        sink: Stream per-member results here instead of returning them in detailed_results
+        deadline_seconds: Time budget of the run (defaults to RUN_DEADLINE_SECONDS)
+
     return:
         A text saying the message was sent successfully or an error message
     """
@@ -459,8 +1390,11 @@ def main(job_id: Optional[str] = None):
         config.ensure_env_vars()
         
         # Create and run the application
-        app = EmailAutomationApp(job_id)
-        result = app.run()
+        app = EmailAutomationApp(job_id, sink=sink, deadline_seconds=deadline_seconds)
+        if use_async:
+            result = asyncio.run(app.arun())
+        else:
+            result = app.run()
         
         return result
         
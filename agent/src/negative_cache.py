@@ -0,0 +1,156 @@
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+import src.config as config
+
+
+def fingerprint(secret: str) -> str:
+    """Short digest of a secret (a refresh token), so the cache never stores the secret itself."""
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()[:16]
+
+
+def job_key(job_id: str) -> str:
+    """Cache key of a job's closed / unsubscribed state."""
+    return f"job:{job_id}"
+
+
+def job_state_fingerprint(state: Optional[Dict[str, Any]]) -> str:
+    """Fingerprint of a job's state (database.get_job_state): its status & its owner's subscription status."""
+    if not state:
+        return "missing"
+    return fingerprint(f"{(state.get('status') or '').lower()}|{(state.get('subscription_status') or '').lower()}")
+
+
+def credential_key(user_id: str, job_email: str) -> str:
+    """Cache key of a mailbox's dead credentials (shared by every job sending from it)."""
+    return f"credential:{user_id}:{(job_email or '').lower()}"
+
+
+class NegativeCache:
+    """
+    Known-dead states: revoked refresh tokens and closed/unsubscribed jobs.
+
+    Entries live in memory and in a SQLite file (every tick is a new process), each with a
+    TTL, so work for such a job fails in a lookup instead of a token refresh, its retries and
+    the Gmail calls of every member. An entry can carry the fingerprint of the state it was
+    made for (the refresh token, the job's status & subscription): a different fingerprint means
+    the owner reauthorized or the job was reopened / resubscribed, and the entry is dropped on
+    the spot. Callers check contains() first, so the current fingerprint is only read for keys
+    that have an entry.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Initialize with the cache file (opened on first use)."""
+        self.path = path or config.NEGATIVE_CACHE_PATH
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"hits": 0, "stored": 0, "invalidated": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        """The cache file (opened and created on first use, caller holds the lock)."""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._conn.execute(
+                "create table if not exists negative_cache ("
+                "key text primary key, reason text not null, fingerprint text, expires_at real not null)"
+            )
+        return self._conn
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        """An entry from memory, else from the file (caller holds the lock)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            try:
+                row = self._db().execute(
+                    "select reason, fingerprint, expires_at from negative_cache where key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Could not read the negative cache: {str(e)}")
+                row = None
+            if row:
+                entry = {"reason": row[0], "fingerprint": row[1], "expires_at": row[2]}
+                self._entries[key] = entry
+        return entry
+
+    def _delete(self, key: str) -> None:
+        """Drop an entry everywhere (caller holds the lock)."""
+        self._entries.pop(key, None)
+        try:
+            self._db().execute("delete from negative_cache where key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"Could not update the negative cache: {str(e)}")
+
+    def contains(self, key: str) -> bool:
+        """Whether key has an unexpired entry (not counted as a hit, the fingerprint is not checked)."""
+        if not config.NEGATIVE_CACHE_ENABLED:
+            return False
+        with self._lock:
+            entry = self._load(key)
+            return entry is not None and entry["expires_at"] >= time.time()
+
+    def get(self, key: str, current_fingerprint: Optional[str] = None) -> Optional[str]:
+        """
+        Why key is known to be dead, if it is.
+
+        Args:
+            key: Cache key (job_key / credential_key)
+            current_fingerprint: Fingerprint of the state now in the database, for entries that have one
+
+        return:
+            The cached reason, None when nothing (still valid) is cached
+        """
+        if not config.NEGATIVE_CACHE_ENABLED:
+            return None
+        with self._lock:
+            entry = self._load(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] < time.time():
+                self._delete(key)
+                return None
+            if entry["fingerprint"] and current_fingerprint and entry["fingerprint"] != current_fingerprint:
+                self.stats["invalidated"] += 1
+                self._delete(key)
+                return None
+            self.stats["hits"] += 1
+            return entry["reason"]
+
+    def put(self, key: str, reason: str, ttl_seconds: int, entry_fingerprint: Optional[str] = None) -> None:
+        """
+        Remember that key is dead.
+
+        Args:
+            key: Cache key (job_key / credential_key)
+            reason: Why (returned by get)
+            ttl_seconds: Seconds the entry stays valid
+            entry_fingerprint: Fingerprint of the dead state (a new one invalidates the entry)
+        """
+        if not config.NEGATIVE_CACHE_ENABLED:
+            return
+        entry = {"reason": reason, "fingerprint": entry_fingerprint, "expires_at": time.time() + ttl_seconds}
+        with self._lock:
+            self._entries[key] = entry
+            self.stats["stored"] += 1
+            try:
+                self._db().execute(
+                    "insert into negative_cache (key, reason, fingerprint, expires_at) values (?, ?, ?, ?) "
+                    "on conflict (key) do update set reason = excluded.reason, fingerprint = excluded.fingerprint, "
+                    "expires_at = excluded.expires_at",
+                    (key, reason, entry_fingerprint, entry["expires_at"])
+                )
+                self._db().execute("delete from negative_cache where expires_at < ?", (time.time(),))
+            except sqlite3.Error as e:
+                print(f"Could not update the negative cache: {str(e)}")
+
+    def clear(self, key: str) -> None:
+        """Forget key (its state is known to be good again)."""
+        if not config.NEGATIVE_CACHE_ENABLED:
+            return
+        with self._lock:
+            self._delete(key)
+
+# Create a singleton instance
+negative_cache = NegativeCache()
@@ -0,0 +1,211 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Any, List, Optional
+import resend
+from src.utils import retry_with_backoff
+import src.config as config
+
+
+NOTIFICATION_SUBJECT = "Urgent Message from Converse-Aid"
+# Emails Resend accepts per batch call
+RESEND_BATCH_LIMIT = 100
+
+
+def event_key(message: str) -> str:
+    """Dedup key of a notification (identical text = identical event)."""
+    return hashlib.sha256(message.encode("utf-8")).hexdigest()[:32]
+
+
+class NotificationLog:
+    """
+    When each job's notifications were last sent, in a SQLite file, so identical events
+    are deduplicated across runs (every tick is a new process) and not only within one.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Open (and create) the notification log."""
+        self.path = path or config.NOTIFY_LOG_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute(
+            "create table if not exists notifications_sent ("
+            "job_id text not null, event_key text not null, sent_at real not null, "
+            "primary key (job_id, event_key))"
+        )
+
+    def sent_since(self, job_id: str, since: float) -> set:
+        """Event keys of the job sent after since."""
+        with self._lock:
+            rows = self._conn.execute(
+                "select event_key from notifications_sent where job_id = ? and sent_at >= ?", (job_id, since)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def record(self, job_id: str, keys: List[str], sent_at: float, prune_before: float) -> None:
+        """Remember sent events of a job and drop entries older than the dedup window."""
+        with self._lock:
+            self._conn.executemany(
+                "insert into notifications_sent (job_id, event_key, sent_at) values (?, ?, ?) "
+                "on conflict (job_id, event_key) do update set sent_at = excluded.sent_at",
+                [(job_id, key, sent_at) for key in keys]
+            )
+            self._conn.execute("delete from notifications_sent where sent_at < ?", (prune_before,))
+
+
+class Notifier:
+    """
+    Coalesces the notification emails sent to a job's owner.
+
+    Events (off-topic questions, the daily send limit, an expired refresh token) are only
+    collected while a run works; flush() then sends one digest per job, several jobs in one
+    Resend batch call. An event identical to one already collected, or to one sent for the
+    same job within NOTIFY_DEDUP_WINDOW seconds, is counted instead of sent again. Callers
+    pass the recipient from the job they already loaded; only jobs added without one are
+    looked up, once per flush.
+    """
+
+    def __init__(self, log: Optional[NotificationLog] = None):
+        """Initialize with an empty queue (the log is opened on first flush)."""
+        self._log = log
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, Any]] = {}  # job ID -> {"to", "events": {key: event}}
+        self.stats = {"queued": 0, "coalesced": 0, "deduplicated": 0, "sent": 0, "failed": 0}
+
+    @property
+    def log(self) -> NotificationLog:
+        """The notification log (opened on first use)."""
+        if self._log is None:
+            self._log = NotificationLog()
+        return self._log
+
+    def add(self, job_id: str, message: str, to: Optional[str] = None) -> None:
+        """
+        Queue a notification for a job's owner.
+
+        Args:
+            job_id: Job ID
+            message: Notification text
+            to: Owner address (the job's Job_email) when the caller has the job loaded
+        """
+        key = event_key(message)
+        with self._lock:
+            pending = self._pending.setdefault(job_id, {"to": None, "events": {}})
+            pending["to"] = pending["to"] or to
+            event = pending["events"].get(key)
+            if event:
+                event["count"] += 1
+                self.stats["coalesced"] += 1
+                return
+            pending["events"][key] = {"message": message, "count": 1}
+            self.stats["queued"] += 1
+
+    def _take(self, job_id: Optional[str]) -> Dict[str, Dict[str, Any]]:
+        """Remove and return the queued notifications of one job (or of every job)."""
+        with self._lock:
+            if job_id is None:
+                taken, self._pending = self._pending, {}
+            else:
+                taken = {job_id: self._pending.pop(job_id)} if job_id in self._pending else {}
+        return taken
+
+    @staticmethod
+    def render(events: List[Dict[str, Any]]) -> str:
+        """HTML body of a job's digest."""
+        paragraphs = []
+        for event in events:
+            repeated = f" (this happened {event['count']} times)" if event["count"] > 1 else ""
+            paragraphs.append("<p>" + event["message"] + repeated + "</p>")
+        return "<h2>Dear User, </h2>" + "".join(paragraphs)
+
+    @retry_with_backoff()
+    def _send(self, emails: List[Dict[str, Any]]) -> None:
+        """
+        Send digests through Resend, one batch call per RESEND_BATCH_LIMIT emails.
+
+        Raises:
+            ConnectionError: If Resend does not accept the emails
+        """
+        resend.api_key = os.environ.get("RESEND_API_KEY")
+        if len(emails) == 1:
+            response = resend.Emails.send(emails[0])
+            if not response or not response.get("id"):
+                raise ConnectionError(f"Failed to send notification email: {response}")
+            return
+        for start in range(0, len(emails), RESEND_BATCH_LIMIT):
+            response = resend.Batch.send(emails[start:start + RESEND_BATCH_LIMIT])
+            if not response or not response.get("data"):
+                raise ConnectionError(f"Failed to send notification emails: {response}")
+
+    def flush(self, job_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Send the queued notifications, one digest per job.
+
+        Args:
+            job_id: Only flush this job's notifications (default: every job's)
+
+        return:
+            Dict with the notifications sent, deduplicated and failed by this flush
+        """
+        with self._flush_lock:
+            taken = self._take(job_id)
+            if not taken:
+                return {"sent": 0, "deduplicated": 0, "failed": 0}
+
+            now = time.time()
+            window = config.NOTIFY_DEDUP_WINDOW
+            emails, sent_keys, deduplicated = [], {}, 0
+            for job, pending in taken.items():
+                try:
+                    already_sent = self.log.sent_since(job, now - window) if window > 0 else set()
+                except Exception as e:
+                    print(f"Could not read the notification log, sending without dedup: {str(e)}")
+                    already_sent = set()
+                events = {key: event for key, event in pending["events"].items() if key not in already_sent}
+                deduplicated += len(pending["events"]) - len(events)
+                if not events:
+                    continue
+                to = pending["to"]
+                if not to:
+                    try:
+                        from src.database import db
+                        to = (db.get_job_details(job) or {}).get("Job_email")
+                    except Exception as e:
+                        print(f"Could not look up the owner of job {job}: {str(e)}")
+                if not to:
+                    print(f"No owner address for job {job}, notification dropped")
+                    continue
+                emails.append({
+                    "from": os.environ.get("COMPANY_EMAIL"),
+                    "to": [to],
+                    "subject": NOTIFICATION_SUBJECT,
+                    "html": self.render(list(events.values())),
+                })
+                sent_keys[job] = list(events)
+
+            self.stats["deduplicated"] += deduplicated
+            count = sum(len(keys) for keys in sent_keys.values())
+            if not emails:
+                return {"sent": 0, "deduplicated": deduplicated, "failed": 0}
+            try:
+                self._send(emails)
+                print(f"sent {len(emails)} user notification digests")
+            except Exception as e:
+                # dropped, not requeued: the same events come back with the next run
+                print(f"Could not send user notifications: {str(e)}")
+                self.stats["failed"] += count
+                return {"sent": 0, "deduplicated": deduplicated, "failed": count}
+
+            self.stats["sent"] += count
+            try:
+                for job, keys in sent_keys.items():
+                    self.log.record(job, keys, now, now - max(window, 0))
+            except Exception as e:
+                print(f"Could not update the notification log: {str(e)}")
+            return {"sent": count, "deduplicated": deduplicated, "failed": 0}
+
+# Create a singleton instance
+notifier = Notifier()
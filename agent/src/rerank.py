@@ -0,0 +1,201 @@
+import os
+import re
+import math
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Dict, Any, List, Optional
+import src.config as config
+
+
+class Reranker(ABC):
+    """
+    Base class for rerankers.
+
+    Retrieval only has the raw cosine score of each chunk, so top_k has to stay high to avoid
+    missing answers. A reranker scores the (query, chunk) pairs of a wide fetch more precisely,
+    so only the best RERANK_KEEP chunks go into the prompt.
+    Subclasses implement score().
+    """
+
+    name = "base"
+
+    def __init__(self):
+        """Initialize the reranker counters."""
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "candidates": 0, "kept": 0, "seconds": 0.0}
+
+    @abstractmethod
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """
+        Score each text against the query (higher is more relevant).
+
+        Args:
+            query: The search query
+            texts: Candidate chunk texts
+
+        return:
+            One score per text, in order
+        """
+
+    def rerank(self, query: str, candidates: List[Dict[str, Any]], keep: int) -> List[Dict[str, Any]]:
+        """
+        Reorder candidate chunks by relevance and keep the best ones.
+
+        Args:
+            query: The search query
+            candidates: Dicts with id, score (retrieval score) and text
+            keep: Number of candidates to keep
+
+        return:
+            The kept candidates, best first, each with a rerank_score added
+        """
+        if not candidates:
+            return []
+        start = time.perf_counter()
+        scores = self.score(query, [candidate["text"] for candidate in candidates])
+        ranked = sorted(
+            ({**candidate, "rerank_score": score} for candidate, score in zip(candidates, scores)),
+            key=lambda candidate: candidate["rerank_score"],
+            reverse=True
+        )[:keep]
+
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["candidates"] += len(candidates)
+            self.stats["kept"] += len(ranked)
+            self.stats["seconds"] += time.perf_counter() - start
+        return ranked
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Rerank counters for the run.
+
+        return:
+            Dict with reranker, calls, candidates, kept, seconds and avg_ms
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        stats["reranker"] = self.name
+        stats["avg_ms"] = round(1000 * stats["seconds"] / stats["calls"], 1) if stats["calls"] else 0.0
+        stats["seconds"] = round(stats["seconds"], 3)
+        return stats
+
+
+class PineconeReranker(Reranker):
+    """Hosted rerank model through Pinecone inference (same API key as the index)."""
+
+    name = "pinecone"
+
+    def __init__(self, model: Optional[str] = None):
+        """Initialize with the hosted rerank model name."""
+        super().__init__()
+        self.model = model or config.RERANK_MODEL
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """Score texts with the hosted rerank model."""
+        from src.vector_search import vector_search
+        response = vector_search.client.inference.rerank(
+            model=self.model,
+            query=query,
+            documents=[{"id": str(i), "text": text} for i, text in enumerate(texts)],
+            top_n=len(texts),
+            return_documents=False
+        )
+        scores = [0.0] * len(texts)
+        for row in response.data:
+            scores[row.index] = row.score
+        return scores
+
+
+class LexicalReranker(Reranker):
+    """
+    Local BM25 scorer over the candidate set. No model or network call, so it adds well under
+    a millisecond; useful where the hosted reranker is unavailable or too slow.
+    """
+
+    name = "lexical"
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """Initialize with the BM25 parameters."""
+        super().__init__()
+        self.k1 = k1
+        self.b = b
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        """Lowercased word tokens."""
+        return re.findall(r"\w+", text.lower())
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """BM25 score of each text for the query terms, with document frequencies taken from the candidates."""
+        documents = [self._tokens(text) for text in texts]
+        avg_length = sum(len(document) for document in documents) / max(len(documents), 1)
+        document_frequency = Counter(term for document in documents for term in set(document))
+        query_terms = set(self._tokens(query))
+
+        scores = []
+        for document in documents:
+            counts = Counter(document)
+            score = 0.0
+            for term in query_terms:
+                if not counts[term]:
+                    continue
+                idf = math.log(1 + (len(documents) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+                tf = counts[term]
+                score += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * len(document) / max(avg_length, 1)))
+            scores.append(score)
+        return scores
+
+
+class CrossEncoderReranker(Reranker):
+    """
+    Local cross-encoder loaded from RERANK_MODEL_PATH (needs the optional sentence-transformers
+    package). The model is loaded once, on first use.
+    """
+
+    name = "cross-encoder"
+
+    def __init__(self, model_path: Optional[str] = None):
+        """Initialize with the local model path."""
+        super().__init__()
+        self.model_path = model_path or config.RERANK_MODEL_PATH
+        self._model = None
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """Score (query, text) pairs with the cross-encoder."""
+        if self._model is None:
+            try:
+                from sentence_transformers import CrossEncoder
+            except ImportError:
+                raise ValueError("RERANKER=cross-encoder needs the sentence-transformers package")
+            if not self.model_path or not os.path.exists(self.model_path):
+                raise ValueError(f"Cross-encoder model not found at RERANK_MODEL_PATH: {self.model_path}")
+            self._model = CrossEncoder(self.model_path, device="cpu")
+        return [float(score) for score in self._model.predict([(query, text) for text in texts])]
+
+
+RERANKERS = {
+    "pinecone": PineconeReranker,
+    "lexical": LexicalReranker,
+    "cross-encoder": CrossEncoderReranker,
+}
+
+
+def get_reranker(name: Optional[str] = None) -> Optional[Reranker]:
+    """
+    Create the reranker named in RERANKER ("none" disables reranking).
+
+    Raises:
+        ValueError: If the name is unknown
+    """
+    name = (name or config.RERANKER).lower()
+    if name in ("", "none"):
+        return None
+    if name not in RERANKERS:
+        raise ValueError(f"Unknown RERANKER {name}, expected one of: none, {', '.join(RERANKERS)}")
+    return RERANKERS[name]()
+
+# Create the configured instance (None when reranking is off)
+reranker = get_reranker()
@@ -0,0 +1,137 @@
+import sys
+import json
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Optional, TextIO
+import src.config as config
+
+
+# Message content left out of streamed results unless bodies are asked for
+BODY_FIELDS = ("body",)
+
+# The process's stdout once it is reserved for result lines
+_result_stdout: Optional[TextIO] = None
+
+
+def reserve_stdout() -> TextIO:
+    """
+    Reserve stdout for JSON result lines.
+
+    The run logs with print, so from the first call on sys.stdout points at stderr and
+    stdout only carries results (safe to pipe into a JSONL consumer).
+
+    return:
+        The original stdout stream
+    """
+    global _result_stdout
+    if _result_stdout is None:
+        _result_stdout, sys.stdout = sys.stdout, sys.stderr
+    return _result_stdout
+
+
+class ResultSink:
+    """
+    Streams per-member outcomes as they finish instead of collecting them until the end of a run.
+
+    Every result is written as one JSON line (to a file or stdout) and folded into running
+    counters, so the final summary is computed incrementally and memory stays bounded however
+    many members a job has: only the counts and the first RESULT_ERROR_SAMPLES errors are kept.
+    Message bodies are left out unless include_bodies is set. With keep_results the results
+    are also kept in memory for callers that want detailed_results back.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, include_bodies: bool = False,
+                 keep_results: bool = False):
+        """
+        Initialize the sink.
+
+        Args:
+            stream: Text stream the JSON lines are written to (None writes nothing)
+            include_bodies: Keep message bodies in the results
+            keep_results: Also keep every result in memory (returned as detailed_results)
+        """
+        self.stream = stream
+        self.include_bodies = include_bodies
+        self.keep_results = keep_results
+        self.results: List[Dict[str, Any]] = []
+        self.counts = Counter()
+        self.error_samples: List[Dict[str, Any]] = []
+        self._owns_stream = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str, include_bodies: bool = False) -> "ResultSink":
+        """
+        Create a sink writing to a JSONL file (appended to) or to stdout when path is "-"
+        (logs then go to stderr, see reserve_stdout).
+
+        Args:
+            path: File path or "-"
+            include_bodies: Keep message bodies in the results
+        """
+        if path == "-":
+            return cls(reserve_stdout(), include_bodies=include_bodies)
+        sink = cls(open(path, "a", encoding="utf-8"), include_bodies=include_bodies)
+        sink._owns_stream = True
+        return sink
+
+    def _strip_bodies(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of the result without message bodies."""
+        email_data = result.get("email_data")
+        if self.include_bodies or not isinstance(email_data, dict):
+            return result
+        return {
+            **result,
+            "email_data": {key: value for key, value in email_data.items() if key not in BODY_FIELDS}
+        }
+
+    def write(self, job_id: str, result: Dict[str, Any]) -> None:
+        """
+        Emit one member's outcome and count it.
+
+        Args:
+            job_id: Job the member belongs to
+            result: The member's result entry (member_id, email, status, message, ...)
+        """
+        result = self._strip_bodies({"job_id": job_id, **result})
+        with self._lock:
+            self.counts["total"] += 1
+            self.counts[result.get("status", "unknown")] += 1
+            if result.get("status") == "error" and len(self.error_samples) < config.RESULT_ERROR_SAMPLES:
+                self.error_samples.append({
+                    "job_id": job_id,
+                    "member_id": result.get("member_id"),
+                    "message": result.get("message")
+                })
+            if self.keep_results:
+                self.results.append(result)
+            if self.stream:
+                self.stream.write(json.dumps(result, default=str) + "\n")
+                self.stream.flush()
+
+    @property
+    def total(self) -> int:
+        """Number of results written."""
+        return self.counts["total"]
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Counts of the results written so far.
+
+        return:
+            Dict with total_members, successful_responses, errors, no_action_needed and error_samples
+        """
+        with self._lock:
+            return {
+                "total_members": self.counts["total"],
+                "successful_responses": self.counts["success"],
+                "errors": self.counts["error"],
+                "no_action_needed": self.counts["no_action"],
+                "error_samples": list(self.error_samples)
+            }
+
+    def close(self) -> None:
+        """Close the output file (stdout is left open)."""
+        if self._owns_stream and self.stream:
+            self.stream.close()
+            self.stream = None
@@ -1,8 +1,10 @@
 import time
+import asyncio
 from functools import wraps
 import os
 import json
 import requests
+import httpx
 from typing import Callable, Any, Tuple, Type, Union, List
 import src.config as config
 
@@ -46,6 +48,45 @@ def retry_with_backoff(
         return wrapper
     return decorator 
 
+
+# Async counterpart of retry_with_backoff
+# --------------------------------------------------------------
+# Same retry rules, but the delay is an asyncio.sleep so other
+# in-flight coroutines keep running while this one backs off.
+# --------------------------------------------------------------
+def async_retry_with_backoff(
+    max_retries: int = 3, 
+    backoff_factor: int = 2,
+    exceptions: Tuple[Type[Exception], ...] = (httpx.TransportError, json.JSONDecodeError)
+) -> Callable:
+    """
+    Decorator that retries the wrapped coroutine function when specified exceptions occur.
+    
+    Args:
+        max_retries: Maximum number of retry attempts
+        backoff_factor: Exponential backoff multiplier
+        exceptions: Tuple of exceptions that should trigger a retry
+        
+    return:
+        Decorator function with retry logic
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            retry_count = 0
+            while retry_count < max_retries:
+                try:
+                    return await func(*args, **kwargs)
+                except exceptions as e:
+                    retry_count += 1
+                    if retry_count == max_retries:
+                        raise
+                    wait_time = backoff_factor ** retry_count
+                    await asyncio.sleep(wait_time)
+        return wrapper
+    return decorator
+
+
 class Util:
     """
     Utility class for common functions. class is not necessary as all functions here could be standalone but i like the organization of calling it as one elsewhere
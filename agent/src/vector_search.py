@@ -1,11 +1,33 @@
 import os
+import re
 import json
+import time
+import hashlib
+import asyncio
+import threading
 from typing import Dict, Any, List, Optional
-from pinecone import Pinecone
-from src.utils import retry_with_backoff
-from src.database import db
+from pinecone import Pinecone, PineconeAsyncio
+from src.utils import retry_with_backoff, async_retry_with_backoff
+from src.database import db, async_db
+from src.rerank import reranker
+from src.embeddings import get_embedding_backend
 import src.config as config
 
+
+def faq_namespace(job_id: str) -> str:
+    """Namespace holding a job's precomputed FAQ (next to the job's knowledge base namespace)."""
+    return f"{job_id}-faq"
+
+
+def knowledge_fingerprint(chunks: Dict[str, str]) -> str:
+    """Digest of a knowledge base's vector ids & texts, so any edit changes it (even one keeping the vector count)."""
+    digest = hashlib.sha256()
+    for vector_id in sorted(chunks):
+        digest.update(vector_id.encode("utf-8") + b"\0")
+        digest.update(hashlib.sha256(chunks[vector_id].encode("utf-8")).digest())
+    return digest.hexdigest()[:32]
+
+
 class VectorSearchService:
     """
     Handles vector search operations using Pinecone.
@@ -17,7 +39,11 @@ class VectorSearchService:
     def __init__(self):
         """Initialize the vector search service."""
         self.client = None
+        self.speculation_stats = self._new_speculation_stats()
+        self.packing_stats = {"searches": 0, "tokens_packed": 0, "tokens_saved": 0}
+        self._init_index_cache()
         self.connect()
+        self.embedder = get_embedding_backend(client=self.client)
     
     def connect(self) -> None:
         """
@@ -35,10 +61,107 @@ class VectorSearchService:
         except Exception as e:
             raise ConnectionError(f"Could not connect to Pinecone: {str(e)}")
     
+    # Index handle & namespace stats cache
+    # --------------------------------------------------------------
+    # Creating an Index client looks the index host up and builds a
+    # new connection pool, so handles are created once per index name
+    # and reused for the life of the process. describe_index_stats
+    # returns every namespace's vector count in one call; it is cached
+    # per index for NAMESPACE_STATS_TTL seconds so empty namespaces are
+    # skipped without a query, and the answer cache fingerprint keys
+    # off the same counts.
+    # --------------------------------------------------------------
+    def _init_index_cache(self) -> None:
+        """Empty index handle & namespace stats caches."""
+        self._index_hosts: Dict[str, str] = {}
+        self._indexes: Dict[str, Any] = {}
+        self._namespace_stats: Dict[str, Dict[str, Any]] = {}
+        self._knowledge_fingerprints: Dict[tuple, Dict[str, Any]] = {}
+        self._index_lock = threading.Lock()
+        self.index_cache_stats = {"stats_fetches": 0, "stats_hits": 0, "empty_skips": 0}
+
+    def get_index(self, index_name: str):
+        """
+        Return the pooled Index client for index_name, creating it on first use.
+        
+        Args:
+            index_name: Name of the Pinecone index
+            
+        return:
+            The cached Index client
+        """
+        with self._index_lock:
+            if index_name not in self._indexes:
+                if index_name not in self._index_hosts:
+                    self._index_hosts[index_name] = self.client.describe_index(index_name).host
+                self._indexes[index_name] = self.client.Index(
+                    host=self._index_hosts[index_name],
+                    pool_threads=config.PINECONE_POOL_SIZE,
+                    connection_pool_maxsize=config.PINECONE_POOL_SIZE
+                )
+            return self._indexes[index_name]
+
+    def _cached_namespace_count(self, index_name: str, namespace: str) -> Optional[int]:
+        """A namespace's vector count from the cached stats, None when they are missing or expired."""
+        with self._index_lock:
+            cached = self._namespace_stats.get(index_name)
+            if not cached or time.time() - cached["fetched_at"] > config.NAMESPACE_STATS_TTL:
+                return None
+            self.index_cache_stats["stats_hits"] += 1
+            return cached["counts"].get(namespace, 0)
+
+    def _store_namespace_stats(self, index_name: str, stats: Any) -> Dict[str, int]:
+        """Cache the vector count of every namespace from a describe_index_stats response."""
+        counts = {name: namespace_stats.vector_count for name, namespace_stats in stats.namespaces.items()}
+        with self._index_lock:
+            self._namespace_stats[index_name] = {"counts": counts, "fetched_at": time.time()}
+            self.index_cache_stats["stats_fetches"] += 1
+        return counts
+
+    def invalidate_namespace_stats(self, index_name: Optional[str] = None) -> None:
+        """Drop the cached namespace stats (after writing to the index), of one index or all."""
+        with self._index_lock:
+            if index_name:
+                self._namespace_stats.pop(index_name, None)
+                self._knowledge_fingerprints = {
+                    key: value for key, value in self._knowledge_fingerprints.items() if key[0] != index_name
+                }
+            else:
+                self._namespace_stats = {}
+                self._knowledge_fingerprints = {}
+
+    def _cached_knowledge_fingerprint(self, index_name: str, namespace: str) -> Optional[str]:
+        """A namespace's knowledge fingerprint if computed within FAQ_FINGERPRINT_TTL seconds."""
+        with self._index_lock:
+            cached = self._knowledge_fingerprints.get((index_name, namespace))
+            if not cached or time.time() - cached["computed_at"] > config.FAQ_FINGERPRINT_TTL:
+                return None
+            return cached["fingerprint"]
+
+    def _store_knowledge_fingerprint(self, index_name: str, namespace: str, chunks: Dict[str, str]) -> str:
+        """Fingerprint a namespace's chunks and cache it."""
+        digest = knowledge_fingerprint(chunks)
+        with self._index_lock:
+            self._knowledge_fingerprints[(index_name, namespace)] = {"fingerprint": digest, "computed_at": time.time()}
+        return digest
+
+    def _skip_empty_namespace(self, vector_count: int) -> Optional[Dict[str, Any]]:
+        """Empty results for a namespace without vectors, so the query is not sent."""
+        if vector_count:
+            return None
+        with self._index_lock:
+            self.index_cache_stats["empty_skips"] += 1
+        return {"raw_results": [], "context": None, "has_relevant_matches": False}
+
+    def get_index_cache_stats(self) -> Dict[str, Any]:
+        """Namespace stats cache counters."""
+        with self._index_lock:
+            return dict(self.index_cache_stats)
+    
     @retry_with_backoff()
     def embed_text(self, text: str) -> List[float]:
         """
-        Embed a text string using Pinecone's embedding service.
+        Embed a text string with the configured embedding backend (EMBED_BACKEND).
         
         Args:
             text: Text to embed
@@ -50,23 +173,32 @@ class VectorSearchService:
             ConnectionError: If embedding fails
         """
         try:
-            embedding_response = self.client.inference.embed(
-                model="multilingual-e5-large",
-                inputs=[text],
-                parameters={"input_type": "query"}
-            )
-            
-            # Extract the embedding values
-            embedding = embedding_response[0]['values']
-            
-            return embedding
+            return self.embedder.embed([text], input_type="query")[0]
         except Exception as e:
             raise
     
+    @retry_with_backoff()
+    def embed_texts(self, texts: List[str], input_type: str = "query") -> List[List[float]]:
+        """
+        Embed several texts, the backend batches them.
+        
+        Args:
+            texts: Texts to embed
+            input_type: "query" for questions, "passage" for knowledge base chunks
+            
+        return:
+            One embedding vector per text, in order
+        """
+        return self.embedder.embed(texts, input_type=input_type)
+    
+    def get_embedding_stats(self) -> Dict[str, Any]:
+        """Per-call latency of the embedding backend."""
+        return self.embedder.get_stats()
+    
     @retry_with_backoff()
     def search(self, index_name: str, vector: List[float], 
               namespace: str, top_k: int = 5, 
-              score_threshold: float = 0.8) -> Dict[str, Any]:
+              score_threshold: float = 0.8, query_text: Optional[str] = None) -> Dict[str, Any]:
         """
         Search for similar vectors in Pinecone.
         
@@ -76,6 +208,7 @@ class VectorSearchService:
             namespace: Namespace within the index
             top_k: Number of results to return
             score_threshold: Minimum similarity score for filtering
+            query_text: The query as text, enables the rerank stage (fetches RERANK_FETCH_K wide)
             
         return:
             Dict with search results and context
@@ -84,8 +217,16 @@ class VectorSearchService:
             ConnectionError: If search fails
         """
         try:
+            # a job without a knowledge base has nothing to find
+            empty = self._skip_empty_namespace(self.get_namespace_vector_count(namespace, index_name))
+            if empty:
+                return empty
+
+            # with a reranker fetch wide, the rerank stage narrows it down to the best chunks
+            if reranker and query_text:
+                top_k = max(top_k, config.RERANK_FETCH_K)
             
-            index = self.client.Index(index_name)
+            index = self.get_index(index_name)
 
             
             results = index.query(
@@ -96,24 +237,143 @@ class VectorSearchService:
                 include_metadata=True,
             )
             # Process the results to extract context
-            context = ""
-            for match in results.matches:
-                if match.score >= score_threshold:
-                    context += match.metadata["text"] + "\n\n"
-            
-            if not context:
-                context = None
-            
-            return {
-                "raw_results": results.matches,
-                "context": context,
-                "has_relevant_matches": bool(context)
-            }
+            return self.build_context(results.matches, score_threshold, query_text)
         except Exception as e:
             print(f"Error in search: {e}")
             raise
     
-    def search_with_text(self, job_id: str, text: str, index_name: Optional[str] = None) -> Dict[str, Any]:
+    def build_context(self, matches: List[Any], score_threshold: float, query_text: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Pack the text of the matches above the score threshold into the LLM context.
+        
+        Args:
+            matches: Query matches (score & metadata["text"]), Pinecone objects or plain dicts
+            score_threshold: Minimum similarity score for filtering
+            query_text: The query as text; when a reranker is configured only its best RERANK_KEEP chunks are used
+            
+        return:
+            Dict with the matches (as id/score/text dicts), context and the packing report
+        """
+        candidates, order_key = matches, "score"
+        if reranker and query_text:
+            relevant = [fields for fields in (self._match_fields(match) for match in matches)
+                        if fields["score"] >= score_threshold and fields["text"].strip()]
+            candidates, order_key = reranker.rerank(query_text, relevant, config.RERANK_KEEP), "rerank_score"
+
+        packed = self.pack_context(candidates, score_threshold, config.CONTEXT_TOKEN_BUDGET, order_key=order_key)
+        context = packed["context"] or None
+        
+        return {
+            # plain dicts: the results go into the graph state, which checkpoints must serialize
+            "raw_results": [self._match_fields(match) for match in matches],
+            "context": context,
+            "has_relevant_matches": bool(context),
+            "packing": packed["report"]
+        }
+
+    # Context packing
+    # --------------------------------------------------------------
+    # Retrieved chunks often overlap (the uploader stores sentences and
+    # similar sentences score alike), and every chunk is paid for in the
+    # second prompt. Chunks are ordered by score, near-duplicates are
+    # dropped, and chunks are added until the token budget is full.
+    # Works on any list of matches, from Pinecone or a local index.
+    # --------------------------------------------------------------
+    @staticmethod
+    def _match_fields(match: Any) -> Dict[str, Any]:
+        """Read id, score & text from a Pinecone match object or a plain dict match."""
+        if isinstance(match, dict):
+            metadata = match.get("metadata") or {}
+            return {**match, "id": match.get("id"), "score": match.get("score", 0.0), "text": match.get("text") or metadata.get("text", "")}
+        metadata = getattr(match, "metadata", None) or {}
+        return {"id": getattr(match, "id", None), "score": match.score, "text": metadata.get("text", "")}
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Rough token count (about 4 characters per token), enough for budgeting without a tokenizer."""
+        return (len(text) + 3) // 4
+
+    @staticmethod
+    def _shingles(text: str) -> set:
+        """Lowercased word set used to spot near-duplicate chunks."""
+        return set(re.findall(r"\w+", text.lower()))
+
+    def pack_context(self, matches: List[Any], score_threshold: float, token_budget: int,
+                     order_key: str = "score") -> Dict[str, Any]:
+        """
+        Dedup, order and budget the matched chunks.
+        
+        Args:
+            matches: Query matches (any backend)
+            score_threshold: Minimum similarity score for a chunk to be used
+            token_budget: Max estimated tokens of context
+            order_key: Field the chunks are ordered by ("rerank_score" after reranking)
+            
+        return:
+            Dict with context (str) and report (tokens_available, tokens_packed, tokens_saved,
+            chunks_used, duplicates_dropped, over_budget_dropped)
+        """
+        candidates = [fields for fields in (self._match_fields(match) for match in matches)
+                      if fields["score"] >= score_threshold and fields["text"].strip()]
+        candidates.sort(key=lambda fields: fields.get(order_key, fields["score"]), reverse=True)
+
+        kept, kept_shingles = [], []
+        tokens_available = tokens_packed = 0
+        duplicates_dropped = over_budget_dropped = 0
+        for fields in candidates:
+            text = fields["text"].strip()
+            tokens = self.estimate_tokens(text)
+            tokens_available += tokens
+
+            shingles = self._shingles(text)
+            if any(len(shingles & other) / max(len(shingles | other), 1) >= config.CONTEXT_DEDUP_SIMILARITY
+                   for other in kept_shingles):
+                duplicates_dropped += 1
+                continue
+
+            if tokens_packed + tokens > token_budget:
+                if kept:
+                    over_budget_dropped += 1
+                    continue
+                # the best chunk alone is over budget, keep its start rather than nothing
+                text = text[:token_budget * 4]
+                tokens = self.estimate_tokens(text)
+
+            kept.append(text)
+            kept_shingles.append(shingles)
+            tokens_packed += tokens
+
+        report = {
+            "tokens_available": tokens_available,
+            "tokens_packed": tokens_packed,
+            "tokens_saved": tokens_available - tokens_packed,
+            "chunks_used": len(kept),
+            "duplicates_dropped": duplicates_dropped,
+            "over_budget_dropped": over_budget_dropped
+        }
+        return {"context": "\n\n".join(kept) + ("\n\n" if kept else ""), "report": report}
+
+    def _record_packing(self, report: Optional[Dict[str, Any]]) -> None:
+        """Add the packing report of results an answer is generated from to the run totals."""
+        if not report:
+            return
+        self.packing_stats["searches"] += 1
+        self.packing_stats["tokens_packed"] += report["tokens_packed"]
+        self.packing_stats["tokens_saved"] += report["tokens_saved"]
+
+    def get_packing_stats(self) -> Dict[str, Any]:
+        """
+        Context packing totals for the run.
+        
+        return:
+            Dict with searches, tokens_packed, tokens_saved and avg_tokens_saved
+        """
+        stats = dict(self.packing_stats)
+        stats["avg_tokens_saved"] = round(stats["tokens_saved"] / stats["searches"], 1) if stats["searches"] else 0.0
+        return stats
+    
+    def search_with_text(self, job_id: str, text: str, index_name: Optional[str] = None,
+                         embedding: Optional[List[float]] = None) -> Dict[str, Any]:
         """
         Search Pinecone using a text string.
         
@@ -121,6 +381,7 @@ class VectorSearchService:
             job_id: Job ID
             text: Text to search for
             index_name: Name of the index to search (defaults to one in env)
+            embedding: Embedding of text when the caller already has it
             
         return:
             Dict with search results and context
@@ -134,18 +395,408 @@ class VectorSearchService:
                 index_name = os.environ.get("INDEX_NAME")
                 
             # Embed the text
-            embedding = self.embed_text(text)
+            if embedding is None:
+                embedding = self.embed_text(text)
             # print("got here in search_with_text, embedding", embedding)
             #namespace is the job id, definitely not default one
             job_details = db.get_job_details(job_id)
             namespace = job_details.get('id', "") #no default namespace for now. I will add a universal default one later.
             # Search using the embedding
             # print("got here in search_with_text, namespace", namespace)
-            search_results = self.search(index_name, embedding, namespace)
+            search_results = self.search(index_name, embedding, namespace, query_text=text)
             
             return search_results
         except Exception as e:
             return {"error": str(e), "context": "", "has_relevant_matches": False}
 
+    @retry_with_backoff()
+    def search_faq(self, job_id: str, embedding: List[float], index_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Look a question up in the job's precomputed FAQ namespace (see src/faq_store.py).
+        
+        Args:
+            job_id: Job ID
+            embedding: Query embedding of the extracted question
+            index_name: Name of the index (defaults to one in env)
+            
+        return:
+            Dict with question, answer and score of the best approved FAQ at or above
+            FAQ_MATCH_THRESHOLD that was built from the current knowledge base, else None
+        """
+        # jobs without a precomputed FAQ skip the query
+        if not self.get_namespace_vector_count(faq_namespace(job_id), index_name):
+            return None
+        index = self.get_index(index_name or os.environ.get("INDEX_NAME"))
+        results = index.query(
+            namespace=faq_namespace(job_id),
+            vector=embedding,
+            top_k=1,
+            include_values=False,
+            include_metadata=True,
+            filter={"approved": True}
+        )
+        if not results.matches or results.matches[0].score < config.FAQ_MATCH_THRESHOLD:
+            return None
+        return self._check_faq_match(job_id, results.matches[0], self.get_knowledge_fingerprint(job_id, index_name))
+
+    @staticmethod
+    def _check_faq_match(job_id: str, match: Any, source_fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Accept a strong FAQ match only when it is not stale (knowledge base changed since precompute)."""
+        if match.metadata.get("source_fingerprint") != source_fingerprint:
+            print(f"FAQ for job {job_id} is stale, re-run the FAQ precompute")
+            return None
+        return {
+            "question": match.metadata["question"],
+            "answer": match.metadata["answer"],
+            "score": match.score
+        }
+
+    @retry_with_backoff()
+    def get_namespace_chunks(self, namespace: str, index_name: Optional[str] = None) -> Dict[str, str]:
+        """
+        Read the text of every vector in a namespace.
+        
+        Args:
+            namespace: Namespace within the index (the job ID)
+            index_name: Name of the index (defaults to one in env)
+            
+        return:
+            Dict of vector id -> chunk text
+        """
+        index = self.get_index(index_name or os.environ.get("INDEX_NAME"))
+        chunks = {}
+        for ids in index.list(namespace=namespace):
+            fetched = index.fetch(ids=list(ids), namespace=namespace)
+            for vector_id, vector in fetched.vectors.items():
+                chunks[vector_id] = (vector.metadata or {}).get("text", "")
+        return chunks
+
+    def get_knowledge_fingerprint(self, job_id: str, index_name: Optional[str] = None,
+                                  chunks: Optional[Dict[str, str]] = None) -> str:
+        """
+        Fingerprint of a job's knowledge base (see knowledge_fingerprint), cached for
+        FAQ_FINGERPRINT_TTL seconds. A precomputed FAQ stores the one it was built from.
+        
+        Args:
+            job_id: Job ID (the namespace)
+            index_name: Name of the index (defaults to one in env)
+            chunks: The namespace's chunks when the caller already read them
+            
+        return:
+            The knowledge base fingerprint
+        """
+        index_name = index_name or os.environ.get("INDEX_NAME")
+        if chunks is None:
+            cached = self._cached_knowledge_fingerprint(index_name, job_id)
+            if cached is not None:
+                return cached
+            chunks = self.get_namespace_chunks(job_id, index_name)
+        return self._store_knowledge_fingerprint(index_name, job_id, chunks)
+
+    @retry_with_backoff()
+    def get_namespace_vector_count(self, namespace: str, index_name: Optional[str] = None) -> int:
+        """
+        Number of vectors stored in a namespace (0 when the namespace does not exist),
+        from the index stats cached for NAMESPACE_STATS_TTL seconds.
+        
+        Args:
+            namespace: Namespace within the index (the job ID)
+            index_name: Name of the index (defaults to one in env)
+            
+        return:
+            The namespace's vector count
+        """
+        index_name = index_name or os.environ.get("INDEX_NAME")
+        vector_count = self._cached_namespace_count(index_name, namespace)
+        if vector_count is not None:
+            return vector_count
+        counts = self._store_namespace_stats(index_name, self.get_index(index_name).describe_index_stats())
+        return counts.get(namespace, 0)
+
+    # Speculative retrieval
+    # --------------------------------------------------------------
+    # The knowledge base is searched with the member's raw (stripped)
+    # message while the first LLM call is still extracting the context.
+    # If the speculative results are confident enough they are used
+    # as is and the second query is skipped; otherwise the normal query
+    # runs and the two are compared. Counters show how often it pays off.
+    # --------------------------------------------------------------
+    @staticmethod
+    def _new_speculation_stats() -> Dict[str, Any]:
+        """Empty speculation counters."""
+        return {
+            "hits": 0,          # speculative results used, second query skipped
+            "misses": 0,        # not confident enough, second query ran
+            "agreements": 0,    # misses where both queries had the same top match anyway
+            "unused": 0,        # speculation thrown away (greeting, no second query needed)
+            "saved_seconds": 0.0
+        }
+
+    def speculative_search(self, job_id: str, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Search with the raw inbound text, timing the search.
+        
+        Args:
+            job_id: Job ID
+            text: The member's stripped message
+            
+        return:
+            Search results with a "seconds" entry, or None when speculation is disabled
+        """
+        if not config.SPECULATIVE_RETRIEVAL or not text or not text.strip():
+            return None
+        start = time.perf_counter()
+        results = self.search_with_text(job_id, text)
+        results["seconds"] = time.perf_counter() - start
+        return results
+
+    def resolve_speculation(self, job_id: str, speculative: Optional[Dict[str, Any]], text: str,
+                            embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """
+        Pick the results to answer with: the speculative ones when confident, else a normal search with text.
+        
+        Args:
+            job_id: Job ID
+            speculative: Results of speculative_search (or None)
+            text: The context extracted by the LLM
+            embedding: Embedding of text when the caller already has it
+            
+        return:
+            Dict with search results and context
+        """
+        if speculative is None:
+            results = self.search_with_text(job_id, text, embedding=embedding)
+        elif self._is_confident(speculative):
+            self._record_speculation("hits", saved_seconds=speculative.get("seconds", 0.0))
+            results = speculative
+        else:
+            results = self.search_with_text(job_id, text, embedding=embedding)
+            self._record_speculation("misses", agreed=self._top_match_id(results) == self._top_match_id(speculative))
+        # only the results the reply is generated from count toward the packing totals
+        self._record_packing(results.get("packing"))
+        return results
+
+    def discard_speculation(self, speculative: Optional[Dict[str, Any]]) -> None:
+        """Count a speculative search whose results were not needed."""
+        if speculative is not None:
+            self._record_speculation("unused")
+
+    def _is_confident(self, results: Dict[str, Any]) -> bool:
+        """Speculative results are trusted when their best match clears SPECULATIVE_CONFIDENCE."""
+        matches = results.get("raw_results") or []
+        if not results.get("has_relevant_matches") or not matches:
+            return False
+        return max(self._match_fields(match)["score"] for match in matches) >= config.SPECULATIVE_CONFIDENCE
+
+    def _top_match_id(self, results: Dict[str, Any]) -> Optional[str]:
+        """ID of the best match of a search, or None."""
+        matches = [self._match_fields(match) for match in results.get("raw_results") or []]
+        if not matches:
+            return None
+        return max(matches, key=lambda fields: fields["score"])["id"]
+
+    def _record_speculation(self, outcome: str, agreed: bool = False, saved_seconds: float = 0.0) -> None:
+        """Update the speculation counters."""
+        self.speculation_stats[outcome] += 1
+        if agreed:
+            self.speculation_stats["agreements"] += 1
+        self.speculation_stats["saved_seconds"] += saved_seconds
+
+    def get_speculation_stats(self) -> Dict[str, Any]:
+        """
+        Speculation counters with the hit rate.
+        
+        return:
+            Dict with hits, misses, agreements, unused, saved_seconds and hit_rate
+        """
+        stats = dict(self.speculation_stats)
+        decided = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / decided, 3) if decided else 0.0
+        stats["saved_seconds"] = round(stats["saved_seconds"], 3)
+        return stats
+
+# Create a singleton instance
+vector_search = VectorSearchService()
+
+
+class AsyncVectorSearchService(VectorSearchService):
+    """
+    Async counterpart of VectorSearchService for the asyncio pipeline.
+    
+    Uses the asyncio Pinecone client; the client and index host lookups are
+    created on first use inside the running loop and shared by all pipelines.
+    """
+
+    def __init__(self):
+        """Initialize the async vector search service."""
+        self.client: Optional[PineconeAsyncio] = None
+        self._init_index_cache()
+        self.speculation_stats = self._new_speculation_stats()
+        self.packing_stats = {"searches": 0, "tokens_packed": 0, "tokens_saved": 0}
+        self.embedder = get_embedding_backend(async_connect=self.connect)
+
+    async def connect(self) -> PineconeAsyncio:
+        """
+        Connect to the Pinecone service (once per process).
+        
+        Raises:
+            ConnectionError: If unable to connect to Pinecone
+        """
+        if self.client:
+            return self.client
+        try:
+            if not os.environ.get("PINECONE_API_KEY"):
+                raise ValueError("Missing Pinecone API key in environment variables")
+            self.client = PineconeAsyncio(api_key=os.environ.get("PINECONE_API_KEY"))
+            return self.client
+        except Exception as e:
+            raise ConnectionError(f"Could not connect to Pinecone: {str(e)}")
+
+    async def aclose(self) -> None:
+        """Close the index clients and the Pinecone client."""
+        for index in self._indexes.values():
+            await index.close()
+        self._indexes = {}
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    async def get_index(self, index_name: str):
+        """Return the async index client for index_name, looking its host up only once."""
+        if index_name not in self._indexes:
+            client = await self.connect()
+            if index_name not in self._index_hosts:
+                description = await client.describe_index(index_name)
+                self._index_hosts[index_name] = description.host
+            if index_name not in self._indexes:
+                self._indexes[index_name] = client.IndexAsyncio(
+                    host=self._index_hosts[index_name],
+                    connection_pool_maxsize=config.PINECONE_POOL_SIZE
+                )
+        return self._indexes[index_name]
+
+    @async_retry_with_backoff()
+    async def embed_text(self, text: str) -> List[float]:
+        """Async counterpart of VectorSearchService.embed_text."""
+        return (await self.embedder.aembed([text], input_type="query"))[0]
+
+    async def embed_texts(self, texts: List[str], input_type: str = "query") -> List[List[float]]:
+        """Async counterpart of VectorSearchService.embed_texts."""
+        return await self.embedder.aembed(texts, input_type=input_type)
+
+    @async_retry_with_backoff()
+    async def search(self, index_name: str, vector: List[float], 
+                     namespace: str, top_k: int = 5, 
+                     score_threshold: float = 0.8, query_text: Optional[str] = None) -> Dict[str, Any]:
+        """Async counterpart of VectorSearchService.search."""
+        empty = self._skip_empty_namespace(await self.get_namespace_vector_count(namespace, index_name))
+        if empty:
+            return empty
+        if reranker and query_text:
+            top_k = max(top_k, config.RERANK_FETCH_K)
+        index = await self.get_index(index_name)
+        results = await index.query(
+            namespace=namespace,
+            vector=vector,
+            top_k=top_k,
+            include_values=False,
+            include_metadata=True,
+        )
+        if reranker and query_text:
+            # rerankers are blocking (hosted call or local model), keep them off the event loop
+            return await asyncio.to_thread(self.build_context, results.matches, score_threshold, query_text)
+        return self.build_context(results.matches, score_threshold)
+
+    async def search_with_text(self, job_id: str, text: str, index_name: Optional[str] = None,
+                               embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Async counterpart of VectorSearchService.search_with_text."""
+        try:
+            if not index_name:
+                index_name = os.environ.get("INDEX_NAME")
+
+            if embedding is None:
+                embedding = await self.embed_text(text)
+            job_details = await async_db.get_job_details(job_id)
+            namespace = job_details.get('id', "")
+            return await self.search(index_name, embedding, namespace, query_text=text)
+        except Exception as e:
+            return {"error": str(e), "context": "", "has_relevant_matches": False}
+
+    @async_retry_with_backoff()
+    async def search_faq(self, job_id: str, embedding: List[float], index_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Async counterpart of VectorSearchService.search_faq."""
+        if not await self.get_namespace_vector_count(faq_namespace(job_id), index_name):
+            return None
+        index = await self.get_index(index_name or os.environ.get("INDEX_NAME"))
+        results = await index.query(
+            namespace=faq_namespace(job_id),
+            vector=embedding,
+            top_k=1,
+            include_values=False,
+            include_metadata=True,
+            filter={"approved": True}
+        )
+        if not results.matches or results.matches[0].score < config.FAQ_MATCH_THRESHOLD:
+            return None
+        source_fingerprint = await self.get_knowledge_fingerprint(job_id, index_name)
+        return self._check_faq_match(job_id, results.matches[0], source_fingerprint)
+
+    @async_retry_with_backoff()
+    async def get_namespace_chunks(self, namespace: str, index_name: Optional[str] = None) -> Dict[str, str]:
+        """Async counterpart of VectorSearchService.get_namespace_chunks."""
+        index = await self.get_index(index_name or os.environ.get("INDEX_NAME"))
+        chunks = {}
+        async for ids in index.list(namespace=namespace):
+            fetched = await index.fetch(ids=list(ids), namespace=namespace)
+            for vector_id, vector in fetched.vectors.items():
+                chunks[vector_id] = (vector.metadata or {}).get("text", "")
+        return chunks
+
+    async def get_knowledge_fingerprint(self, job_id: str, index_name: Optional[str] = None,
+                                        chunks: Optional[Dict[str, str]] = None) -> str:
+        """Async counterpart of VectorSearchService.get_knowledge_fingerprint."""
+        index_name = index_name or os.environ.get("INDEX_NAME")
+        if chunks is None:
+            cached = self._cached_knowledge_fingerprint(index_name, job_id)
+            if cached is not None:
+                return cached
+            chunks = await self.get_namespace_chunks(job_id, index_name)
+        return self._store_knowledge_fingerprint(index_name, job_id, chunks)
+
+    @async_retry_with_backoff()
+    async def get_namespace_vector_count(self, namespace: str, index_name: Optional[str] = None) -> int:
+        """Async counterpart of VectorSearchService.get_namespace_vector_count."""
+        index_name = index_name or os.environ.get("INDEX_NAME")
+        vector_count = self._cached_namespace_count(index_name, namespace)
+        if vector_count is not None:
+            return vector_count
+        index = await self.get_index(index_name)
+        counts = self._store_namespace_stats(index_name, await index.describe_index_stats())
+        return counts.get(namespace, 0)
+
+    async def speculative_search(self, job_id: str, text: str) -> Optional[Dict[str, Any]]:
+        """Async counterpart of VectorSearchService.speculative_search."""
+        if not config.SPECULATIVE_RETRIEVAL or not text or not text.strip():
+            return None
+        start = time.perf_counter()
+        results = await self.search_with_text(job_id, text)
+        results["seconds"] = time.perf_counter() - start
+        return results
+
+    async def resolve_speculation(self, job_id: str, speculative: Optional[Dict[str, Any]], text: str,
+                                  embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Async counterpart of VectorSearchService.resolve_speculation."""
+        if speculative is None:
+            results = await self.search_with_text(job_id, text, embedding=embedding)
+        elif self._is_confident(speculative):
+            self._record_speculation("hits", saved_seconds=speculative.get("seconds", 0.0))
+            results = speculative
+        else:
+            results = await self.search_with_text(job_id, text, embedding=embedding)
+            self._record_speculation("misses", agreed=self._top_match_id(results) == self._top_match_id(speculative))
+        # only the results the reply is generated from count toward the packing totals
+        self._record_packing(results.get("packing"))
+        return results
+
 # Create a singleton instance
-vector_search = VectorSearchService() 
\ No newline at end of file
+async_vector_search = AsyncVectorSearchService()
@@ -0,0 +1,95 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import src.config as config
+from src.answer_cache import answer_cache
+from src.embeddings import DeterministicEmbeddingBackend
+from src.main import EmailAutomationApp
+from src.vector_search import async_vector_search, vector_search
+
+
+JOB_ID = "job-answer-cache"
+QUESTION = "When is the start date?"
+embedder = DeterministicEmbeddingBackend()
+
+
+def _embed(text):
+    return embedder.embed([text])[0]
+
+
+def _state(history: str):
+    return {
+        "member": {"name_email": {"name": "A", "email": "a@example.com"}, "subject": "Job"},
+        "job": {"title": "Job", "Job_email": "owner@example.com"},
+        "email_history": history,
+        "email_context": QUESTION,
+        "search_results": {"context": "The start date is May 1.", "has_relevant_matches": True},
+        "question_embedding": _embed(QUESTION),
+    }
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = EmailAutomationApp(JOB_ID)
+    # the llm echoes its prompt, so anything in the prompt shows up in the answer
+    monkeypatch.setattr(app, "_invoke_llm", lambda site, prompt: SimpleNamespace(content="Answer from: " + prompt))
+    answer_cache.invalidate(JOB_ID)
+    answer_cache.set_fingerprint(JOB_ID, "fingerprint")
+    yield app
+    answer_cache.invalidate(JOB_ID)
+
+
+def test_member_never_gets_another_members_history(app, monkeypatch):
+    monkeypatch.setattr(config, "ANSWER_CACHE_ENABLED", True)
+    app.generate(_state("member A wrote: my current salary is 90k"))
+
+    # member B asks the same question and is answered from the cache
+    cached = answer_cache.lookup(JOB_ID, _embed("when is the START date"))
+    assert cached is not None
+    assert "May 1" in cached
+    assert "90k" not in cached
+    # a different question is not
+    assert answer_cache.lookup(JOB_ID, _embed("Is the role remote?")) is None
+
+
+def test_answers_using_history_are_not_cached(app, monkeypatch):
+    monkeypatch.setattr(config, "ANSWER_CACHE_ENABLED", False)
+    reply = app.generate(_state("member A wrote: my current salary is 90k"))
+
+    assert "90k" in reply["email_response"]
+    assert answer_cache.lookup(JOB_ID, _embed(QUESTION)) is None
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_an_edit_keeping_the_vector_count_drops_the_answers(app, monkeypatch, use_async):
+    chunks = {"chunk-1": "The start date is May 1.", "chunk-2": "The role is remote."}
+
+    def get_namespace_chunks(namespace, index_name=None):
+        return dict(chunks)
+
+    async def aget_namespace_chunks(namespace, index_name=None):
+        return dict(chunks)
+
+    monkeypatch.setattr(vector_search, "get_namespace_chunks", get_namespace_chunks)
+    monkeypatch.setattr(async_vector_search, "get_namespace_chunks", aget_namespace_chunks)
+    # every reply checks the fingerprint again
+    monkeypatch.setattr(config, "ANSWER_CACHE_FINGERPRINT_TTL", -1)
+    monkeypatch.setattr(config, "FAQ_FINGERPRINT_TTL", -1)
+
+    def refresh():
+        if use_async:
+            return asyncio.run(app._arefresh_cache_fingerprint({"id": JOB_ID, "default_message": "Hi"}))
+        return app._refresh_cache_fingerprint({"id": JOB_ID, "default_message": "Hi"})
+
+    assert refresh()
+    answer_cache.store(JOB_ID, _embed(QUESTION), "The start date is May 1.")
+    assert refresh()
+    assert answer_cache.lookup(JOB_ID, _embed(QUESTION)) == "The start date is May 1."
+
+    # the start date moves, the namespace still has two vectors
+    chunks["chunk-1"] = "The start date is June 1."
+    assert refresh()
+
+    assert answer_cache.lookup(JOB_ID, _embed(QUESTION)) is None
@@ -0,0 +1,91 @@
+import json
+import os
+import sys
+import time
+
+import src.config as config
+from src.batch import (DeferredJobs, aggregate, deferred_first, group_by_mailbox, make_shards, merge_results,
+                       run_shard, shard_results_paths)
+
+
+def test_mailbox_groups_stay_in_one_shard():
+    jobs = [
+        {"id": "a1", "Job_email": "a@example.com"},
+        {"id": "a2", "Job_email": "A@example.com"},
+        {"id": "b1", "Job_email": "b@example.com"},
+    ]
+    shards = make_shards(group_by_mailbox(jobs), 4)
+
+    assert sorted(map(sorted, shards)) == [["a1", "a2"], ["b1"]]
+
+
+def test_shard_files_are_merged_whole_and_removed(tmp_path):
+    results_path = str(tmp_path / "results.jsonl")
+    with open(results_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"job_id": "earlier"}) + "\n")
+
+    shard_paths = shard_results_paths(results_path, 2)
+    assert len(set(shard_paths)) == 2
+    assert all(os.path.dirname(path) == str(tmp_path) for path in shard_paths)
+    for number, path in enumerate(shard_paths):
+        with open(path, "a", encoding="utf-8") as f:
+            for member_id in range(3):
+                f.write(json.dumps({"job_id": f"shard{number}", "member_id": member_id}) + "\n")
+
+    merge_results(shard_paths, results_path)
+
+    with open(results_path, encoding="utf-8") as f:
+        jobs = [json.loads(line)["job_id"] for line in f]
+    assert jobs == ["earlier"] + ["shard0"] * 3 + ["shard1"] * 3
+    assert not any(os.path.exists(path) for path in shard_paths)
+
+
+def test_each_job_gets_a_fair_share_of_the_time_left(monkeypatch, tmp_path):
+    calls = []
+
+    def main(job_id, use_async, sink, deadline_seconds):
+        calls.append((job_id, deadline_seconds))
+        # the first job uses up most of the batch
+        monkeypatch.setattr(time, "time", lambda: now + 95)
+        return {"status": "success", "summary": {"total_members": 1}}
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    monkeypatch.setattr(sys.modules["src.main"], "main", main)
+    monkeypatch.setattr(config, "RUN_DEADLINE_MARGIN", 10)
+
+    results = run_shard(["first", "second"], results_path=str(tmp_path / "results.jsonl"), deadline_at=now + 100)
+
+    # 90s usable over two jobs, plus the margin the job keeps free itself
+    assert calls == [("first", 55)]
+    assert results["second"]["deferred"]
+    assert aggregate(results)["summary"]["jobs_deferred"] == 1
+    assert aggregate(results)["status"] == "success"
+
+
+def test_jobs_deferred_by_a_batch_run_first_in_the_next(tmp_path):
+    deferred_jobs = DeferredJobs(str(tmp_path / "deferred.db"))
+    deferred_jobs.update({"a": {"status": "success"}, "c": {"status": "no_action", "deferred": True}})
+    deferred_jobs.update({"c": {"status": "no_action", "deferred": True}, "b": {"status": "no_action", "deferred": True}})
+    deferred = deferred_jobs.load()
+
+    # c has waited longest, b next, then the usual order
+    assert deferred_first(["a", "b", "c", "d"], deferred) == ["c", "b", "a", "d"]
+
+    deferred_jobs.update({"c": {"status": "success"}})
+    assert set(deferred_jobs.load()) == {"b"}
+    deferred_jobs.close()
+
+
+def test_without_a_results_path_stdout_is_left_alone(monkeypatch):
+    def main(job_id, use_async, sink, deadline_seconds):
+        sink.write(job_id, {"member_id": "m1", "status": "success"})
+        return {"status": "success", "summary": {"total_members": 1}}
+
+    monkeypatch.setattr(sys.modules["src.main"], "main", main)
+    stdout = sys.stdout
+
+    results = run_shard(["only"])
+
+    assert results["only"]["status"] == "success"
+    assert sys.stdout is stdout
@@ -0,0 +1,119 @@
+import pytest
+
+from src.budget import RunBudget
+from src.main import EmailAutomationApp, db
+
+
+JOB_ID = "job-budget"
+
+
+def test_no_deadline_is_never_exhausted():
+    budget = RunBudget(deadline_seconds=0, margin_seconds=0)
+    budget.record(1000.0)
+
+    assert not budget.enabled
+    assert not budget.exhausted()
+
+
+def test_exhausted_once_the_next_member_would_not_fit():
+    budget = RunBudget(deadline_seconds=10, margin_seconds=2)
+    assert not budget.exhausted()
+
+    # members take 9s on average: 10s left is not enough for another one plus the margin
+    budget.record(9.0)
+    assert budget.exhausted()
+
+
+def test_halting_is_sticky():
+    budget = RunBudget(deadline_seconds=10, margin_seconds=0)
+    budget.record(20.0)
+    assert budget.exhausted()
+
+    # a faster member afterwards does not restart the run
+    budget.member_seconds, budget.members = 0.1, 100
+    assert budget.exhausted()
+    assert budget.get_stats()["halted"]
+
+
+class DeferRecorder:
+    """Records defer_members / clear_deferred calls."""
+
+    def __init__(self):
+        self.deferred = []
+        self.cleared = []
+
+    def defer_members(self, job_id, tier, active_since, after_id=None, member_ids=None):
+        if member_ids is not None:
+            self.deferred.append(("skipped", tuple(member_ids)))
+            return len(member_ids)
+        self.deferred.append((tier, after_id))
+        return 1
+
+    def clear_deferred(self, job_id, active_since, started_at, up_to_id=None):
+        self.cleared.append(up_to_id)
+        return True
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recorder = DeferRecorder()
+    monkeypatch.setattr(db, "defer_members", recorder.defer_members)
+    monkeypatch.setattr(db, "clear_deferred", recorder.clear_deferred)
+    return recorder
+
+
+def _app(tier, after_id, halted, skipped=()):
+    app = EmailAutomationApp(JOB_ID, deadline_seconds=60)
+    app._scan_tier, app._scan_after = tier, after_id
+    app._skipped_ids = list(skipped)
+    app.budget.halted = halted
+    return app
+
+
+def test_finished_run_clears_every_carried_over_mark(recorder):
+    app = _app("idle", "m9", halted=False, skipped=["m3"])
+    app._settle_deferred()
+
+    assert recorder.deferred == [("skipped", ("m3",))]
+    assert recorder.cleared == [None]
+    assert app.budget.deferred == 1
+    assert app._skipped_ids == []
+
+
+def test_halt_in_the_active_tier_defers_the_rest_and_clears_nothing(recorder):
+    app = _app("active", "m5", halted=True)
+    app._settle_deferred()
+
+    assert recorder.deferred == [("skipped", ()), ("active", "m5"), ("deferred", None), ("idle", None)]
+    assert recorder.cleared == []
+    assert app.budget.deferred == 3
+
+
+def test_halt_in_the_deferred_tier_clears_only_the_members_processed(recorder):
+    app = _app("deferred", "m7", halted=True)
+    app._settle_deferred()
+
+    assert recorder.deferred == [("skipped", ()), ("deferred", "m7"), ("idle", None)]
+    assert recorder.cleared == ["m7"]
+
+
+def test_halt_before_any_deferred_member_clears_nothing(recorder):
+    app = _app("deferred", None, halted=True)
+    app._settle_deferred()
+
+    assert recorder.cleared == []
+
+
+def test_halt_in_the_idle_tier_clears_every_carried_over_mark(recorder):
+    app = _app("idle", "m2", halted=True)
+    app._settle_deferred()
+
+    assert recorder.deferred == [("skipped", ()), ("idle", "m2")]
+    assert recorder.cleared == [None]
+
+
+def test_without_a_deadline_nothing_is_settled(recorder):
+    app = EmailAutomationApp(JOB_ID, deadline_seconds=0)
+    app._settle_deferred()
+
+    assert recorder.deferred == [] and recorder.cleared == []
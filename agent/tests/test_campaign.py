@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+import src.campaign as campaign_module
+import src.config as config
+from src.campaign import Campaign
+from src.email_service import async_email_service
+
+
+JOB_ID = "job-campaign"
+JOB = {"id": JOB_ID, "subject": "Job", "default_message": "Hello {{recipient_Name}}", "Job_email": "owner@example.com",
+       "status": "open"}
+
+
+def _member(number):
+    return {"id": f"member-{number}", "name_email": {"name": f"M{number}", "email": f"m{number}@example.com"}}
+
+
+@pytest.fixture
+def campaign(monkeypatch):
+    monkeypatch.setattr(config, "MESSAGE_STORE_ENABLED", False)
+    monkeypatch.setattr(config, "CAMPAIGN_RECORD_BATCH", 100)
+    campaign = Campaign(JOB_ID, sends_per_second=0)
+    campaign.job = JOB
+
+    async def token():
+        return {"access_token": "token"}
+
+    monkeypatch.setattr(campaign, "_token", token)
+    return campaign
+
+
+def test_lookup_failure_after_the_send_still_records_the_thread(campaign, monkeypatch):
+    async def send_prepared(job_id, email_data, token_info):
+        return {"id": "gmail-1", "threadId": "thread-1"}
+
+    async def get_message_id(gmail_id, token_info):
+        raise ConnectionError("Gmail API message fetch failed: 500")
+
+    monkeypatch.setattr(async_email_service, "send_prepared", send_prepared)
+    monkeypatch.setattr(async_email_service, "get_message_id", get_message_id)
+
+    result = asyncio.run(campaign._send_one(_member(1)))
+
+    assert result["status"] == "success"
+    assert campaign.counts["sent"] == 1 and campaign.counts["failed"] == 0
+    [row] = campaign._rows
+    assert row["thread_id"] == "thread-1"
+    # the Message-ID the campaign sent the message with
+    assert row["message_id"].startswith("<") and row["message_id"].endswith("@example.com>")
+
+
+def test_send_failure_is_the_only_failure(campaign, monkeypatch):
+    async def send_prepared(job_id, email_data, token_info):
+        raise ConnectionError("Gmail API send failed: 500")
+
+    monkeypatch.setattr(async_email_service, "send_prepared", send_prepared)
+
+    result = asyncio.run(campaign._send_one(_member(1)))
+
+    assert result["status"] == "error"
+    assert campaign.counts["failed"] == 1 and campaign.counts["sent"] == 0
+    assert campaign._rows == []
+
+
+def test_sends_are_recorded_after_every_page(campaign, monkeypatch):
+    recorded = []
+    pages = [[_member(1), _member(2)], [_member(3)]]
+
+    async def get_job_details(job_id):
+        return JOB
+
+    async def iter_job_member_pages(job_id, uncontacted=False):
+        for number, page in enumerate(pages):
+            # nothing of the previous page is left unrecorded when the next one is read
+            assert sum(len(rows) for rows in recorded) == sum(len(p) for p in pages[:number])
+            yield page
+
+    async def record_member_threads(rows):
+        recorded.append([row["id"] for row in rows])
+        return len(rows)
+
+    async def send_prepared(job_id, email_data, token_info):
+        return {"id": "gmail", "threadId": "thread"}
+
+    async def get_message_id(gmail_id, token_info):
+        return "<sent@mail>"
+
+    async def aclose():
+        return None
+
+    monkeypatch.setattr(config, "LEASES_ENABLED", False)
+    monkeypatch.setattr(campaign_module.async_db, "get_job_details", get_job_details)
+    monkeypatch.setattr(campaign_module.async_db, "iter_job_member_pages", iter_job_member_pages)
+    monkeypatch.setattr(campaign_module.async_db, "record_member_threads", record_member_threads)
+    monkeypatch.setattr(async_email_service, "send_prepared", send_prepared)
+    monkeypatch.setattr(async_email_service, "get_message_id", get_message_id)
+    for service in (async_email_service, campaign_module.async_auth_service, campaign_module.async_vector_search):
+        monkeypatch.setattr(service, "aclose", aclose)
+
+    result = asyncio.run(campaign.arun())
+
+    assert result["status"] == "success"
+    assert [sorted(rows) for rows in recorded] == [["member-1", "member-2"], ["member-3"]]
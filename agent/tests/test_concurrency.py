@@ -0,0 +1,155 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import httpx
+import pytest
+import requests
+
+import src.concurrency as concurrency
+from src.auth import CredentialRevokedError
+from src.concurrency import AdaptiveLimiter, SyncAdaptiveLimiter, is_overload
+
+
+class Clock:
+    """Stands in for time.monotonic."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(concurrency.time, "monotonic", clock)
+    return clock
+
+
+def _limiter(initial=4, max_limit=64, cls=AdaptiveLimiter):
+    return cls("test", initial, 1, max_limit, backoff=0.5, latency_tolerance=100.0, enabled=True)
+
+
+@pytest.mark.parametrize("error, overload", [
+    (httpx.ReadTimeout("timed out"), True),
+    (httpx.ConnectError("refused"), True),
+    (requests.exceptions.ConnectionError("reset"), True),
+    (TimeoutError(), True),
+    (SimpleNamespace(status_code=429), True),
+    (SimpleNamespace(response=SimpleNamespace(status_code=503)), True),
+    (SimpleNamespace(status_code=400), False),
+    (KeyError("text"), False),
+    (ValueError("could not parse the answer"), False),
+    (CredentialRevokedError("invalid_grant"), False),
+])
+def test_only_timeouts_dropped_connections_and_429_5xx_are_overload(error, overload):
+    assert is_overload(error) is overload
+
+
+def test_healthy_calls_add_one_over_the_limit(clock):
+    limiter = _limiter(initial=4)
+
+    async def calls():
+        for _ in range(4):
+            await limiter.acquire()
+        # 4 and 3 slots in use, at least half the limit, so it grows
+        limiter.release(0.1, False)
+        limiter.release(0.1, False)
+        # 2 of 4.49 is too few to grow it further
+        limiter.release(0.1, False)
+
+    asyncio.run(calls())
+
+    assert limiter.limit == pytest.approx(4.0 + 1 / 4 + 1 / 4.25)
+    assert limiter.stats["increases"] == 2
+
+
+def test_an_unused_limit_does_not_grow(clock):
+    limiter = _limiter(initial=8)
+
+    asyncio.run(limiter.acquire())
+    limiter.release(0.1, False)
+
+    assert limiter.limit == 8.0
+
+
+def test_overload_cuts_the_limit_once_per_round_trip(clock):
+    limiter = _limiter(initial=16)
+
+    async def acquire(count):
+        for _ in range(count):
+            await limiter.acquire()
+
+    asyncio.run(acquire(4))
+    limiter.release(2.0, True)
+    assert limiter.limit == 8.0
+
+    # the calls that were in flight alongside it saw the same congestion
+    clock.now += 1.0
+    limiter.release(2.0, True)
+    limiter.release(2.0, True)
+    assert limiter.limit == 8.0
+    assert limiter.stats["decreases"] == 1 and limiter.stats["overloads"] == 3
+
+    # a round trip (the recent latency average) later the next overload cuts again
+    clock.now += 2.0
+    limiter.release(2.0, True)
+    assert limiter.limit == 4.0
+
+
+def test_a_cancelled_waiter_passes_its_wake_up_on(clock):
+    limiter = _limiter(initial=1, max_limit=1)
+
+    async def scenario():
+        await limiter.acquire()
+        first = asyncio.ensure_future(limiter.acquire())
+        second = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert len(limiter._waiters) == 2
+
+        # the slot goes to the first waiter, which is cancelled before it runs
+        limiter.release(0.1, False)
+        first.cancel()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        assert first.cancelled()
+        assert second.done()
+        assert limiter.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_sync_slots_wait_for_a_free_slot_across_threads(clock):
+    limiter = _limiter(initial=1, max_limit=1, cls=SyncAdaptiveLimiter)
+    entered = threading.Event()
+
+    def call():
+        with limiter.slot():
+            entered.set()
+
+    with limiter.slot():
+        waiter = threading.Thread(target=call)
+        waiter.start()
+        assert not entered.wait(0.1)
+        assert limiter.stats["waits"] == 1
+
+    waiter.join(1)
+    assert entered.is_set()
+    assert limiter.in_flight == 0
+
+
+def test_sync_slot_cuts_the_limit_on_an_overloaded_call(clock):
+    limiter = _limiter(initial=8, cls=SyncAdaptiveLimiter)
+
+    with pytest.raises(httpx.ReadTimeout):
+        with limiter.slot():
+            raise httpx.ReadTimeout("timed out")
+    with pytest.raises(KeyError):
+        with limiter.slot():
+            raise KeyError("text")
+
+    assert limiter.limit == 4.0
+    assert limiter.stats["overloads"] == 1
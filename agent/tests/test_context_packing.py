@@ -0,0 +1,80 @@
+import math
+from types import SimpleNamespace
+
+import src.vector_search as vector_search_module
+from src.embeddings import DeterministicEmbeddingBackend
+from src.vector_search import VectorSearchService
+
+
+JOB_ID = "job-packing"
+CHUNKS = [
+    "Q: Is the role remote? A: Yes, the role is fully remote.",
+    "The salary is $170,000 plus equity.",
+    "Applications close on March 31.",
+]
+
+
+class InMemoryIndex:
+    """The job's chunks embedded with the deterministic backend, queried by cosine similarity."""
+
+    def __init__(self, embedder):
+        self.vectors = embedder.embed(CHUNKS, input_type="passage")
+
+    def query(self, namespace, vector, top_k, include_values=False, include_metadata=True):
+        def cosine(a, b):
+            norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+            return sum(x * y for x, y in zip(a, b)) / norm if norm else 0.0
+
+        scored = sorted(((cosine(vector, chunk_vector), number)
+                         for number, chunk_vector in enumerate(self.vectors)), reverse=True)[:top_k]
+        return SimpleNamespace(matches=[
+            SimpleNamespace(id=str(number), score=score, metadata={"text": CHUNKS[number]})
+            for score, number in scored
+        ])
+
+
+def _results(service, text, score):
+    return service.build_context([{"id": "0", "score": score, "text": text}], 0.5)
+
+
+def test_only_the_results_answered_from_are_counted(monkeypatch):
+    service = VectorSearchService()
+    speculative = _results(service, "speculative chunk " * 20, 0.6)
+    fresh = _results(service, "fresh chunk", 0.95)
+    monkeypatch.setattr(service, "_is_confident", lambda results: False)
+    monkeypatch.setattr(service, "search_with_text", lambda job_id, text, embedding=None: fresh)
+
+    # building results (speculative and fresh) records nothing
+    assert service.get_packing_stats()["searches"] == 0
+
+    chosen = service.resolve_speculation(JOB_ID, speculative, "question")
+    assert chosen is fresh
+    stats = service.get_packing_stats()
+    assert stats["searches"] == 1
+    assert stats["tokens_packed"] == fresh["packing"]["tokens_packed"]
+
+
+def test_results_without_a_packing_report_are_not_counted(monkeypatch):
+    service = VectorSearchService()
+    monkeypatch.setattr(service, "search_with_text",
+                        lambda job_id, text, embedding=None: {"raw_results": [], "context": None, "has_relevant_matches": False})
+
+    service.resolve_speculation(JOB_ID, None, "question")
+    assert service.get_packing_stats()["searches"] == 0
+
+
+def test_a_search_packs_only_the_chunks_that_answer(monkeypatch):
+    service = VectorSearchService()
+    service.embedder = DeterministicEmbeddingBackend()
+    index = InMemoryIndex(service.embedder)
+    monkeypatch.setattr(service, "get_index", lambda index_name: index)
+    monkeypatch.setattr(service, "get_namespace_vector_count", lambda namespace, index_name=None: len(CHUNKS))
+    monkeypatch.setattr(vector_search_module.db, "get_job_details", lambda job_id: {"id": job_id})
+    monkeypatch.setattr(vector_search_module, "reranker", None)
+
+    results = service.resolve_speculation(JOB_ID, None, "Is the role remote?")
+
+    assert results["has_relevant_matches"]
+    assert "fully remote" in results["context"]
+    assert "salary" not in results["context"]
+    assert service.get_packing_stats()["searches"] == 1
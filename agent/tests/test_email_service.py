@@ -0,0 +1,181 @@
+import base64
+
+import pytest
+
+import src.config as config
+from src.email_service import email_service
+
+
+QUESTION = "Is the role open to remote candidates?"
+
+
+@pytest.mark.parametrize("client, body, quoted", [
+    ("gmail",
+     f"{QUESTION}\n\nOn Mon, Mar 3, 2025 at 10:02 AM Jane Doe <jane@northwind.example> wrote:\n"
+     "> Hi Sam,\n> Thanks for applying.\n",
+     "Hi Sam,\nThanks for applying."),
+    ("gmail wrapped",
+     f"{QUESTION}\n\nOn Mon, Mar 3, 2025 at 10:02 AM Jane Doe <\njane@northwind.example> wrote:\n"
+     "> Thanks for applying.\n",
+     "Thanks for applying."),
+    ("outlook",
+     f"{QUESTION}\n\n________________________________\nFrom: Jane Doe <jane@northwind.example>\n"
+     "Sent: Monday, March 3, 2025 10:02 AM\nTo: Sam Lee <sam@example.com>\nSubject: Senior Data Engineer\n\n"
+     "Thanks for applying.\n",
+     "Thanks for applying."),
+    ("outlook header block",
+     f"{QUESTION}\n\nFrom: Jane Doe <jane@northwind.example>\nSent: Monday, March 3, 2025 10:02 AM\n"
+     "To: Sam Lee <sam@example.com>\nSubject: Senior Data Engineer\n\nThanks for applying.\n",
+     "Thanks for applying."),
+    ("apple mail",
+     f"{QUESTION}\n\nSent from my iPhone\n\n"
+     "On 3 Mar 2025, at 10:02, Jane Doe <jane@northwind.example> wrote:\n\n> Thanks for applying.\n",
+     "Thanks for applying."),
+    ("forwarded",
+     f"{QUESTION}\n\n---------- Forwarded message ---------\nFrom: Jane Doe <jane@northwind.example>\n"
+     "Date: Mon, Mar 3, 2025 at 10:02 AM\nSubject: Senior Data Engineer\n\nThanks for applying.\n",
+     "Thanks for applying."),
+    ("french",
+     f"{QUESTION}\n\nLe lun. 3 mars 2025 à 10:02, Jane Doe <jane@northwind.example> a écrit :\n"
+     "> Merci pour votre candidature.\n",
+     "Merci pour votre candidature."),
+])
+def test_the_quoted_thread_is_split_off(client, body, quoted):
+    stripped = email_service.strip_quoted_reply(body)
+
+    assert stripped["reply"] == QUESTION
+    assert stripped["quoted"].endswith(quoted)
+
+
+@pytest.mark.parametrize("body", [
+    # the member quoting someone in their own words
+    f"On Monday my manager wrote:\nwe need someone who can start in May.\n{QUESTION}",
+    f"On Monday … wrote:\n{QUESTION}",
+    # a From: line that is not an Outlook header block
+    f"From: my side, remote work matters most.\n{QUESTION}",
+    # dashes inside the text are not a signature delimiter
+    f"I have 5 years -- mostly Spark -- of experience.\n{QUESTION}",
+])
+def test_the_members_own_text_is_kept(body):
+    stripped = email_service.strip_quoted_reply(body)
+
+    assert stripped["reply"] == body
+    assert stripped["quoted"] == ""
+
+
+@pytest.mark.parametrize("footer", ["--", "-- ", "Sent from my Pixel 8", "Get Outlook for iOS"])
+def test_signatures_and_mobile_footers_end_the_reply(footer):
+    stripped = email_service.strip_quoted_reply(f"{QUESTION}\n\n{footer}\nSam Lee\n+1 555 0100")
+
+    assert stripped["reply"] == QUESTION
+
+
+def test_our_greeting_marks_the_quoted_thread():
+    member = {"name_email": {"name": "Sam", "email": "sam@example.com"}}
+    body = f"{QUESTION}\n\nHi Sam,\nThanks for applying to Northwind."
+
+    split = email_service.split_member_message(body, member)
+
+    assert split["reply"] == QUESTION
+    assert split["quoted"].startswith("Hi Sam,")
+
+
+def _encoded(text, charset="utf-8"):
+    """base64url body data the way Gmail sends it (padding dropped)."""
+    return base64.urlsafe_b64encode(text.encode(charset)).decode().rstrip("=")
+
+
+def _part(mime_type, text=None, filename="", headers=None, body=None):
+    return {
+        "mimeType": mime_type,
+        "filename": filename,
+        "headers": headers or [{"name": "Content-Type", "value": f"{mime_type}; charset=UTF-8"}],
+        "body": body if body is not None else {"data": _encoded(text)},
+    }
+
+
+def _multipart(mime_type, *parts):
+    return {"mimeType": mime_type, "headers": [], "body": {"size": 0}, "parts": list(parts)}
+
+
+PLAIN = _part("text/plain", f"{QUESTION}\n")
+HTML = _part("text/html", f"<div><p>{QUESTION}</p><blockquote><p>Thanks for applying.</p></blockquote></div>")
+ATTACHMENT = _part("text/plain", "name,years\nSam,5\n", filename="cv.csv",
+                   headers=[{"name": "Content-Disposition", "value": 'attachment; filename="cv.csv"'}])
+INLINE_ATTACHMENT = _part("text/plain", "Sam Lee, Senior Data Engineer\n",
+                          headers=[{"name": "Content-Disposition", "value": "attachment"}])
+
+
+def test_the_plain_part_of_an_alternative_nested_in_mixed_is_picked():
+    payload = _multipart("multipart/mixed", _multipart("multipart/alternative", HTML, PLAIN), ATTACHMENT)
+
+    assert email_service.extract_body(payload) == {"body": f"{QUESTION}\n", "truncated": False}
+
+
+def test_attachments_are_skipped_even_before_the_body():
+    payload = _multipart("multipart/mixed", ATTACHMENT, INLINE_ATTACHMENT, _multipart("multipart/alternative", PLAIN))
+
+    assert list(email_service.iter_mime_parts(payload)) == [PLAIN]
+    assert email_service.find_body_part(payload) == (PLAIN, False)
+
+
+def test_an_html_only_body_keeps_its_quotes_marked():
+    payload = _multipart("multipart/mixed", _multipart("multipart/related", HTML), ATTACHMENT)
+
+    body = email_service.extract_body(payload)["body"]
+
+    assert body == f"{QUESTION}\n\n> Thanks for applying."
+    assert email_service.strip_quoted_reply(body)["reply"] == QUESTION
+
+
+def test_a_single_part_message_without_a_mime_type_is_plain_text():
+    payload = {"headers": [], "body": {"data": _encoded(QUESTION)}}
+
+    assert email_service.extract_body(payload)["body"] == QUESTION
+
+
+def test_a_message_with_only_attachments_has_no_body():
+    payload = _multipart("multipart/mixed", ATTACHMENT)
+
+    assert email_service.find_body_part(payload) == (None, False)
+    assert email_service.extract_body(payload) == {"body": "", "truncated": False}
+
+
+@pytest.mark.parametrize("size, truncated", [(64000, False), (64001, True), (250000, True)])
+def test_bodies_are_cut_at_max_body_bytes(monkeypatch, size, truncated):
+    monkeypatch.setattr(config, "MAX_BODY_BYTES", 64000)
+    payload = _multipart("multipart/alternative", _part("text/plain", "a" * size))
+
+    body = email_service.extract_body(payload)
+
+    assert len(body["body"]) == min(size, 64000)
+    assert body["truncated"] is truncated
+
+
+def test_a_character_split_by_the_cap_is_dropped():
+    text, truncated = email_service.decode_body_data(_encoded("a" * 9 + "é"), 10)
+
+    assert (text, truncated) == ("a" * 9, True)
+
+
+def test_the_charset_of_the_part_is_used():
+    part = _part("text/plain", body={"data": _encoded("Café à Zürich", "latin-1")},
+                 headers=[{"name": "Content-Type", "value": 'text/plain; charset="ISO-8859-1"'}])
+
+    assert email_service.extract_body(part)["body"] == "Café à Zürich"
+
+
+def test_bodies_behind_an_attachment_id_are_fetched_only_when_small(monkeypatch):
+    fetched = []
+
+    def get_attachment_data(job_id, gmail_id, attachment_id):
+        fetched.append(attachment_id)
+        return _encoded(QUESTION)
+
+    monkeypatch.setattr(email_service, "get_attachment_data", get_attachment_data)
+    small = _part("text/plain", body={"attachmentId": "small", "size": 2000})
+    large = _part("text/plain", body={"attachmentId": "large", "size": config.MAX_BODY_FETCH_BYTES + 1})
+
+    assert email_service.extract_body(small, message_id="m1", job_id="j1")["body"] == QUESTION
+    assert email_service.extract_body(large, message_id="m1", job_id="j1") == {"body": "", "truncated": True}
+    assert fetched == ["small"]
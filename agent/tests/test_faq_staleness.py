@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import src.config as config
+from src.vector_search import VectorSearchService, knowledge_fingerprint
+
+
+JOB_ID = "job-faq"
+
+
+def _match(source_fingerprint, score=0.95):
+    return SimpleNamespace(score=score, metadata={
+        "question": "When is the start date?",
+        "answer": "May 1.",
+        "source_fingerprint": source_fingerprint,
+    })
+
+
+def test_edit_keeping_the_vector_count_changes_the_fingerprint():
+    before = {"0": "The start date is May 1", "1": "The role is remote"}
+    after = {"0": "The start date is June 1", "1": "The role is remote"}
+
+    assert len(before) == len(after)
+    assert knowledge_fingerprint(before) != knowledge_fingerprint(after)
+    assert knowledge_fingerprint(before) == knowledge_fingerprint(dict(reversed(list(before.items()))))
+
+
+def test_faq_built_from_other_texts_is_ignored():
+    built_from = knowledge_fingerprint({"0": "The start date is May 1"})
+    current = knowledge_fingerprint({"0": "The start date is June 1"})
+
+    assert VectorSearchService._check_faq_match(JOB_ID, _match(built_from), built_from)["answer"] == "May 1."
+    assert VectorSearchService._check_faq_match(JOB_ID, _match(built_from), current) is None
+    # FAQs precomputed before fingerprints were stored are stale too
+    assert VectorSearchService._check_faq_match(JOB_ID, _match(None), current) is None
+
+
+def test_fingerprint_is_cached_until_the_ttl_or_an_invalidation(monkeypatch):
+    service = VectorSearchService()
+    reads = []
+
+    def get_namespace_chunks(namespace, index_name=None):
+        reads.append(namespace)
+        return {"0": "The start date is May 1"}
+
+    monkeypatch.setattr(service, "get_namespace_chunks", get_namespace_chunks)
+    monkeypatch.setattr(config, "FAQ_FINGERPRINT_TTL", 300)
+
+    first = service.get_knowledge_fingerprint(JOB_ID, "index")
+    assert service.get_knowledge_fingerprint(JOB_ID, "index") == first
+    assert reads == [JOB_ID]
+
+    service.invalidate_namespace_stats("index")
+    service.get_knowledge_fingerprint(JOB_ID, "index")
+    assert reads == [JOB_ID, JOB_ID]
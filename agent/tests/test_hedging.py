@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import src.config as config
+from src.hedging import Hedger
+
+
+SITE = "reply"
+
+
+@pytest.fixture
+def hedger(monkeypatch):
+    monkeypatch.setattr(config, "HEDGE_MIN_SAMPLES", 10)
+    monkeypatch.setattr(config, "HEDGE_MIN_DELAY", 0.0)
+    monkeypatch.setattr(config, "HEDGE_PERCENTILE", 95)
+    monkeypatch.setattr(config, "HEDGE_WORKERS", 16)
+    # 10 fast calls so far: a budget of 0.1 leaves room for exactly one hedge
+    monkeypatch.setattr(config, "HEDGE_BUDGET", 0.1)
+    hedger = Hedger(enabled=True)
+    for _ in range(10):
+        hedger._record(SITE, 0.01, False, False)
+    return hedger
+
+
+def test_concurrent_slow_calls_share_the_hedge_budget_async(hedger):
+    requests = []
+
+    async def request():
+        requests.append(None)
+        await asyncio.sleep(0.1)
+        return "reply"
+
+    async def calls():
+        return await asyncio.gather(*(hedger.acall(SITE, request) for _ in range(5)))
+
+    assert asyncio.run(calls()) == ["reply"] * 5
+    # 5 primaries and a single hedge
+    assert len(requests) == 6
+    stats = hedger.get_stats()["sites"][SITE]
+    assert stats["hedges"] == 1 and stats["calls"] == 15
+    assert hedger._sites[SITE].pending_hedges == 0
+
+
+def test_concurrent_slow_calls_share_the_hedge_budget(hedger):
+    requests = []
+    lock = threading.Lock()
+    release = threading.Event()
+
+    def request():
+        with lock:
+            requests.append(None)
+        release.wait(1)
+        return "reply"
+
+    with ThreadPoolExecutor(max_workers=5) as callers:
+        calls = [callers.submit(hedger.call, SITE, request) for _ in range(5)]
+        threading.Timer(0.2, release.set).start()
+        assert [call.result() for call in calls] == ["reply"] * 5
+
+    assert len(requests) == 6
+    assert hedger.get_stats()["sites"][SITE]["hedges"] == 1
+    assert hedger._sites[SITE].pending_hedges == 0
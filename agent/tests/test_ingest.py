@@ -0,0 +1,110 @@
+import src.ingest as ingest_module
+from src.answer_cache import answer_cache
+from src.embeddings import DeterministicEmbeddingBackend
+from src.ingest import ingestor
+
+
+JOB_ID = "job-ingest"
+embedder = DeterministicEmbeddingBackend()
+
+
+class FakeIndex:
+    """Namespace ids (and the vectors upserted) in memory."""
+
+    def __init__(self, ids):
+        self.ids = set(ids)
+        self.vectors = {}
+
+    def list(self, namespace):
+        yield sorted(self.ids)
+
+    def upsert(self, vectors, namespace):
+        self.ids.update(vector["id"] for vector in vectors)
+        self.vectors.update((vector["id"], vector["values"]) for vector in vectors)
+
+    def delete(self, ids, namespace):
+        self.ids.difference_update(ids)
+
+
+def _ingest(monkeypatch, tmp_path, index, text, **kwargs):
+    document = tmp_path / "kb.txt"
+    document.write_text(text)
+    monkeypatch.setattr(ingest_module.config, "ensure_env_vars", lambda: None)
+    monkeypatch.setattr(ingest_module.db, "get_job_details", lambda job_id: {"id": job_id})
+    monkeypatch.setattr(ingest_module.vector_search, "get_index", lambda index_name: index)
+    monkeypatch.setattr(ingest_module.vector_search, "embed_texts", embedder.embed)
+    return ingestor.ingest(JOB_ID, [str(document)], index_name="index", **kwargs)
+
+
+def test_ingest_keeps_everything_by_default(monkeypatch, tmp_path):
+    old_chunk = ingestor.chunk_id("The start date is May 1.")
+    index = FakeIndex(["0", "1", old_chunk])
+
+    result = _ingest(monkeypatch, tmp_path, index, "The start date is June 1.")
+
+    assert result["status"] == "success"
+    assert result["deleted"] == 0
+    assert result["stale"] == 1
+    assert {"0", "1", old_chunk} <= index.ids
+    new_chunk = ingestor.chunk_id("The start date is June 1.")
+    assert index.vectors[new_chunk] == embedder.embed(["The start date is June 1."], input_type="passage")[0]
+
+
+def test_prune_only_deletes_ingested_chunks(monkeypatch, tmp_path):
+    old_chunk = ingestor.chunk_id("The start date is May 1.")
+    index = FakeIndex(["0", "1", old_chunk])
+
+    result = _ingest(monkeypatch, tmp_path, index, "The start date is June 1.", prune=True)
+
+    assert result["deleted"] == 1
+    # the frontend's numeric ids survive, the stale ingested chunk is gone
+    assert index.ids == {"0", "1", ingestor.chunk_id("The start date is June 1.")}
+
+
+def _chunk_ids(tmp_path, text):
+    document = tmp_path / "kb.md"
+    document.write_text(text)
+    return [ingestor.chunk_id(chunk) for chunk in ingestor.iter_chunks(ingestor.iter_paragraphs(str(document)))]
+
+
+def _sentences(first, last):
+    return " ".join(f"Benefit number {n} of the role is perk {n * 7}." for n in range(first, last))
+
+
+def test_an_inserted_sentence_only_changes_the_chunks_around_it(tmp_path):
+    before = _chunk_ids(tmp_path, f"# Benefits\n\n{_sentences(0, 60)}\n\nThe role is remote.\n")
+    inserted = "An additional benefit is a yearly learning budget of $1,500."
+    after = _chunk_ids(tmp_path, f"# Benefits\n\n{_sentences(0, 3)} {inserted} {_sentences(3, 60)}\n\n"
+                                 f"The role is remote.\n")
+
+    assert len(before) > 4
+    assert len(set(after) - set(before)) <= 2
+    assert len(set(before) - set(after)) <= 2
+
+
+def test_an_inserted_paragraph_is_one_new_chunk(tmp_path):
+    paragraphs = ["The start date is May 1.", "The role is remote.", "Applications close on March 31."]
+    before = _chunk_ids(tmp_path, "\n\n".join(paragraphs))
+    after = _chunk_ids(tmp_path, "\n\n".join(paragraphs[:1] + ["Visas are not sponsored."] + paragraphs[1:]))
+
+    assert set(before) < set(after) and len(after) == len(before) + 1
+
+
+def test_a_heading_stays_with_the_text_under_it(tmp_path):
+    document = tmp_path / "kb.md"
+    document.write_text("Intro line.\n## Pay\n\nThe salary is $170,000.\n\n## Visa\nNo sponsorship.\n")
+
+    assert list(ingestor.iter_paragraphs(str(document))) == [
+        "Intro line.", "## Pay The salary is $170,000.", "## Visa No sponsorship."
+    ]
+
+
+def test_ingest_drops_the_jobs_cached_answers(monkeypatch, tmp_path):
+    answer_cache.set_fingerprint(JOB_ID, "fingerprint")
+    question = embedder.embed(["When is the start date?"])[0]
+    answer_cache.store(JOB_ID, question, "The start date is May 1.")
+
+    result = _ingest(monkeypatch, tmp_path, FakeIndex([]), "The start date is June 1.")
+
+    assert result["upserted"] == 1
+    assert answer_cache.lookup(JOB_ID, question) is None
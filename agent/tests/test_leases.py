@@ -0,0 +1,140 @@
+import time
+
+from src.leases import JobLeases, SQLiteLeaseStore, partition_of
+
+
+JOB_ID = "job-leases"
+
+
+def _store():
+    return SQLiteLeaseStore(":memory:")
+
+
+def test_partition_is_stable_and_in_range():
+    assert partition_of("member-1", 8) == partition_of("member-1", 8)
+    assert all(0 <= partition_of(f"member-{n}", 8) < 8 for n in range(100))
+    assert len({partition_of(f"member-{n}", 8) for n in range(100)}) > 1
+
+
+def test_held_lease_is_not_claimed_by_another_owner():
+    store = _store()
+    assert store.claim_lease("job:1:part:0", "a", 60)
+    assert not store.claim_lease("job:1:part:0", "b", 60)
+    # the holder claiming again refreshes its lease
+    assert store.claim_lease("job:1:part:0", "a", 60)
+
+
+def test_expired_lease_is_taken_over():
+    store = _store()
+    assert store.claim_lease("job:1:part:0", "a", -1)
+    assert store.claim_lease("job:1:part:0", "b", 60)
+    # the previous holder can no longer renew or release it
+    assert not store.renew_lease("job:1:part:0", "a", 60)
+    store.release_lease("job:1:part:0", "a")
+    assert not store.claim_lease("job:1:part:0", "a", 60)
+
+
+def test_renew_and_release_by_the_owner_only():
+    store = _store()
+    store.claim_lease("job:1:part:0", "a", 60)
+    assert store.renew_lease("job:1:part:0", "a", 60)
+    assert not store.renew_lease("job:1:part:0", "b", 60)
+
+    store.release_lease("job:1:part:0", "b")
+    assert not store.claim_lease("job:1:part:0", "b", 60)
+    store.release_lease("job:1:part:0", "a")
+    assert store.claim_lease("job:1:part:0", "b", 60)
+
+
+def test_overlapping_runs_split_nothing_twice():
+    store = _store()
+    first = JobLeases(JOB_ID, store=store, owner="a", partitions=4, ttl_seconds=60)
+    second = JobLeases(JOB_ID, store=store, owner="b", partitions=4, ttl_seconds=60)
+    try:
+        assert first.claim() == [0, 1, 2, 3]
+        assert second.claim() == []
+        assert all(first.holds(f"member-{n}") and not second.holds(f"member-{n}") for n in range(20))
+
+        first.release()
+        assert second.claim() == [0, 1, 2, 3]
+    finally:
+        first.release()
+        second.release()
+
+
+class FlakyStore(SQLiteLeaseStore):
+    """Lease store whose renewals of one partition fail as if another agent took it."""
+
+    def __init__(self, lost_resource):
+        super().__init__(":memory:")
+        self.lost_resource = lost_resource
+        self.renewals = []
+
+    def renew_lease(self, resource, owner, ttl_seconds):
+        self.renewals.append(resource)
+        if resource == self.lost_resource:
+            return False
+        return super().renew_lease(resource, owner, ttl_seconds)
+
+    def claim_lease(self, resource, owner, ttl_seconds):
+        # the other agent holds the lost partition from the first renewal on
+        if resource == self.lost_resource and resource in self.renewals:
+            return False
+        return super().claim_lease(resource, owner, ttl_seconds)
+
+
+def test_heartbeat_renews_and_drops_lost_partitions():
+    store = FlakyStore(f"job:{JOB_ID}:part:1")
+    leases = JobLeases(JOB_ID, store=store, owner="a", partitions=2, ttl_seconds=3)
+    try:
+        assert leases.claim() == [0, 1]
+        # the heartbeat runs every ttl / 3 = 1 second
+        deadline = time.monotonic() + 5
+        while leases.held != {0} and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+        assert leases.held == {0}
+        assert leases.resource(0) in store.renewals
+        assert not store.claim_lease(leases.resource(0), "b", 60)
+    finally:
+        leases.release()
+
+
+def test_runs_claim_a_fair_share_of_the_partitions():
+    store = _store()
+    first = JobLeases(JOB_ID, store=store, owner="a", partitions=4, ttl_seconds=60)
+    second = JobLeases(JOB_ID, store=store, owner="b", partitions=4, ttl_seconds=60)
+    try:
+        # both runs are on the job before either claims (e.g. two replicas on one tick)
+        store.claim_lease(second.presence(), "b", 60)
+        assert len(first.claim()) == 2
+        assert len(second.claim()) == 2
+        assert first.held.isdisjoint(second.held)
+    finally:
+        first.release()
+        second.release()
+
+
+def test_a_run_that_joins_late_gets_its_share_on_the_next_tick():
+    store = _store()
+    first = JobLeases(JOB_ID, store=store, owner="a", partitions=4, ttl_seconds=60)
+    late = JobLeases(JOB_ID, store=store, owner="b", partitions=4, ttl_seconds=60)
+    try:
+        assert first.claim() == [0, 1, 2, 3]
+        assert late.claim() == []
+        # the late run exits, its presence stays until it expires
+        late.release()
+
+        # the first run's heartbeat gives back the late run's share
+        first.rebalance()
+        assert len(first.held) == 2
+
+        next_tick = JobLeases(JOB_ID, store=store, owner="b", partitions=4, ttl_seconds=60)
+        assert sorted(next_tick.claim()) == sorted({0, 1, 2, 3} - first.held)
+        next_tick.release()
+
+        # with the other run gone the first one picks its partitions up again
+        first.rebalance()
+        assert first.held == {0, 1, 2, 3}
+    finally:
+        first.release()
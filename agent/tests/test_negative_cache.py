@@ -0,0 +1,79 @@
+import asyncio
+import sys
+
+import pytest
+
+import src.config as config
+from src.main import EmailAutomationApp, async_db, db
+from src.negative_cache import NegativeCache
+
+
+JOB_ID = "job-negative"
+
+
+class JobState:
+    """Stands in for get_job_state (sync and async), counting the reads."""
+
+    def __init__(self, status, subscription_status):
+        self.state = {"status": status, "subscription_status": subscription_status}
+        self.reads = 0
+
+    def get(self, job_id):
+        self.reads += 1
+        return self.state
+
+    async def aget(self, job_id):
+        return self.get(job_id)
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = NegativeCache(str(tmp_path / "negative.db"))
+    monkeypatch.setattr(config, "NEGATIVE_CACHE_ENABLED", True)
+    monkeypatch.setattr(sys.modules["src.main"], "negative_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def job_state(monkeypatch):
+    job_state = JobState("closed", "active")
+    monkeypatch.setattr(db, "get_job_state", job_state.get)
+    monkeypatch.setattr(async_db, "get_job_state", job_state.aget)
+    return job_state
+
+
+def test_a_job_still_closed_is_skipped(cache, job_state):
+    app = EmailAutomationApp(JOB_ID, deadline_seconds=0)
+    app._remember_dead_job("closed")
+
+    assert app._cached_dead_job()["status"] == "Job Agent deleted"
+
+
+def test_a_reopened_job_is_read_again(cache, job_state):
+    app = EmailAutomationApp(JOB_ID, deadline_seconds=0)
+    app._remember_dead_job("closed")
+
+    job_state.state["status"] = "open"
+
+    assert app._cached_dead_job() is None
+    assert cache.stats["invalidated"] == 1
+    # the entry is gone, not only skipped once
+    assert not cache.contains(f"job:{JOB_ID}")
+
+
+def test_a_resubscribed_owner_is_read_again_async(cache, job_state):
+    job_state.state = {"status": "open", "subscription_status": "canceled"}
+    app = EmailAutomationApp(JOB_ID, deadline_seconds=0)
+    asyncio.run(app._aremember_dead_job("unsubscribed"))
+    assert asyncio.run(app._acached_dead_job())["status"] == "Job Agent deleted"
+
+    job_state.state["subscription_status"] = "active"
+
+    assert asyncio.run(app._acached_dead_job()) is None
+
+
+def test_live_jobs_do_not_pay_for_the_state_read(cache, job_state):
+    app = EmailAutomationApp(JOB_ID, deadline_seconds=0)
+
+    assert app._cached_dead_job() is None
+    assert job_state.reads == 0
@@ -0,0 +1,158 @@
+import time
+
+import pytest
+
+import src.config as config
+import src.notifications as notifications
+from src.database import db
+from src.notifications import NotificationLog, Notifier, RESEND_BATCH_LIMIT, event_key
+
+
+class Resend:
+    """Stands in for the resend module, recording what would be sent."""
+
+    def __init__(self):
+        self.api_key = None
+        self.single, self.batches = [], []
+        self.accept = True
+        self.Emails = type("Emails", (), {"send": staticmethod(self.send)})
+        self.Batch = type("Batch", (), {"send": staticmethod(self.send_batch)})
+
+    def send(self, email):
+        self.single.append(email)
+        return {"id": "email-1"} if self.accept else {}
+
+    def send_batch(self, emails):
+        self.batches.append(emails)
+        return {"data": [{"id": str(number)} for number in range(len(emails))]} if self.accept else {}
+
+    @property
+    def emails(self):
+        return self.single + [email for batch in self.batches for email in batch]
+
+
+@pytest.fixture
+def resend(monkeypatch):
+    resend = Resend()
+    monkeypatch.setattr(notifications, "resend", resend)
+    return resend
+
+
+@pytest.fixture
+def log(tmp_path):
+    return NotificationLog(str(tmp_path / "notifications.db"))
+
+
+@pytest.fixture(autouse=True)
+def window(monkeypatch):
+    monkeypatch.setattr(config, "NOTIFY_DEDUP_WINDOW", 3600)
+
+
+def test_identical_events_of_a_run_are_sent_once_with_a_count(resend, log):
+    notifier = Notifier(log)
+    for _ in range(3):
+        notifier.add("job-1", "A member asked an off-topic question.", to="owner@example.com")
+    notifier.add("job-1", "Your refresh token expired.")
+
+    assert notifier.flush() == {"sent": 2, "deduplicated": 0, "failed": 0}
+
+    [email] = resend.emails
+    assert email["to"] == ["owner@example.com"]
+    assert "off-topic question. (this happened 3 times)" in email["html"]
+    assert "refresh token expired." in email["html"]
+    assert notifier.stats["coalesced"] == 2
+
+
+def test_an_event_sent_within_the_window_is_not_sent_again(resend, log, monkeypatch):
+    message = "You reached the daily send limit."
+    first_run = Notifier(log)
+    first_run.add("job-1", message, to="owner@example.com")
+    first_run.flush()
+
+    # the next run (a new process) shares only the log
+    notifier = Notifier(log)
+    notifier.add("job-1", message, to="owner@example.com")
+    assert notifier.flush() == {"sent": 0, "deduplicated": 1, "failed": 0}
+
+    # once the window has passed it is news again
+    later = time.time() + 3601
+    monkeypatch.setattr(time, "time", lambda: later)
+    notifier.add("job-1", message, to="owner@example.com")
+    assert notifier.flush()["sent"] == 1
+    assert len(resend.emails) == 2
+
+
+def test_the_dedup_window_is_per_job(resend, log):
+    message = "You reached the daily send limit."
+    log.record("job-1", [event_key(message)], time.time(), 0)
+
+    notifier = Notifier(log)
+    notifier.add("job-1", message, to="one@example.com")
+    notifier.add("job-2", message, to="two@example.com")
+
+    assert notifier.flush() == {"sent": 1, "deduplicated": 1, "failed": 0}
+    assert [email["to"] for email in resend.emails] == [["two@example.com"]]
+
+
+def test_the_recipient_is_looked_up_only_when_not_passed(resend, log, monkeypatch):
+    lookups = []
+
+    def get_job_details(job_id):
+        lookups.append(job_id)
+        return {"Job_email": f"{job_id}@example.com"} if job_id != "job-gone" else None
+
+    monkeypatch.setattr(db, "get_job_details", get_job_details)
+    notifier = Notifier(log)
+    notifier.add("job-known", "Event", to="known@example.com")
+    notifier.add("job-lookup", "Event")
+    notifier.add("job-gone", "Event")
+
+    result = notifier.flush()
+
+    assert lookups == ["job-lookup", "job-gone"]
+    assert sorted(email["to"][0] for email in resend.emails) == ["job-lookup@example.com", "known@example.com"]
+    # the job without an owner is dropped, not counted as sent
+    assert result["sent"] == 2
+
+
+def test_a_failed_lookup_drops_only_that_job(resend, log, monkeypatch):
+    def get_job_details(job_id):
+        raise ConnectionError("supabase unavailable")
+
+    monkeypatch.setattr(db, "get_job_details", get_job_details)
+    notifier = Notifier(log)
+    notifier.add("job-known", "Event", to="known@example.com")
+    notifier.add("job-lookup", "Event")
+
+    assert notifier.flush()["sent"] == 1
+    assert [email["to"] for email in resend.emails] == [["known@example.com"]]
+
+
+def test_digests_are_split_into_batches_of_the_resend_limit(resend, log):
+    notifier = Notifier(log)
+    for number in range(RESEND_BATCH_LIMIT * 2 + 1):
+        notifier.add(f"job-{number}", "Event", to=f"owner-{number}@example.com")
+
+    assert notifier.flush()["sent"] == RESEND_BATCH_LIMIT * 2 + 1
+
+    assert [len(batch) for batch in resend.batches] == [RESEND_BATCH_LIMIT, RESEND_BATCH_LIMIT, 1]
+    assert not resend.single
+
+
+def test_a_refused_send_is_not_logged_as_sent(resend, log):
+    resend.accept = False
+    notifier = Notifier(log)
+    notifier.add("job-1", "Event", to="owner@example.com")
+
+    assert notifier.flush() == {"sent": 0, "deduplicated": 0, "failed": 1}
+    assert log.sent_since("job-1", 0) == set()
+
+
+def test_flushing_one_job_leaves_the_others_queued(resend, log):
+    notifier = Notifier(log)
+    notifier.add("job-1", "Event", to="one@example.com")
+    notifier.add("job-2", "Event", to="two@example.com")
+
+    assert notifier.flush("job-1")["sent"] == 1
+    assert notifier.flush()["sent"] == 1
+    assert [email["to"] for email in resend.emails] == [["one@example.com"], ["two@example.com"]]
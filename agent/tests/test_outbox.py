@@ -0,0 +1,107 @@
+import pytest
+
+from src.main import EmailAutomationApp, db, email_service
+
+
+JOB_ID = "job-outbox"
+
+
+class Recorder:
+    """Records the database and Gmail calls resume_outbox makes."""
+
+    def __init__(self, send_response=None):
+        self.marks = []
+        self.member_updates = []
+        self.sent = []
+        self.send_response = send_response
+
+    def mark_outbox_reply(self, key, status, gmail_id=None):
+        self.marks.append(status)
+
+    def update_member_details(self, member_id, details):
+        self.member_updates.append(details)
+
+    def get_message(self, job_id, gmail_id):
+        return {"message_id": f"<{gmail_id}@mail>"}
+
+    def send_reply(self, job_id, member_id, reply_params):
+        self.sent.append(reply_params)
+        return self.send_response
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recorder = Recorder(send_response={"id": "resent"})
+    for name in ("mark_outbox_reply", "update_member_details"):
+        monkeypatch.setattr(db, name, getattr(recorder, name))
+    for name in ("get_message", "send_reply"):
+        monkeypatch.setattr(email_service, name, getattr(recorder, name))
+    return recorder
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = EmailAutomationApp(JOB_ID, deadline_seconds=0)
+    monkeypatch.setattr(app, "_store_outbound", lambda *args: None)
+    return app
+
+
+def _email_result(sent, latest):
+    return {
+        "outbox": {
+            "idempotency_key": "member-1:<inbound@mail>",
+            "inbound_message_id": "<inbound@mail>",
+            "reply_params": {"body": "The start date is May 1."},
+            "email_response": "The start date is May 1."
+        },
+        "sent_message": sent,
+        "email_data": latest
+    }
+
+
+def test_sent_reply_is_finished_without_sending_again(app, recorder):
+    member = {"id": "member-1", "message_id": "<inbound@mail>"}
+    done = app.resume_outbox(member, _email_result({"id": "reply"}, {"id": "reply"}))
+
+    assert done == "Finished a reply sent by an earlier run"
+    assert recorder.sent == []
+    assert recorder.marks == ["sent", "done"]
+    assert member["message_id"] == "<reply@mail>"
+
+
+def test_sent_reply_with_a_newer_message_is_finished_then_handled(app, recorder):
+    member = {"id": "member-1", "message_id": "<inbound@mail>"}
+    done = app.resume_outbox(member, _email_result({"id": "reply"}, {"id": "newer", "message_id": "<newer@mail>"}))
+
+    assert done is None
+    assert recorder.sent == []
+    assert recorder.marks == ["sent", "done"]
+    assert member["message_id"] == "<reply@mail>"
+
+
+def test_unsent_reply_is_sent_as_recorded(app, recorder):
+    member = {"id": "member-1", "message_id": "<inbound@mail>"}
+    done = app.resume_outbox(member, _email_result(None, {"id": "inbound", "message_id": "<inbound@mail>"}))
+
+    assert done == "Sent the reply recorded by an earlier run"
+    assert recorder.sent == [{"body": "The start date is May 1."}]
+    assert recorder.marks == ["sent", "done"]
+    assert member["message_id"] == "<resent@mail>"
+
+
+def test_failed_resend_raises_and_leaves_the_outbox_open(app, recorder):
+    recorder.send_response = None
+    member = {"id": "member-1", "message_id": "<inbound@mail>"}
+
+    with pytest.raises(ConnectionError):
+        app.resume_outbox(member, _email_result(None, {"id": "inbound", "message_id": "<inbound@mail>"}))
+    assert recorder.marks == []
+
+
+def test_unsent_reply_is_superseded_by_a_newer_message(app, recorder):
+    member = {"id": "member-1", "message_id": "<inbound@mail>"}
+    done = app.resume_outbox(member, _email_result(None, {"id": "newer", "message_id": "<newer@mail>"}))
+
+    assert done is None
+    assert recorder.sent == []
+    assert recorder.marks == ["superseded"]
@@ -0,0 +1,25 @@
+import io
+import json
+import sys
+
+import src.results as results
+from src.results import ResultSink
+
+
+def test_stdout_sink_sends_logs_to_stderr(monkeypatch):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    monkeypatch.setattr(sys, "stdout", stdout)
+    monkeypatch.setattr(sys, "stderr", stderr)
+    monkeypatch.setattr(results, "_result_stdout", None)
+
+    sink = ResultSink.open("-")
+    print("processing member 1")
+    sink.write("job", {"member_id": 1, "status": "success"})
+    # a second stdout sink (batch shards) writes to the same reserved stream
+    ResultSink.open("-").write("job", {"member_id": 2, "status": "no_action"})
+    sink.close()
+    print("Result: done")
+
+    lines = stdout.getvalue().splitlines()
+    assert [json.loads(line)["member_id"] for line in lines] == [1, 2]
+    assert stderr.getvalue().splitlines() == ["processing member 1", "Result: done"]
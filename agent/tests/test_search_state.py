@@ -0,0 +1,21 @@
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from pinecone.core.openapi.db_data.model.scored_vector import ScoredVector
+
+from src.vector_search import VectorSearchService
+
+
+def test_search_results_survive_a_checkpoint():
+    service = VectorSearchService()
+    matches = [
+        ScoredVector(id="0", score=0.93, metadata={"text": "The start date is May 1."}),
+        ScoredVector(id="1", score=0.85, metadata={"text": "The role is remote."}),
+    ]
+    results = service.build_context(matches, 0.8)
+
+    serializer = JsonPlusSerializer()
+    restored = serializer.loads_typed(serializer.dumps_typed({"search_results": results}))["search_results"]
+
+    assert restored == results
+    assert restored["raw_results"][0] == {"id": "0", "score": 0.93, "text": "The start date is May 1."}
+    # speculation reads the plain matches the same way
+    assert service._top_match_id(restored) == "0"
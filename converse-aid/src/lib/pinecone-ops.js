@@ -2,9 +2,7 @@
 
 import { Pinecone } from '@pinecone-database/pinecone';
 
-export async function deletePineconeNamespaceDirect(namespaceId) {
-  const pinecone = new Pinecone({ apiKey: process.env.NEXT_PINECONE_API_KEY });
-  const index = pinecone.index(process.env.NEXT_PINECONE_INDEX_NAME);
+async function deleteNamespace(index, namespaceId) {
   try {
     const namespace = index.namespace(namespaceId);
     await namespace.deleteAll();
@@ -23,6 +21,15 @@ export async function deletePineconeNamespaceDirect(namespaceId) {
   }
 }
 
+export async function deletePineconeNamespaceDirect(namespaceId) {
+  const pinecone = new Pinecone({ apiKey: process.env.NEXT_PINECONE_API_KEY });
+  const index = pinecone.index(process.env.NEXT_PINECONE_INDEX_NAME);
+  const result = await deleteNamespace(index, namespaceId);
+  // The agent's precomputed FAQ for the job lives next to it and is built from it
+  await deleteNamespace(index, `${namespaceId}-faq`);
+  return result;
+}
+
 // Initialize Pinecone client
 const pc = new Pinecone({
   apiKey: process.env.NEXT_PINECONE_API_KEY